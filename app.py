@@ -1,48 +1,46 @@
 from flask import Flask, request, jsonify
-import mysql.connector
-from mysql.connector import Error
 import bcrypt
-import os
 import pytz
 from datetime import datetime, date, timedelta
-from urllib.parse import urlparse
-import json
+import random
 from flask_cors import CORS  # ✅ 新增這一行
+import logging
+import compression
+import events
+import fallback
+import idempotency
+import jobs
+import json_provider
+import leaderboard_feed
+import log_setup
+import metrics
+import progress_buffer
+import query_log
+import ratelimit
+import review_cache
+import snapshots
+import transactions
+import user_cache
+from query_log import query_budget
+from db import UNAVAILABLE_ERRORS, get_db_connection
+from repositories import (achievements, cards, chapters, courses, groups, points, rank_histogram, signin, tasks, users,
+                          vr_sessions)
+
+log_setup.setup_logging()  # ✅ JSON log，背景執行緒寫出（取代 print）
+log = logging.getLogger("feyndora.app")
+points_log = logging.getLogger("feyndora.app.points")
+review_log = logging.getLogger("feyndora.app.review")
 
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False
+json_provider.init_app(app)  # ✅ orjson 輸出 JSON（大回應序列化比較快）
+snapshots.init_app(app)  # ✅ 卡片圖鑑、排行榜前10名放在跨 worker 共用的記憶體
 CORS(app)  # ✅ 加這一行讓前端（Unity WebGL / Netlify）能存取 Flask API
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-if DATABASE_URL:
-    url = urlparse(DATABASE_URL)
-    db_config = {
-        'host': url.hostname,
-        'user': url.username,
-        'password': url.password,
-        'database': url.path[1:],
-        'port': url.port
-    }
-else:
-    db_config = {
-        'host': '127.0.0.1',
-        'user': 'root',
-        'password': 'my-secret-pw',
-        'database': 'feyndora'
-    }
-
-def get_db_connection():
-    try:
-        conn = mysql.connector.connect(**db_config, charset='utf8mb4')
-        cursor = conn.cursor()
-        # 設置數據庫時間為台灣時區
-        cursor.execute("SET time_zone = '+08:00'")
-        cursor.close()
-        return conn
-    except Error as e:
-        print(f"資料庫連接錯誤: {e}")
-        return None
+metrics.init_app(app)  # ✅ /metrics：每個 API 的延遲、DB 時間、SQL 次數
+query_log.init_app(app)  # ✅ 慢查詢 log + 每個 API 的 SQL 次數預算（@query_budget）
+compression.init_app(app)  # ✅ 依 Accept-Encoding 壓縮大回應（br / zstd / gzip）
+ratelimit.init_app(app)  # ✅ 每個使用者 / IP 限流（跨 worker 共用計數）+ DB 連線池排隊過長時回 503
+fallback.init_app(app)  # ✅ DB 無法使用時回 503；讀取 API 回傳上一次成功的回應（@fallback.stale_on_error）
 
 # ✅ 取得台灣當下時間
 def get_taiwan_now():
@@ -66,37 +64,37 @@ def index():
 
 # ✅ 註冊
 @app.route('/register', methods=['POST'])
+@query_budget(2)
+@ratelimit.per_ip("10/minute")
 def register():
     data = request.json
     username, email, password = data['username'], data['email'], data['password']
 
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT 1 FROM Users WHERE username=%s OR email=%s", (username, email))
-    if cursor.fetchone():
-        return jsonify({"error": "使用者名稱或Email已存在"}), 400
-
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-
-    cursor.execute("""
-        INSERT INTO Users (username, email, password, total_learning_points, coins, diamonds, account_created_at, avatar_id)
-        VALUES (%s, %s, %s, 0, 500, 0, %s, 1)
-    """, (username, email, hashed_password.decode('utf-8'), get_taiwan_now()))
+    try:
+        if users.exists_username_or_email(conn, username, email):
+            return jsonify({"error": "使用者名稱或Email已存在"}), 400
 
-    conn.commit()
+        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        users.create(conn, username, email, hashed_password.decode('utf-8'), get_taiwan_now())
+        conn.commit()
+    finally:
+        conn.close()
     return jsonify({"message": "註冊成功"}), 201
 
 # ✅ 登入
 @app.route('/login', methods=['POST'])
+@query_budget(1)
+@ratelimit.per_ip("30/minute")
 def login():
     data = request.json
     email, password = data['email'], data['password']
 
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM Users WHERE email=%s", (email,))
-    user = cursor.fetchone()
+    try:
+        user = users.find_by_email(conn, email)
+    finally:
+        conn.close()
 
     if not user or not bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
         return jsonify({"error": "帳號或密碼錯誤"}), 401
@@ -111,52 +109,88 @@ def login():
         "avatar_id": user['avatar_id']
     }), 200
 
+# ✅ 排行榜的名稱、頭像從使用者快取補上（前10名和自己的名次一起查，快取沒有的只查一次 DB）
+def attach_ranking_profiles(conn, top10, user_rank):
+    rows = user_cache.attach_profiles(conn, top10 + ([user_rank] if user_rank else []))
+    if user_rank:
+        user_rank = rows.pop() if rows and rows[-1]["user_id"] == user_rank["user_id"] else None
+    return rows, user_rank
+
+# ✅ 前10名先從共用快照拿（key 對得上才用），自己的名次在前10名裡就不用再查 DB
+# approx_query：有給（?approx=1）的話，前10名以外的名次用點數分布估算，不用對所有人排名
+def load_rankings(snapshot_name, key, top_query, rank_query, user_id, approx_query=None):
+    snapshot = snapshots.get(snapshot_name)
+    top10 = snapshot["rankings"] if snapshot and snapshot["key"] == key else None
+    user_rank = next((row for row in top10 or [] if row["user_id"] == user_id), None) if user_id else None
+    if top10 is not None and (user_rank is not None or not user_id):
+        return top10, user_rank
+
+    conn = get_db_connection(read_only=True)
+    try:
+        if top10 is None:
+            # 1️⃣ 查詢前10名 2️⃣ 查詢用戶自己的名次
+            user_rank = rank_query(conn) if user_id else None
+            return attach_ranking_profiles(conn, top_query(conn), user_rank)
+        if approx_query is not None:
+            estimate = approx_query(conn)
+            # 估計的名次可能擠進前10名時照常查精確名次
+            if estimate is None or estimate["rank_min"] > len(top10):
+                return top10, attach_ranking_profiles(conn, [], estimate)[1]
+        # 前10名用快照，只查自己的名次
+        return top10, attach_ranking_profiles(conn, [], rank_query(conn))[1]
+    finally:
+        conn.close()
+
+def build_daily_leaderboard(conn):
+    today = get_today().isoformat()
+    top10, _ = attach_ranking_profiles(conn, points.daily_top(conn, today), None)
+    return {"key": today, "rankings": top10}
+
+def build_weekly_leaderboard(conn):
+    start_of_week, end_of_week = get_week_range()
+    top10, _ = attach_ranking_profiles(conn, points.weekly_top(conn, start_of_week, end_of_week), None)
+    return {"key": start_of_week.isoformat(), "rankings": top10}
+
+# 重建後跟上一版比較，把變化推播給 /events/rankings/<board> 的連線
+leaderboard_feed.register("daily", build_daily_leaderboard, max_age=60)
+leaderboard_feed.register("weekly", build_weekly_leaderboard, max_age=60)
+snapshots.register("cards", lambda conn: {"cards": cards.list_all(conn)}, max_age=300)
+
+# ✅ 估算的名次（rank_histogram.estimate），欄位跟精確名次一樣，另外帶誤差範圍；這段期間沒有點數回傳 None
+def estimate_user_rank(conn, board, user_id, start, end, score_field):
+    score = rank_histogram.score(conn, user_id, start, end)
+    if score is None:
+        return None
+    estimate = rank_histogram.estimate(conn, board, start, score)
+    return {"user_id": user_id, score_field: score, "approximate": True, **estimate}
+
+# 點數、名稱、頭像變了，排行榜快照要重建（refresher 下一輪才會重建，連續很多次也只重建一次）
+def invalidate_leaderboards(conn):
+    conn.on_commit(lambda: snapshots.invalidate("daily_leaderboard", "weekly_leaderboard"))
+
 # ✅ 取得日排名 (強制台灣時區)
 @app.route('/daily_rankings', methods=['GET'])
+@query_budget(3)  # 排行榜 2 次 + 快取裡沒有的使用者名稱 / 頭像 1 次
+@fallback.stale_on_error
 def daily_rankings():
     query_date = request.args.get('date', get_today().isoformat())
     user_id = request.args.get('user_id', type=int)
+    approx = request.args.get('approx') == '1'
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # 1️⃣ 查詢前10名
-    cursor.execute("""
-        SELECT t.user_id, t.username, t.avatar_id, t.daily_points, t.ranking
-        FROM (
-            SELECT U.user_id, U.username, U.avatar_id, 
-                   SUM(L.daily_points) AS daily_points,
-                   RANK() OVER (ORDER BY SUM(L.daily_points) DESC) AS ranking
-            FROM LearningPointsLog L
-            JOIN Users U ON L.user_id = U.user_id
-            WHERE L.date = %s
-            GROUP BY U.user_id, U.username, U.avatar_id
-        ) t
-        ORDER BY t.ranking
-        LIMIT 10
-    """, (query_date,))
-    top10 = cursor.fetchall()
-
-    # 2️⃣ 查詢用戶自己的名次
-    user_rank = None
-    if user_id:
-        cursor.execute("""
-            SELECT t.user_id, t.username, t.avatar_id, t.daily_points, t.ranking
-            FROM (
-                SELECT U.user_id, U.username, U.avatar_id, 
-                       SUM(L.daily_points) AS daily_points,
-                       RANK() OVER (ORDER BY SUM(L.daily_points) DESC) AS ranking
-                FROM LearningPointsLog L
-                JOIN Users U ON L.user_id = U.user_id
-                WHERE L.date = %s
-                GROUP BY U.user_id, U.username, U.avatar_id
-            ) t
-            WHERE t.user_id = %s
-        """, (query_date, user_id))
-        user_rank = cursor.fetchone()
+    top10, user_rank = load_rankings(
+        "daily_leaderboard", query_date,
+        lambda conn: points.daily_top(conn, query_date),
+        lambda conn: points.daily_user_rank(conn, query_date, user_id),
+        user_id,
+        (lambda conn: estimate_user_rank(conn, "daily", user_id, query_date, query_date, "daily_points"))
+        if approx else None)
 
-    cursor.close()
-    conn.close()
+    # ✅ 過去日期的排行榜不會再變，壓縮結果可以快取
+    try:
+        if date.fromisoformat(query_date) < get_today():
+            compression.mark_immutable()
+    except ValueError:
+        pass
 
     return jsonify({
         "date": query_date,
@@ -166,71 +200,168 @@ def daily_rankings():
 
 # ✅ 取得週排名 (強制台灣時區+週一到週日)
 @app.route('/weekly_rankings', methods=['GET'])
+@query_budget(3)  # 排行榜 2 次 + 快取裡沒有的使用者名稱 / 頭像 1 次
+@fallback.stale_on_error
 def weekly_rankings():
     user_id = request.args.get('user_id', type=int)
+    approx = request.args.get('approx') == '1'
 
     start_of_week, end_of_week = get_week_range()
 
+    top10, user_rank = load_rankings(
+        "weekly_leaderboard", start_of_week.isoformat(),
+        lambda conn: points.weekly_top(conn, start_of_week, end_of_week),
+        lambda conn: points.weekly_user_rank(conn, start_of_week, end_of_week, user_id),
+        user_id,
+        (lambda conn: estimate_user_rank(conn, "weekly", user_id, start_of_week, end_of_week, "weekly_points"))
+        if approx else None)
+
+    return jsonify({
+        "weekStart": start_of_week.isoformat(),
+        "weekEnd": end_of_week.isoformat(),
+        "rankings": top10,
+        "userRank": user_rank
+    })
+
+# ✅ 建立班級 / 小組（老師建立後再把學生加進來）
+@app.route('/groups', methods=['POST'])
+@query_budget(1)
+@ratelimit.per_user("30/minute")
+def create_group():
+    data = request.json
+    if not data or not data.get('name'):
+        return jsonify({"error": "缺少小組名稱"}), 400
+
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    try:
+        group_id = groups.create(conn, data['name'], data.get('owner_user_id'), get_taiwan_now())
+        conn.commit()
+    finally:
+        conn.close()
+    return jsonify({"message": "小組已建立", "group_id": group_id}), 201
 
-    # 1️⃣ 查詢前10名
-    cursor.execute("""
-        SELECT t.user_id, t.username, t.avatar_id, t.weekly_points, t.ranking
-        FROM (
-            SELECT U.user_id, U.username, U.avatar_id, 
-                   SUM(L.daily_points) AS weekly_points,
-                   RANK() OVER (ORDER BY SUM(L.daily_points) DESC) AS ranking
-            FROM LearningPointsLog L
-            JOIN Users U ON L.user_id = U.user_id
-            WHERE L.date BETWEEN %s AND %s
-            GROUP BY U.user_id, U.username, U.avatar_id
-        ) t
-        ORDER BY t.ranking
-        LIMIT 10
-    """, (start_of_week, end_of_week))
-    top10 = cursor.fetchall()
-
-    # 2️⃣ 查詢用戶自己的名次
-    user_rank = None
-    if user_id:
-        cursor.execute("""
-            SELECT t.user_id, t.username, t.avatar_id, t.weekly_points, t.ranking
-            FROM (
-                SELECT U.user_id, U.username, U.avatar_id, 
-                       SUM(L.daily_points) AS weekly_points,
-                       RANK() OVER (ORDER BY SUM(L.daily_points) DESC) AS ranking
-                FROM LearningPointsLog L
-                JOIN Users U ON L.user_id = U.user_id
-                WHERE L.date BETWEEN %s AND %s
-                GROUP BY U.user_id, U.username, U.avatar_id
-            ) t
-            WHERE t.user_id = %s
-        """, (start_of_week, end_of_week, user_id))
-        user_rank = cursor.fetchone()
+# ✅ 加入小組成員（一次最多 MAX_GROUP_MEMBERS_PER_REQUEST 人），用他們目前的日 / 週 / 生涯點數起算
+MAX_GROUP_MEMBERS_PER_REQUEST = 500
 
-    cursor.close()
-    conn.close()
+@app.route('/groups/<int:group_id>/members', methods=['POST'])
+@query_budget(4)  # 小組 + 鎖住使用者 + 加入成員 + 起算點數
+def add_group_members(group_id):
+    data = request.json
+    user_ids = data.get('user_ids') if data else None
+    if not isinstance(user_ids, list) or not user_ids or not all(isinstance(u, int) for u in user_ids):
+        return jsonify({"error": "user_ids 必須是使用者 ID 的陣列"}), 400
+    if len(user_ids) > MAX_GROUP_MEMBERS_PER_REQUEST:
+        return jsonify({"error": f"一次最多加入 {MAX_GROUP_MEMBERS_PER_REQUEST} 人"}), 400
+
+    # 跟 /update_learning_points 用同一天起算
+    today = get_today()
+    week_start = today - timedelta(days=today.weekday())
+
+    # 先鎖住這些使用者，跟同時在加點數的交易排隊，起算的點數才不會重複或漏掉
+    def add(conn):
+        if groups.get(conn, group_id) is None:
+            return None
+        found = users.lock_many(conn, sorted(set(user_ids)))
+        groups.add_members(conn, group_id, found, today, week_start, week_start + timedelta(days=6),
+                           get_taiwan_now())
+        return found
+
+    found = transactions.run(add)
+    if found is None:
+        return jsonify({"error": "小組不存在"}), 404
+    return jsonify({"message": "成員已加入", "added": found,
+                    "not_found": sorted(set(user_ids) - set(found))}), 200
+
+# ✅ 移除小組成員（他在這個小組的點數一起刪掉）
+@app.route('/groups/<int:group_id>/members/<int:user_id>', methods=['DELETE'])
+@query_budget(1)
+def remove_group_member(group_id, user_id):
+    conn = get_db_connection()
+    try:
+        removed = groups.remove_member(conn, group_id, user_id)
+        conn.commit()
+    finally:
+        conn.close()
+    if not removed:
+        return jsonify({"error": "不是這個小組的成員"}), 404
+    return jsonify({"message": "成員已移除"}), 200
+
+# ✅ 刪除小組
+@app.route('/groups/<int:group_id>', methods=['DELETE'])
+@query_budget(1)
+def delete_group(group_id):
+    conn = get_db_connection()
+    try:
+        deleted = groups.delete(conn, group_id)
+        conn.commit()
+    finally:
+        conn.close()
+    if not deleted:
+        return jsonify({"error": "小組不存在"}), 404
+    return jsonify({"message": "小組已刪除"}), 200
+
+# ✅ 使用者加入的小組
+@app.route('/user_groups/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@fallback.stale_on_error
+def get_user_groups(user_id):
+    conn = get_db_connection(read_only=True)
+    try:
+        rows = groups.user_groups(conn, user_id)
+    finally:
+        conn.close()
+    return jsonify({"groups": rows}), 200
+
+# ✅ 小組排行榜：board = daily / weekly / all（生涯），只讀小組自己的點數，不用對全部使用者排名
+@app.route('/groups/<int:group_id>/rankings', methods=['GET'])
+@query_budget(4)  # 小組 + 前10名 + 自己的名次 + 快取裡沒有的使用者名稱 / 頭像
+@fallback.stale_on_error
+def group_rankings(group_id):
+    board = request.args.get('board', 'daily')
+    if board not in groups.BOARDS:
+        return jsonify({"error": "board 只能是 daily / weekly / all"}), 400
+    user_id = request.args.get('user_id', type=int)
+    try:
+        day = date.fromisoformat(request.args['date']) if request.args.get('date') else get_today()
+    except ValueError:
+        return jsonify({"error": "日期格式錯誤"}), 400
+    start = groups.period_start(board, day, day - timedelta(days=day.weekday()))
+
+    conn = get_db_connection(read_only=True)
+    try:
+        group = groups.get(conn, group_id)
+        if group is None:
+            return jsonify({"error": "小組不存在"}), 404
+        top10 = groups.top(conn, group_id, board, start)
+        # 自己在前10名裡就不用再查
+        user_rank = next((row for row in top10 if row["user_id"] == user_id), None) if user_id else None
+        if user_id and user_rank is None:
+            user_rank = groups.member_rank(conn, group_id, board, start, user_id)
+        top10, user_rank = attach_ranking_profiles(conn, top10, user_rank)
+    finally:
+        conn.close()
 
     return jsonify({
-        "weekStart": start_of_week.isoformat(),
-        "weekEnd": end_of_week.isoformat(),
+        "group_id": group_id,
+        "name": group["name"],
+        "members": group["members"],
+        "board": board,
+        "periodStart": start.isoformat() if board != "all" else None,
         "rankings": top10,
         "userRank": user_rank
     })
 
 # ✅ 檢查簽到狀態，確認今天是否簽到過
 @app.route('/signin/status/<int:user_id>', methods=['GET'])
+@query_budget(1)
 def check_signin_status(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("SELECT signin_day, last_signin_date, weekly_streak FROM SigninRecords WHERE user_id = %s", (user_id,))
-    record = cursor.fetchone()
+    conn = get_db_connection(read_only=True)
+    try:
+        record = signin.get_record(conn, user_id)
+    finally:
+        conn.close()
 
     if not record:
-        cursor.close()
-        conn.close()
         return jsonify({"error": "用戶簽到記錄不存在"}), 400
 
     server_today = get_today()
@@ -258,195 +389,169 @@ def check_signin_status(user_id):
         "is_new_week": is_new_week  # 新增這個回傳值
     }
 
-    cursor.close()
-    conn.close()
     return jsonify(response_data), 200
 
 # ✅ 初始化簽到記錄，以防用戶沒有簽到過
 @app.route('/signin/init/<int:user_id>', methods=['POST'])
+@query_budget(2)
 def initialize_signin_record(user_id):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # 檢查用戶是否已有簽到記錄
-    cursor.execute("SELECT * FROM SigninRecords WHERE user_id = %s", (user_id,))
-    record = cursor.fetchone()
-
-    if record:
-        return jsonify({"message": "簽到記錄已存在"}), 200
-
-    # 如果沒有簽到記錄，則建立初始記錄
-    cursor.execute("""
-        INSERT INTO SigninRecords (user_id, signin_day, has_claimed_today, last_signin_date) 
-        VALUES (%s, 1, FALSE, NULL)
-    """, (user_id,))
-    conn.commit()
+    try:
+        # 檢查用戶是否已有簽到記錄
+        if signin.get_record(conn, user_id):
+            return jsonify({"message": "簽到記錄已存在"}), 200
 
-    cursor.close()
-    conn.close()
+        # 如果沒有簽到記錄，則建立初始記錄
+        signin.create(conn, user_id)
+        conn.commit()
+    finally:
+        conn.close()
 
     return jsonify({"message": "簽到記錄初始化成功"}), 201
 
 # ✅ 領取簽到獎勵
 @app.route('/signin/claim/<int:user_id>', methods=['POST'])
+@query_budget(3)  # MySQL 3 次（鎖 Users + 讀取 + 條件更新），SQLite 3 次（讀取 + 條件更新 + 加獎勵）
+@ratelimit.per_user("10/minute")
 def claim_signin_reward(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
     today = get_today()  # 取得今天（台灣時區）
     start_of_week, end_of_week = get_week_range()
 
-    # 🔹 查詢目前的簽到記錄
-    cursor.execute("SELECT signin_day, last_signin_date, weekly_streak FROM SigninRecords WHERE user_id = %s", (user_id,))
-    record = cursor.fetchone()
+    # 死結 / 等鎖逾時會整段重來（transactions.run），先鎖 Users 再碰 SigninRecords
+    def claim(conn):
+        # 🔹 查詢目前的簽到記錄
+        record = signin.get_record(conn, user_id)
 
-    if not record:
-        return jsonify({"error": "用戶簽到記錄不存在"}), 400
-
-    last_signin_date = record["last_signin_date"]
-    weekly_streak = record["weekly_streak"]
-    signin_day = record["signin_day"]
+        if not record:
+            return jsonify({"error": "用戶簽到記錄不存在"}), 400
 
-    # 🔹 防止重複簽到
-    if last_signin_date == today:
-        return jsonify({
-            "error": "今天已經領取過獎勵",
-            "last_signin_date": last_signin_date
-        }), 400
+        last_signin_date = record["last_signin_date"]
+        weekly_streak = record["weekly_streak"]
+        signin_day = record["signin_day"]
 
-    # ✅ 檢查是否是新的一週的第一次簽到
-    if last_signin_date and last_signin_date < start_of_week:
-        signin_day = 1
-        weekly_streak = 1
-    # ✅ 判斷是否為連續簽到（昨天有簽到）
-    elif last_signin_date and (last_signin_date + timedelta(days=1)) == today:
-        weekly_streak += 1
-    else:
-        weekly_streak = 1  # 不是連續簽到就重設
-
-    # 設定獎勵內容（根據簽到第幾天）
-    rewards = {
-        1: {"coins": 100, "diamonds": 0},
-        2: {"coins": 300, "diamonds": 0},
-        3: {"coins": 500, "diamonds": 0},
-        4: {"coins": 1000, "diamonds": 0},
-        5: {"coins": 0, "diamonds": 1},
-        6: {"coins": 0, "diamonds": 3},
-        7: {"coins": 500, "diamonds": 5},
-    }
-    reward = rewards.get(signin_day, {"coins": 0, "diamonds": 0})
+        # 🔹 防止重複簽到
+        if last_signin_date == today:
+            return jsonify({
+                "error": "今天已經領取過獎勵",
+                "last_signin_date": last_signin_date
+            }), 400
+
+        # ✅ 檢查是否是新的一週的第一次簽到
+        if last_signin_date and last_signin_date < start_of_week:
+            signin_day = 1
+            weekly_streak = 1
+        # ✅ 判斷是否為連續簽到（昨天有簽到）
+        elif last_signin_date and (last_signin_date + timedelta(days=1)) == today:
+            weekly_streak += 1
+        else:
+            weekly_streak = 1  # 不是連續簽到就重設
 
-    # 🔹 更新 SigninRecords
-    next_signin_day = 1 if signin_day == 7 else signin_day + 1
-    cursor.execute("""
-        UPDATE SigninRecords 
-        SET signin_day = %s, last_signin_date = %s, weekly_streak = %s
-        WHERE user_id = %s
-    """, (next_signin_day, today, weekly_streak, user_id))
+        # 設定獎勵內容（根據簽到第幾天）
+        reward = signin.REWARDS.get(signin_day, signin.NO_REWARD)
+        next_signin_day = 1 if signin_day == 7 else signin_day + 1
 
-    # 🔹 更新 Users 的金幣與鑽石、總簽到天數
-    cursor.execute("""
-        UPDATE Users SET total_signin_days = total_signin_days + 1, 
-        coins = coins + %s, diamonds = diamonds + %s WHERE user_id = %s
-    """, (reward["coins"], reward["diamonds"], user_id))
+        # 🔹 有條件的更新 SigninRecords + 加金幣與鑽石、總簽到天數（同時送出的請求只有一個會成功）
+        if not signin.claim(conn, user_id, record["signin_day"], next_signin_day, today, weekly_streak,
+                            reward["coins"], reward["diamonds"]):
+            conn.rollback()
+            return jsonify({
+                "error": "今天已經領取過獎勵",
+                "last_signin_date": today
+            }), 400
+        user_cache.changed(conn, user_id, coins=reward["coins"], diamonds=reward["diamonds"], total_signin_days=1)
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        return jsonify({
+            "message": "簽到成功",
+            "signin_day": next_signin_day,
+            "weekly_streak": weekly_streak,
+            "coins_received": reward["coins"],
+            "diamonds_received": reward["diamonds"],
+            "last_signin_date": today
+        }), 200
 
-    return jsonify({
-        "message": "簽到成功",
-        "signin_day": next_signin_day,
-        "weekly_streak": weekly_streak,
-        "coins_received": reward["coins"],
-        "diamonds_received": reward["diamonds"],
-        "last_signin_date": today
-    }), 200
+    return transactions.run(claim, lock_user=user_id)
     
 # ✅ 更新學習點數（留給VR端呼叫）
 @app.route('/update_learning_points', methods=['POST'])
+@query_budget(5)  # Users + 當天點數 + 日 / 週點數（估算名次用的分布）+ 點數跨格時更新分布 + 小組點數
+@ratelimit.per_user("120/minute")  # VR 端每幾秒回報一次
+@idempotency.idempotent
 def update_learning_points():
     data = request.json
     user_id = data['user_id']
     points_to_add = data['points']
-    today = date.today().isoformat()
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    today = get_today()
+    week_start = today - timedelta(days=today.weekday())
 
-    # 先確認今天是否已有紀錄
-    cursor.execute("SELECT daily_points FROM LearningPointsLog WHERE user_id=%s AND date=%s", (user_id, today))
-    row = cursor.fetchone()
+    # 第一句就是更新 Users，等於先鎖 Users（跟其他交易的順序一致），不用另外鎖
+    def add_points(conn):
+        # 1️⃣ 更新 Users 表的 total_learning_points（生涯總積分）
+        users.add_learning_points(conn, user_id, points_to_add)
+        user_cache.changed(conn, user_id, total_learning_points=points_to_add)
 
-    if row:
-        # 更新今天的累計點數
-        new_points = row[0] + points_to_add
-        cursor.execute("UPDATE LearningPointsLog SET daily_points=%s WHERE user_id=%s AND date=%s", (new_points, user_id, today))
-    else:
-        # 新增今日點數紀錄
-        cursor.execute("INSERT INTO LearningPointsLog (user_id, date, daily_points) VALUES (%s, %s, %s)", (user_id, today, points_to_add))
+        # 2️⃣ 累加今天的點數（沒有紀錄就新增）
+        points.add_daily_points(conn, user_id, today.isoformat(), points_to_add)
+        invalidate_leaderboards(conn)
 
-    # 2️⃣ 同時更新 Users 表的 total_learning_points（生涯總積分）
-    cursor.execute("UPDATE Users SET total_learning_points = total_learning_points + %s WHERE user_id = %s", 
-                   (points_to_add, user_id))
+        # 3️⃣ 更新日 / 週排行榜的點數分布（?approx=1 估算名次用）
+        rank_histogram.record(conn, user_id, today, week_start, week_start + timedelta(days=6), points_to_add)
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        # 4️⃣ 累加到他所屬小組的日 / 週 / 生涯排行榜
+        groups.add_points(conn, user_id, today, week_start, points_to_add)
 
+    transactions.run(add_points, user_id=user_id)
     return jsonify({"message": "學習點數更新完成"})
 
 # ✅ 取得用戶當週的每日學習數
 @app.route('/weekly_points/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@fallback.stale_on_error
 def get_weekly_points(user_id):
     today = get_today()
     start_of_week = today - timedelta(days=today.weekday())
     end_of_week = start_of_week + timedelta(days=6)
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    query = """
-        SELECT date, daily_points 
-        FROM LearningPointsLog
-        WHERE user_id = %s AND date BETWEEN %s AND %s
-    """
-    cursor.execute(query, (user_id, start_of_week, end_of_week))
-    rows = cursor.fetchall()
+    conn = get_db_connection(read_only=True)
+    try:
+        rows = points.points_between(conn, user_id, start_of_week, end_of_week)
+    finally:
+        conn.close()
 
-    print(f"🔍 查詢到的記錄: {rows}")  # ✅ 看看有沒有查到數據
+    points_log.debug("🔍 查詢到的記錄: %s", rows)  # ✅ 看看有沒有查到數據
 
     weekly_data = { (start_of_week + timedelta(days=i)).strftime('%Y-%m-%d'): 0 for i in range(7)}
 
     for row in rows:
         weekly_data[str(row['date'])] = row['daily_points']
 
-    cursor.close()
-    conn.close()
-
-    print(f"✅ 回傳的 weekly_points: {list(weekly_data.values())}")
+    points_log.debug("✅ 回傳的 weekly_points: %s", weekly_data)
     return jsonify({"weekly_points": list(weekly_data.values())})
 
 # ✅ 取得用戶課程數量
 @app.route('/courses_count/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@fallback.stale_on_error
 def get_courses_count(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM Courses WHERE user_id=%s", (user_id,))
-    count = cursor.fetchone()[0]
-    cursor.close()
-    conn.close()
+    conn = get_db_connection(read_only=True)
+    try:
+        count = courses.count_by_user(conn, user_id)
+    finally:
+        conn.close()
     return jsonify({"courses_count": count})
 
 # ✅ 取得用戶資料（不含敏感資料）
 @app.route('/user/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@fallback.stale_on_error
 def get_user(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT user_id, username, email, total_learning_points, coins, diamonds, avatar_id, total_signin_days FROM Users WHERE user_id=%s", (user_id,))
-    user = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    found, missing = user_cache.lookup([user_id])
+    user = found.get(user_id)
+    if missing:
+        conn = get_db_connection(read_only=True)
+        try:
+            user = user_cache.load(conn, missing).get(user_id)
+        finally:
+            conn.close()
     if not user:
         return jsonify({"error": "找不到用戶"}), 404
     return jsonify(user), 200
@@ -522,62 +627,50 @@ def get_current_stage(user_id):
 
 # ✅ current_stage（每次呼叫都即時計算進度+更新progress+回傳最新current_stage）
 @app.route('/current_stage/<int:user_id>', methods=['GET'])
+@query_budget(5)  # 3 次 + 還沒寫進 DB 的 VR 進度先寫、移除 VR session 各 1 次（很少發生）
 def get_current_stage(user_id):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # 取最新ready課程
-    cursor.execute("""
-        SELECT course_id, course_name, current_stage, progress, progress_one_to_one, progress_classroom, teacher_card_id
-        FROM Courses
-        WHERE user_id = %s AND is_vr_ready = TRUE
-        ORDER BY vr_started_at DESC
-        LIMIT 1
-    """, (user_id,))
-
-    course = cursor.fetchone()
-    if not course:
-        return jsonify({"hasReadyCourse": False}), 200
+    try:
+        # 取目前在 VR 裡上的課程（ActiveVRSessions，用 user_id 直接查）
+        course = vr_sessions.active_course(conn, user_id)
+        if not course:
+            return jsonify({"hasReadyCourse": False}), 200
 
-    course_id = course['course_id']
+        course_id = course['course_id']
+        # 還沒寫進 DB 的 VR 進度也要算進來（階段以最新回報的為準）
+        course = progress_buffer.overlay(user_id, [course])[0]
 
-    # 計算一對一目錄進度
-    cursor.execute("""
-        SELECT COUNT(*) as total, SUM(is_completed) as completed
-        FROM CourseChapters
-        WHERE course_id = %s AND chapter_type = 'one_to_one'
-    """, (course_id,))
-    one_to_one_progress = cursor.fetchone()
-    progress_one_to_one = (one_to_one_progress['completed'] / one_to_one_progress['total']) * 100 if one_to_one_progress['total'] > 0 else 0
+        # 一對一、一對多目錄進度一次查完
+        chapter_stats = chapters.progress_by_type(conn, course_id)
+        no_chapters = {"total": 0, "completed": 0}
 
-    # 計算一對多目錄進度
-    cursor.execute("""
-        SELECT COUNT(*) as total, SUM(is_completed) as completed
-        FROM CourseChapters
-        WHERE course_id = %s AND chapter_type = 'classroom'
-    """, (course_id,))
-    classroom_progress = cursor.fetchone()
-    progress_classroom = (classroom_progress['completed'] / classroom_progress['total']) * 100 if classroom_progress['total'] > 0 else 0
+        # 計算一對一目錄進度
+        one_to_one_progress = chapter_stats.get('one_to_one', no_chapters)
+        progress_one_to_one = (one_to_one_progress['completed'] / one_to_one_progress['total']) * 100 if one_to_one_progress['total'] > 0 else 0
 
-    # 重新計算總progress (可自行決定計算邏輯)
-    total_progress = (progress_one_to_one + progress_classroom) / 2  # 這裡假設各佔50%權重
+        # 計算一對多目錄進度
+        classroom_progress = chapter_stats.get('classroom', no_chapters)
+        progress_classroom = (classroom_progress['completed'] / classroom_progress['total']) * 100 if classroom_progress['total'] > 0 else 0
 
-    # 判斷是否要更新current_stage
-    if course['current_stage'] == 'one_to_one' and progress_one_to_one >= 100:
-        course['current_stage'] = 'classroom'
-    elif course['current_stage'] == 'classroom' and progress_classroom >= 100:
-        course['current_stage'] = 'completed'
+        # 重新計算總progress (可自行決定計算邏輯)
+        total_progress = (progress_one_to_one + progress_classroom) / 2  # 這裡假設各佔50%權重
 
-    # 更新最新進度和階段回到Courses
-    cursor.execute("""
-        UPDATE Courses
-        SET progress = %s, progress_one_to_one = %s, progress_classroom = %s, current_stage = %s
-        WHERE course_id = %s
-    """, (total_progress, progress_one_to_one, progress_classroom, course['current_stage'], course_id))
+        # 判斷是否要更新current_stage
+        if course['current_stage'] == 'one_to_one' and progress_one_to_one >= 100:
+            course['current_stage'] = 'classroom'
+        elif course['current_stage'] == 'classroom' and progress_classroom >= 100:
+            course['current_stage'] = 'completed'
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        # 更新最新進度和階段回到Courses（還沒寫進 DB 的 VR 進度先一起寫，寫入順序才跟回報順序一樣）
+        with progress_buffer.settle(conn, course_id) as settlement:
+            courses.update_stage_progress(conn, course_id, total_progress, progress_one_to_one,
+                                          progress_classroom, course['current_stage'])
+            conn.commit()
+            settlement.done({"progress": float(total_progress), "progress_one_to_one": float(progress_one_to_one),
+                             "progress_classroom": float(progress_classroom),
+                             "current_stage": course['current_stage']})
+    finally:
+        conn.close()
 
     return jsonify({
         "hasReadyCourse": True,
@@ -592,24 +685,17 @@ def get_current_stage(user_id):
 
 # ✅ 取得最新上完的課程
 @app.route('/latest_course/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@fallback.stale_on_error
 def get_latest_course(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    conn = get_db_connection(read_only=True)
     
     try:
         # 直接獲取最新的課程（不一定是正在進行的）
-        cursor.execute("""
-            SELECT course_id, course_name, current_stage, progress, 
-                   progress_one_to_one, progress_classroom
-            FROM Courses
-            WHERE user_id = %s
-            ORDER BY updated_at DESC
-            LIMIT 1
-        """, (user_id,))
-        
-        course = cursor.fetchone()
+        course = courses.get_latest(conn, user_id)
         if not course:
             return jsonify({"hasCourse": False}), 200
+        course = progress_buffer.overlay(user_id, [course])[0]  # 還沒寫進 DB 的 VR 進度
             
         return jsonify({
             "hasCourse": True,
@@ -621,14 +707,17 @@ def get_latest_course(user_id):
             "progress_classroom": course['progress_classroom']
         }), 200
         
+    except UNAVAILABLE_ERRORS:
+        raise  # 回 503 + Retry-After
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
-        cursor.close()
         conn.close()
 
 # ✅ VR結束課程時更新current_stage
 @app.route('/finish_course', methods=['POST'])
+@query_budget(4)  # 查課程 + 章節 + 課程狀態 + 移除 VR session
+@idempotency.idempotent
 def finish_course():
     try:
         data = request.json
@@ -637,37 +726,36 @@ def finish_course():
 
         course_id = data['course_id']
         conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "資料庫連接失敗"}), 500
-            
-        cursor = conn.cursor()
-        
         try:
             # 1. 先檢查課程是否存在
-            cursor.execute("SELECT 1 FROM Courses WHERE course_id = %s", (course_id,))
-            if not cursor.fetchone():
-                return jsonify({"error": "課程不存在"}), 404
+            user_id = progress_buffer.owner(course_id)
+            if user_id is None:
+                course = courses.get_owner(conn, course_id)
+                if not course:
+                    return jsonify({"error": "課程不存在"}), 404
+                user_id = course['user_id']
+            conn.user_id = user_id  # 寫入後這個使用者的讀取走 primary
 
-            # 2. 強制將所有章節標記為完成
-            cursor.execute("""
-                UPDATE CourseChapters 
-                SET is_completed = 1
-                WHERE course_id = %s
-            """, (course_id,))
-
-            # 3. 更新課程狀態（只使用資料庫中實際存在的欄位）
-            cursor.execute("""
-                UPDATE Courses 
-                SET current_stage = 'completed',
-                    progress = 100,
-                    progress_one_to_one = 100,
-                    progress_classroom = 100,
-                    is_vr_ready = 0,
-                    updated_at = NOW()
-                WHERE course_id = %s
-            """, (course_id,))
+            # 還沒寫進 DB 的進度會被結束課程整個蓋掉，不用再寫
+            with progress_buffer.settle(conn, course_id, supersede=True) as settlement:
+                # 2. 強制將所有章節標記為完成
+                chapters.complete_all(conn, course_id)
 
-            conn.commit()
+                # 3. 更新課程狀態（只使用資料庫中實際存在的欄位）
+                courses.mark_finished(conn, course_id)
+
+                # 4. 還登記著 VR session 的話移除
+                session_ended = settlement.session_open and vr_sessions.end(conn, user_id, course_id)
+
+                conn.commit()
+                settlement.done({"current_stage": "completed", "progress": 100.0,
+                                 "progress_one_to_one": 100.0, "progress_classroom": 100.0}, session_ended=True)
+            if session_ended:
+                metrics.record_vr_session_ended("finished", settlement.session_seconds)
+            events.course_finished(user_id, course_id)
+
+            # 5. 背景先建好預設評價，第一次看課程回顧時不用在 GET 裡寫入
+            jobs.submit(review_cache.pregenerate, course_id)
             
             return jsonify({
                 "message": "課程已成功結束",
@@ -677,78 +765,82 @@ def finish_course():
             }), 200
 
         except Exception as db_error:
-            print(f"資料庫操作錯誤: {str(db_error)}")
-            if 'conn' in locals() and conn.is_connected():
-                conn.rollback()
+            log.error("資料庫操作錯誤: %s", db_error, extra={"course_id": course_id})
+            conn.rollback()
             raise
             
         finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals() and conn.is_connected():
-                conn.close()
+            conn.close()
 
+    except UNAVAILABLE_ERRORS:
+        raise  # 回 503 + Retry-After
     except Exception as e:
-        print(f"結束課程錯誤: {str(e)}")
-        if 'conn' in locals() and conn.is_connected():
-            conn.rollback()
-            conn.close()
+        log.exception("結束課程錯誤: %s", e)
         return jsonify({"error": f"結束課程時發生錯誤: {str(e)}"}), 500
         
 # ✅ 課程列表
 @app.route('/courses/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@fallback.stale_on_error
 def get_courses(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM Courses WHERE user_id=%s ORDER BY created_at DESC", (user_id,))
-    return jsonify(cursor.fetchall()), 200
+    conn = get_db_connection(read_only=True)
+    try:
+        return jsonify(progress_buffer.overlay(user_id, courses.list_by_user(conn, user_id))), 200
+    finally:
+        conn.close()
 
 # ✅ 新增課程
 @app.route('/add_course', methods=['POST'])
+@query_budget(1)
+@ratelimit.per_user("30/minute")
 def add_course():
     data = request.json
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO Courses (user_id, course_name, progress, progress_one_to_one, progress_classroom, current_stage, is_favorite, is_vr_ready, file_type, created_at)
-        VALUES (%s, %s, 0, 0, 0, 'one_to_one', FALSE, 0, %s, NOW())
-    """, (data['user_id'], data['course_name'], data['file_type'], get_taiwan_now()))
-
-    conn.commit()
+    try:
+        courses.create(conn, data['user_id'], data['course_name'], data['file_type'])
+        conn.commit()
+    finally:
+        conn.close()
     return jsonify({"message": "課程已新增"}), 201
 
 # ✅ 搜尋課程
 @app.route('/search_courses/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@ratelimit.per_user("60/minute")
 def search_courses(user_id):
-    query = f"%{request.args.get('query', '').strip()}%"
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT * FROM Courses WHERE user_id=%s AND course_name LIKE %s ORDER BY created_at DESC
-    """, (user_id, query))
-    courses = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify(courses), 200
+    keyword = request.args.get('query', '').strip()
+    conn = get_db_connection(read_only=True)
+    try:
+        results = courses.search(conn, user_id, keyword)
+    finally:
+        conn.close()
+    return jsonify(progress_buffer.overlay(user_id, results)), 200
 
 
 # ✅ 刪除課程
 @app.route('/delete_course/<int:course_id>', methods=['DELETE'])
+@query_budget(1)
 def delete_course(course_id):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM Courses WHERE course_id=%s", (course_id,))
-    conn.commit()
-    return jsonify({"message": "課程已刪除"}), 200
+    try:
+        courses.delete(conn, course_id)
+        conn.commit()
+    finally:
+        conn.close()
+    review_cache.invalidate_course(course_id)
+    progress_buffer.forget(course_id)
+    return jsonify({"message": "課程已刪除"}), 200
 
 # ✅ 切換收藏
 @app.route('/toggle_favorite/<int:course_id>', methods=['POST'])
+@query_budget(1)
 def toggle_favorite(course_id):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE Courses SET is_favorite = NOT is_favorite WHERE course_id=%s", (course_id,))
-    conn.commit()
+    try:
+        courses.toggle_favorite(conn, course_id)
+        conn.commit()
+    finally:
+        conn.close()
     return jsonify({"message": "收藏狀態已更新"}), 200
 
 # ✅ 課程進度更新
@@ -789,6 +881,8 @@ def continue_course():
 
 # ✅ 課程進度更新
 @app.route('/update_progress', methods=['POST'])
+@query_budget(3)  # 新的一堂課第一筆進度：查課程 + 寫進度 + 移除 VR session
+@idempotency.idempotent
 def update_progress():
     try:
         data = request.json
@@ -800,81 +894,68 @@ def update_progress():
             if field not in data:
                 return jsonify({"error": f"缺少必要字段: {field}"}), 400
 
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "資料庫連接失敗"}), 500
-            
-        cursor = conn.cursor()
-        
-        # 先檢查課程是否存在
-        cursor.execute("SELECT 1 FROM Courses WHERE course_id = %s", (data['course_id'],))
-        if not cursor.fetchone():
-            return jsonify({"error": "課程不存在"}), 404
+        course_id = data['course_id']
+        conn = None
+        user_id = progress_buffer.owner(course_id)
+        if user_id is None:
+            conn = get_db_connection()
+            # 先檢查課程是否存在（記住擁有者，同一門課之後的回報不用再查）
+            course = courses.get_owner(conn, course_id)
+            if not course:
+                return jsonify({"error": "課程不存在"}), 404
+            user_id = course['user_id']
+            progress_buffer.remember(course_id, user_id)
 
-        # 更新進度
-        cursor.execute("""
-            UPDATE Courses
-            SET progress = %s, 
-                progress_one_to_one = %s, 
-                progress_classroom = %s, 
-                current_stage = %s, 
-                is_vr_ready = 0, 
-                updated_at = NOW()
-            WHERE course_id = %s
-        """, (
-            data['progress'], 
-            data['progress_one_to_one'], 
-            data['progress_classroom'], 
-            data['current_stage'], 
-            data['course_id']
-        ))
-        
-        if cursor.rowcount == 0:
+        # 更新進度（同一門課的回報合併寫入，見 progress_buffer.py）
+        if not progress_buffer.update(course_id, user_id, data, conn=conn):
             return jsonify({"error": "更新失敗，可能是課程ID不存在"}), 404
-            
-        conn.commit()
+        events.progress(user_id, course_id, {field: data[field] for field in progress_buffer.FIELDS})
+
         return jsonify({"message": "進度更新成功"}), 200
         
+    except UNAVAILABLE_ERRORS:
+        raise  # 回 503 + Retry-After
     except Exception as e:
-        print(f"更新進度錯誤: {str(e)}")
-        if 'conn' in locals():
+        log.exception("更新進度錯誤: %s", e)
+        if locals().get('conn'):
             conn.rollback()
         return jsonify({"error": "更新進度時發生錯誤"}), 500
     finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
+        if locals().get('conn'):
             conn.close()
             
 # ✅ 拿取課程目錄進度
 @app.route('/get_chapter_progress', methods=['GET'])
+@query_budget(1)
 def get_chapter_progress():
     course_id = request.args.get('course_id')
     chapter_type = request.args.get('chapter_type')
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # 获取完成和总章节数
-    cursor.execute("""
-        SELECT COUNT(*) as total, 
-               SUM(is_completed) as completed
-        FROM CourseChapters
-        WHERE course_id = %s AND chapter_type = %s
-    """, (course_id, chapter_type))
-    
-    result = cursor.fetchone()
-    
-    cursor.close()
-    conn.close()
+    conn = get_db_connection(read_only=True)
+    try:
+        # 获取完成和总章节数
+        result = chapters.progress(conn, course_id, chapter_type)
+    finally:
+        conn.close()
     
     return jsonify({
         "total": result['total'],
         "completed": result['completed'] or 0
     })
 
+# ✅ /metrics 被讀取時更新目前的 VR session 數（容量規劃用）
+@metrics.on_scrape
+def update_vr_session_metrics():
+    conn = get_db_connection(read_only=True)
+    try:
+        stats = vr_sessions.stats(conn)
+    finally:
+        conn.close()
+    metrics.set_vr_sessions(stats["active"], stats["oldest_seconds"])
+
 # ✅ 繼續上課
 @app.route('/continue_course', methods=['POST'])
+@query_budget(3)
 def continue_course():
     try:
         data = request.json
@@ -886,112 +967,142 @@ def continue_course():
             return jsonify({"error": "缺少課程ID"}), 400
 
         conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "資料庫連接失敗"}), 500
-            
-        cursor = conn.cursor()
-        
         # 先檢查課程是否存在
-        cursor.execute("SELECT 1 FROM Courses WHERE course_id = %s", (course_id,))
-        if not cursor.fetchone():
-            return jsonify({"error": "課程不存在"}), 404
-            
-        # 更新課程狀態，使用台灣時區
-        cursor.execute("""
-            UPDATE Courses
-            SET is_vr_ready = TRUE, 
-                vr_started_at = %s
-            WHERE course_id = %s
-        """, (get_taiwan_now(), course_id))
-        
-        if cursor.rowcount == 0:
-            return jsonify({"error": "更新課程狀態失敗"}), 500
-            
-        conn.commit()
+        user_id = progress_buffer.owner(course_id)
+        if user_id is None:
+            course = courses.get_owner(conn, course_id)
+            if not course:
+                return jsonify({"error": "課程不存在"}), 404
+            user_id = course['user_id']
+            progress_buffer.remember(course_id, user_id)
+        conn.user_id = user_id  # 寫入後這個使用者的讀取走 primary
+
+        # 上一堂還沒寫進 DB 的進度一起寫；新的一堂課第一筆進度會直接寫（結束 VR Ready 狀態）
+        with progress_buffer.settle(conn, course_id) as settlement:
+            # 更新課程狀態，使用台灣時區
+            started_at = get_taiwan_now()
+            if courses.mark_vr_ready(conn, course_id, started_at) == 0:
+                return jsonify({"error": "更新課程狀態失敗"}), 500
+            # 登記成這個使用者目前的 VR session（/current_stage 用）
+            vr_sessions.start(conn, user_id, course_id, started_at)
+
+            conn.commit()
+            settlement.done(new_session=True, started_at=started_at)
+        metrics.record_vr_session_started()
+        events.course_ready(user_id, course_id, started_at.isoformat())
         return jsonify({"message": "課程已標記為 VR Ready，並開始 VR 時間"}), 200
         
+    except UNAVAILABLE_ERRORS:
+        raise  # 回 503 + Retry-After
     except Exception as e:
-        print(f"繼續課程錯誤: {str(e)}")
-        if 'conn' in locals():
+        log.exception("繼續課程錯誤: %s", e)
+        if locals().get('conn'):
             conn.rollback()
         return jsonify({"error": "繼續課程時發生錯誤"}), 500
     finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
+        if locals().get('conn'):
             conn.close()
 
+# ✅ 推播課程狀態給頭盔（SSE），取代輪詢 /current_stage，見 events.py
+@app.route('/events/<int:user_id>', methods=['GET'])
+def user_events(user_id):
+    return events.stream(events.user_channel(user_id))
+
+# ✅ 排行榜即時更新（SSE）：連上時送前10名，之後只送名次 / 點數的變化，取代輪詢 /daily_rankings、/weekly_rankings
+@app.route('/events/rankings/<board>', methods=['GET'])
+def ranking_events(board):
+    if board not in leaderboard_feed.BOARDS:
+        return jsonify({"error": "排行榜只有 daily / weekly"}), 404
+    return leaderboard_feed.stream(board)
+
 # ✅ 更新暱稱與頭像
 @app.route('/update_nickname/<int:user_id>', methods=['PUT'])
+@query_budget(1)
 def update_nickname(user_id):
     data = request.json
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE Users SET username=%s WHERE user_id=%s", (data['nickname'], user_id))
-    conn.commit()
+    try:
+        users.update_username(conn, user_id, data['nickname'])
+        user_cache.replaced(conn, user_id, username=data['nickname'])
+        invalidate_leaderboards(conn)
+        conn.commit()
+    finally:
+        conn.close()
     return jsonify({"message": "暱稱更新成功"}), 200
 
 # ✅ 更新頭貼
 @app.route('/update_avatar/<int:user_id>', methods=['PUT'])
+@query_budget(1)
 def update_avatar(user_id):
     data = request.json
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE Users SET avatar_id=%s WHERE user_id=%s", (data['avatar_id'], user_id))
-    conn.commit()
+    try:
+        users.update_avatar(conn, user_id, data['avatar_id'])
+        user_cache.replaced(conn, user_id, avatar_id=data['avatar_id'])
+        invalidate_leaderboards(conn)
+        conn.commit()
+    finally:
+        conn.close()
     return jsonify({"message": "頭像更新成功"}), 200
 
 # ✅ 刪除帳號
 @app.route('/delete_user/<int:user_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_user(user_id):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM Users WHERE user_id=%s", (user_id,))
-    conn.commit()
+    try:
+        # 先從當天 / 當週的點數分布拿掉（點數紀錄會跟著帳號一起刪除）
+        today = get_today()
+        week_start = today - timedelta(days=today.weekday())
+        rank_histogram.forget(conn, user_id, today, week_start, week_start + timedelta(days=6))
+        users.delete(conn, user_id)
+        user_cache.removed(conn, user_id)
+        invalidate_leaderboards(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    review_cache.invalidate_user(user_id)
     return jsonify({"message": "帳號已刪除"}), 200
 
 
 # ✅ 檢查成就
 @app.route('/check_achievements/<int:user_id>', methods=['POST'])
+@query_budget(4)
 def check_achievements(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # 取得該用戶的相關數據
-    cursor.execute("SELECT COUNT(*) AS course_count FROM Courses WHERE user_id=%s", (user_id,))
-    course_count = cursor.fetchone()["course_count"]
-
-    cursor.execute("SELECT total_learning_points FROM Users WHERE user_id=%s", (user_id,))
-    total_points = cursor.fetchone()["total_learning_points"]
-
-    cursor.execute("SELECT COUNT(*) AS completed_courses FROM Courses WHERE user_id=%s AND progress=100", (user_id,))
-    completed_courses = cursor.fetchone()["completed_courses"]
-
-    # **成就條件**
-    ACHIEVEMENT_RULES = {
-        "新增一門課程": {"condition": course_count >= 1, "reward": {"coins": 500, "diamonds": 0}},
-        "完整上完一門課": {"condition": completed_courses >= 1, "reward": {"coins": 1000, "diamonds": 1}},
-        "學習積分達到 500 分": {"condition": total_points >= 500, "reward": {"coins": 2000, "diamonds": 0}},
-    }
-
-    new_achievements = []
+    # 只寫 Achievements（不動 Users），不用先鎖；同時檢查撞到唯一索引的死結會重來
+    def check(conn):
+        # 取得該用戶的相關數據（課程數與完成數一次查完）
+        course_stats = courses.stats_by_user(conn, user_id)
+        course_count = course_stats["course_count"]
+        completed_courses = course_stats["completed_courses"]
+
+        profile = user_cache.get(conn, user_id)
+        total_points = profile["total_learning_points"] if profile else 0
+
+        # **成就條件**
+        ACHIEVEMENT_RULES = {
+            "新增一門課程": {"condition": course_count >= 1, "reward": {"coins": 500, "diamonds": 0}},
+            "完整上完一門課": {"condition": completed_courses >= 1, "reward": {"coins": 1000, "diamonds": 1}},
+            "學習積分達到 500 分": {"condition": total_points >= 500, "reward": {"coins": 2000, "diamonds": 0}},
+        }
 
-    for badge_name, rule in ACHIEVEMENT_RULES.items():
-        if rule["condition"]:
-            # 檢查是否已經擁有該成就
-            cursor.execute("SELECT 1 FROM Achievements WHERE user_id = %s AND badge_name = %s", (user_id, badge_name))
-            if not cursor.fetchone():
-                cursor.execute("INSERT INTO Achievements (user_id, badge_name) VALUES (%s, %s)", (user_id, badge_name))
-                new_achievements.append(badge_name)
+        # 一次查出已擁有的成就，不要每條規則各查一次
+        owned = achievements.owned_badges(conn, user_id)
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        new_achievements = [
+            badge_name for badge_name, rule in ACHIEVEMENT_RULES.items()
+            if rule["condition"] and badge_name not in owned
+        ]
+        achievements.add_badges(conn, user_id, new_achievements)
+        return new_achievements
 
+    new_achievements = transactions.run(check, user_id=user_id)
     return jsonify({"message": "成就檢查完成", "new_achievements": new_achievements}), 200
 
 # ✅ 領取成就獎勵
 @app.route('/claim_achievement/<int:user_id>', methods=['POST'])
+@query_budget(4)  # 鎖 Users + 3 次
+@ratelimit.per_user("30/minute")
 def claim_achievement(user_id):
     data = request.json
     badge_name = data.get("badge_name")
@@ -999,18 +1110,6 @@ def claim_achievement(user_id):
     if not badge_name:
         return jsonify({"error": "請提供要領取的成就名稱"}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # 確保用戶擁有該成就，且還未領取
-    cursor.execute("""
-        SELECT * FROM Achievements WHERE user_id = %s AND badge_name = %s AND is_claimed = FALSE
-    """, (user_id, badge_name))
-    achievement = cursor.fetchone()
-
-    if not achievement:
-        return jsonify({"error": "該成就不存在或已領取"}), 400
-
     # **獎勵對應表**
     ACHIEVEMENT_REWARDS = {
         "新增一門課程": {"coins": 500, "diamonds": 0},
@@ -1020,103 +1119,74 @@ def claim_achievement(user_id):
 
     reward = ACHIEVEMENT_REWARDS.get(badge_name)
 
-    if not reward:
-        return jsonify({"error": "無法獲取該成就的獎勵"}), 400
+    # 先鎖 Users 再碰 Achievements（transactions.run），同一個使用者同時領取會排隊，不會重複領
+    def claim(conn):
+        # 確保用戶擁有該成就，且還未領取
+        if not achievements.get_unclaimed(conn, user_id, badge_name):
+            return jsonify({"error": "該成就不存在或已領取"}), 400
 
-    # **更新用戶的金幣 & 鑽石**
-    cursor.execute("""
-        UPDATE Users SET coins = coins + %s, diamonds = diamonds + %s WHERE user_id = %s
-    """, (reward["coins"], reward["diamonds"], user_id))
+        if not reward:
+            return jsonify({"error": "無法獲取該成就的獎勵"}), 400
 
-    # **標記成就為已領取**
-    cursor.execute("""
-        UPDATE Achievements SET is_claimed = TRUE, claimed_at = NOW() WHERE user_id = %s AND badge_name = %s
-    """, (user_id, badge_name))
+        # **更新用戶的金幣 & 鑽石**
+        users.add_rewards(conn, user_id, coins=reward["coins"], diamonds=reward["diamonds"])
+        user_cache.changed(conn, user_id, coins=reward["coins"], diamonds=reward["diamonds"])
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        # **標記成就為已領取**
+        achievements.mark_claimed(conn, user_id, badge_name)
 
-    return jsonify({
-        "message": f"成功領取 {badge_name} 的獎勵！",
-        "coins_received": reward["coins"],
-        "diamonds_received": reward["diamonds"]
-    }), 200
+        return jsonify({
+            "message": f"成功領取 {badge_name} 的獎勵！",
+            "coins_received": reward["coins"],
+            "diamonds_received": reward["diamonds"]
+        }), 200
+
+    return transactions.run(claim, lock_user=user_id)
 
 # ✅ 查詢用戶所有擁有的徽章
 @app.route('/get_user_achievements/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@fallback.stale_on_error
 def get_user_achievements(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # 取得用戶所有擁有的成就
-    cursor.execute("""
-        SELECT badge_name, is_claimed FROM Achievements WHERE user_id = %s
-    """, (user_id,))
-    achievements = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
+    conn = get_db_connection(read_only=True)
+    try:
+        # 取得用戶所有擁有的成就
+        owned = achievements.list_by_user(conn, user_id)
+    finally:
+        conn.close()
 
     # 格式化輸出
-    return jsonify({"achievements": achievements}), 200
+    return jsonify({"achievements": owned}), 200
     
 # ✅ 查詢當週任務進度
 @app.route('/weekly_tasks/<int:user_id>', methods=['GET'])
+@query_budget(7)
 def get_weekly_tasks(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
     week_start = get_week_range()[0]  # 本週週一
     today = get_today()              # 今天（台灣日期）
 
-    # 刪除該用戶前一週（或非本週）的任務記錄
-    cursor.execute("DELETE FROM WeeklyTasks WHERE user_id = %s AND week_start <> %s", (user_id, week_start))
-    conn.commit()
-
-    # 若今天就是週一，則重置本週的所有任務 is_claimed 為 0
-    if today == week_start:
-        cursor.execute("""
-            UPDATE WeeklyTasks
-            SET is_claimed = 0
-            WHERE user_id = %s AND week_start = %s
-        """, (user_id, week_start))
-        conn.commit()
-
-    # 確保 WeeklyTasks 表中有該用戶該週的三筆記錄（若無則插入預設 0）
-    for task_id in [1, 2, 3]:
-        cursor.execute("""
-            INSERT INTO WeeklyTasks (user_id, task_id, week_start, is_claimed)
-            VALUES (%s, %s, %s, 0)
-            ON DUPLICATE KEY UPDATE is_claimed = is_claimed
-        """, (user_id, task_id, week_start))
-    conn.commit()
-
-    # 取得 WeeklyTasks 中的 is_claimed 狀態（回傳 0 或 1）
-    cursor.execute("""
-        SELECT task_id, is_claimed FROM WeeklyTasks
-        WHERE user_id = %s AND week_start = %s
-    """, (user_id, week_start))
-    claimed_tasks = {row["task_id"]: int(row["is_claimed"]) for row in cursor.fetchall()}
+    conn = get_db_connection()
+    try:
+        # 刪除該用戶前一週（或非本週）的任務記錄
+        tasks.delete_other_weeks(conn, user_id, week_start)
 
-    # 計算任務完成度
-    cursor.execute("""
-        SELECT COUNT(*) AS completed_courses FROM Courses
-        WHERE user_id = %s AND progress = 100 AND updated_at >= %s
-    """, (user_id, week_start))
-    completed_courses = cursor.fetchone()["completed_courses"]
+        # 若今天就是週一，則重置本週的所有任務 is_claimed 為 0
+        if today == week_start:
+            tasks.reset_claims(conn, user_id, week_start)
 
-    cursor.execute("""
-        SELECT COALESCE(SUM(daily_points), 0) AS weekly_points FROM LearningPointsLog
-        WHERE user_id = %s AND date >= %s
-    """, (user_id, week_start))
-    weekly_points = cursor.fetchone()["weekly_points"]
+        # 確保 WeeklyTasks 表中有該用戶該週的三筆記錄（若無則插入預設 0），一句 INSERT 寫完
+        tasks.ensure_rows(conn, user_id, week_start, [1, 2, 3])
+        conn.commit()
 
-    cursor.execute("SELECT weekly_streak FROM SigninRecords WHERE user_id = %s", (user_id,))
-    streak_record = cursor.fetchone()
-    weekly_streak = streak_record["weekly_streak"] if streak_record else 0
+        # 取得 WeeklyTasks 中的 is_claimed 狀態（回傳 0 或 1）
+        claimed_tasks = tasks.claimed_map(conn, user_id, week_start)
 
-    cursor.close()
-    conn.close()
+        # 計算任務完成度
+        completed_courses = courses.count_completed_since(conn, user_id, week_start)
+        weekly_points = points.sum_since(conn, user_id, week_start)
+        weekly_streak = signin.get_streak(conn, user_id)
+    finally:
+        conn.close()
 
     # 回傳 JSON，將 is_claimed 以 0 或 1 表示
     return jsonify({
@@ -1183,6 +1253,8 @@ def claim_weekly_task():
 
 # ✅ 領取每週任務獎勵
 @app.route('/claim_weekly_task', methods=['POST'])
+@query_budget(5)  # 鎖 Users + 4 次
+@ratelimit.per_user("30/minute")
 def claim_weekly_task():
     data = request.json
     user_id = data.get("user_id")
@@ -1191,284 +1263,174 @@ def claim_weekly_task():
     if task_id not in [1, 2, 3]:
         return jsonify({"error": "無效的任務 ID"}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
     week_start = get_week_range()[0]
 
-    # 確保有 WeeklyTasks 記錄（若無則插入預設 0）
-    cursor.execute("""
-        INSERT INTO WeeklyTasks (user_id, task_id, week_start, is_claimed)
-        VALUES (%s, %s, %s, 0)
-        ON DUPLICATE KEY UPDATE is_claimed = is_claimed
-    """, (user_id, task_id, week_start))
-    conn.commit()
+    # 給用戶加獎勵金幣（此處設定每個任務獎勵 1000 金幣，可依需求調整）
+    reward_coins = 1000
 
-    # 檢查是否達標（依據不同任務條件）
-    task_conditions = {
-        1: "SELECT COUNT(*) AS completed FROM Courses WHERE user_id = %s AND progress = 100 AND updated_at >= %s",
-        2: "SELECT COALESCE(SUM(daily_points), 0) AS completed FROM LearningPointsLog WHERE user_id = %s AND date >= %s",
-        3: "SELECT weekly_streak AS completed FROM SigninRecords WHERE user_id = %s"
-    }
-    # 根據 task_id 決定傳入幾個參數
-    if task_id == 3:
-        cursor.execute(task_conditions[task_id], (user_id,))
-    else:
-        cursor.execute(task_conditions[task_id], (user_id, week_start))
-    completed = cursor.fetchone()["completed"]
+    # 先鎖 Users 再碰 WeeklyTasks（transactions.run），整段是同一個交易
+    def claim(conn):
+        # 確保有 WeeklyTasks 記錄（若無則插入預設 0）
+        tasks.ensure_rows(conn, user_id, week_start, [task_id])
 
-    if (task_id == 1 and completed < 5) or (task_id == 2 and completed < 1000) or (task_id == 3 and completed < 7):
-        return jsonify({"error": "任務尚未完成"}), 400
+        # 檢查是否達標（依據不同任務條件）
+        completed = tasks.task_progress(conn, user_id, task_id, week_start)
 
-    # 標記該任務已領取（設為 1）
-    cursor.execute("""
-        UPDATE WeeklyTasks SET is_claimed = 1
-        WHERE user_id = %s AND task_id = %s AND week_start = %s
-    """, (user_id, task_id, week_start))
+        if (task_id == 1 and completed < 5) or (task_id == 2 and completed < 1000) or (task_id == 3 and completed < 7):
+            return jsonify({"error": "任務尚未完成"}), 400
 
-    # 給用戶加獎勵金幣（此處設定每個任務獎勵 1000 金幣，可依需求調整）
-    reward_coins = 1000
-    cursor.execute("UPDATE Users SET coins = coins + %s WHERE user_id = %s", (reward_coins, user_id))
+        # 標記該任務已領取（設為 1）
+        tasks.mark_claimed(conn, user_id, task_id, week_start)
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        users.add_rewards(conn, user_id, coins=reward_coins)
+        user_cache.changed(conn, user_id, coins=reward_coins)
 
-    return jsonify({
-        "message": "成功領取獎勵！",
-        "task_id": task_id,
-        "reward_coins": reward_coins
-    }), 200
+        return jsonify({
+            "message": "成功領取獎勵！",
+            "task_id": task_id,
+            "reward_coins": reward_coins
+        }), 200
+
+    return transactions.run(claim, lock_user=user_id)
     
 # ✅ 收藏pre課程（修正重複插入問題）
 @app.route('/save_course', methods=['POST'])
+@query_budget(1)
 def save_course():
     data = request.json
     user_id = data.get("user_id")
     course_name = data.get("course_name")
 
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT IGNORE INTO SavedCourses (user_id, course_name) VALUES (%s, %s)
-    """, (user_id, course_name))
-    conn.commit()
-
-    cursor.close()
-    conn.close()
+    try:
+        courses.save(conn, user_id, course_name)
+        conn.commit()
+    finally:
+        conn.close()
 
     return jsonify({"message": "課程收藏成功"}), 200
 
 # ✅ 查詢用戶的收藏 pre 課程
 @app.route('/saved_courses/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@fallback.stale_on_error
 def get_saved_courses(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("SELECT course_name FROM SavedCourses WHERE user_id = %s", (user_id,))
-    saved_courses = [row["course_name"] for row in cursor.fetchall()]
-
-    cursor.close()
-    conn.close()
+    conn = get_db_connection(read_only=True)
+    try:
+        saved_courses = courses.list_saved(conn, user_id)
+    finally:
+        conn.close()
 
     return jsonify({"saved_courses": saved_courses}), 200
 
 # ✅ 取消收藏 pre 課程
 @app.route('/remove_course', methods=['POST'])
+@query_budget(1)
 def remove_course():
     data = request.json
     user_id = data.get("user_id")
     course_name = data.get("course_name")
 
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        DELETE FROM SavedCourses WHERE user_id = %s AND course_name = %s
-    """, (user_id, course_name))
-    rows_affected = cursor.rowcount  # 獲取影響的行數
-    conn.commit()
-
-    cursor.close()
-    conn.close()
+    try:
+        rows_affected = courses.remove_saved(conn, user_id, course_name)  # 獲取影響的行數
+        conn.commit()
+    finally:
+        conn.close()
 
     if rows_affected > 0:
         return jsonify({"message": "課程已取消收藏"}), 200
     else:
         return jsonify({"error": "該課程未收藏或已刪除"}), 400
 
-# ✅ 獲取課程回顧資料
+# ✅ 獲取課程回顧資料（評價建立後不會再變，組好的回應會快取）
 @app.route('/course_review/<int:course_id>', methods=['GET'])
+@query_budget(2)
+@fallback.stale_on_error
 def get_course_review(course_id):
-    print(f"🔍 开始获取课程回顾数据 - CourseID: {course_id}")
-    conn = None
-    cursor = None
-    
-    try:
-        conn = get_db_connection()
-        if not conn:
-            print("❌ 数据库连接失败")
-            return jsonify({"error": "数据库连接失败"}), 500
-            
-        cursor = conn.cursor(dictionary=True, buffered=True)  # 使用 buffered cursor
-        
-        # 检查课程是否存在，并获取 user_id
-        print(f"🔍 查询课程信息 - CourseID: {course_id}")
-        cursor.execute("""
-            SELECT course_id, user_id, course_name 
-            FROM Courses 
-            WHERE course_id = %s
-        """, (course_id,))
-        course = cursor.fetchone()
-        
-        if not course:
-            print(f"❌ 课程不存在 - CourseID: {course_id}")
-            return jsonify({"error": "课程不存在"}), 404
-
-        print(f"✅ 找到课程信息 - CourseID: {course_id}, UserID: {course['user_id']}, CourseName: {course['course_name']}")
-
-        # 查询课程评价数据
-        print(f"🔍 查询课程评价数据 - CourseID: {course_id}, UserID: {course['user_id']}")
-        cursor.execute("""
-            SELECT accuracy_score, understanding_score, expression_score, interaction_score,
-                   teacher_comment, student1_feedback, student2_feedback, student3_feedback,
-                   good_points, improvement_points, review_id
-            FROM CourseReviews
-            WHERE course_id = %s AND user_id = %s
-        """, (course_id, course['user_id']))
-        
-        review_data = cursor.fetchone()
-        print(f"📊 评价数据查询结果: {review_data}")
-        
-        # 如果没有找到评价数据，使用默认值
-        if not review_data:
-            print(f"⚠️ 未找到评价数据，尝试创建默认评价 - CourseID: {course_id}, UserID: {course['user_id']}")
-            try:
-                default_review = {
-                    "accuracy_score": 50,
-                    "understanding_score": 50,
-                    "expression_score": 50,
-                    "interaction_score": 50,
-                    "teacher_comment": "今天的表现非常出色，特别是在概念解释方面有明显进步。你对核心理论的掌握度很高，建议下次可以多举一些生活中的例子，让概念更容易理解。",
-                    "student1_feedback": "你把复杂的概念讲得很清楚！尤其是在解释那个难懂的部分时，用了很好的比喻，让我一下就理解了。",
-                    "student2_feedback": "我觉得你的逻辑思维很清晰，解题过程也很有条理。如果能多分享一些实际应用的场景就更好了。",
-                    "student3_feedback": "你提出的观点很有创意！让我看到这个理论的新角度。期待下次能听到更多你的想法。",
-                    "good_points": json.dumps(["概念解释清晰准确", "举例生动有趣", "与同学互动热络"]),
-                    "improvement_points": json.dumps(["可以多分享实际应用场景", "建议控制节奏，不要说太快"])
-                }
-                
-                print("📝 准备插入默认评价数据")
-                cursor.execute("""
-                    INSERT INTO CourseReviews 
-                    (course_id, user_id, accuracy_score, understanding_score, expression_score, 
-                     interaction_score, teacher_comment, student1_feedback, student2_feedback, 
-                     student3_feedback, good_points, improvement_points)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    course_id, course['user_id'],
-                    default_review["accuracy_score"],
-                    default_review["understanding_score"],
-                    default_review["expression_score"],
-                    default_review["interaction_score"],
-                    default_review["teacher_comment"],
-                    default_review["student1_feedback"],
-                    default_review["student2_feedback"],
-                    default_review["student3_feedback"],
-                    default_review["good_points"],
-                    default_review["improvement_points"]
-                ))
-                conn.commit()
-                print("✅ 已插入默认评价数据")
-                review_data = default_review
-            except Exception as e:
-                print(f"❌ 插入默认评价数据失败: {str(e)}")
-                print(f"❌ 错误详情: {type(e).__name__}")
-                if hasattr(e, 'args'):
-                    print(f"❌ 错误参数: {e.args}")
-                return jsonify({"error": f"创建默认评价数据失败: {str(e)}"}), 500
-
-        print("✅ 开始查询课程积分")
-        # 查询课程积分
-        cursor.execute("""
-            SELECT earned_points
-            FROM CoursePointsLog
-            WHERE course_id = %s
-        """, (course_id,))
-        
-        points_data = cursor.fetchone()
-        earned_points = points_data['earned_points'] if points_data else 156
-        print(f"📈 积分数据: {earned_points}")
+    review_log.debug("🔍 开始获取课程回顾数据 - CourseID: %s", course_id)
 
-        # 处理 JSON 字段
-        good_points = []
-        improvement_points = []
-        
+    found, missing = review_cache.lookup([course_id])
+    if missing:
+        conn = get_db_connection(read_only=True)
         try:
-            if review_data.get('good_points'):
-                good_points = json.loads(review_data['good_points'])
-            if review_data.get('improvement_points'):
-                improvement_points = json.loads(review_data['improvement_points'])
-        except json.JSONDecodeError as e:
-            print(f"⚠️ JSON 解析错误: {str(e)}")
-            print(f"⚠️ good_points 原始数据: {review_data.get('good_points')}")
-            print(f"⚠️ improvement_points 原始数据: {review_data.get('improvement_points')}")
-            good_points = []
-            improvement_points = []
-
-        # 组合返回数据
-        response_data = {
-            "accuracy_score": review_data.get("accuracy_score", 50),
-            "understanding_score": review_data.get("understanding_score", 50),
-            "expression_score": review_data.get("expression_score", 50),
-            "interaction_score": review_data.get("interaction_score", 50),
-            "teacher_comment": review_data.get("teacher_comment", ""),
-            "student1_feedback": review_data.get("student1_feedback", ""),
-            "student2_feedback": review_data.get("student2_feedback", ""),
-            "student3_feedback": review_data.get("student3_feedback", ""),
-            "earned_points": earned_points,
-            "good_points": good_points,
-            "improvement_points": improvement_points
-        }
+            found = review_cache.load(conn, missing)
+        except UNAVAILABLE_ERRORS:
+            raise  # 回 503 + Retry-After
+        except Exception as e:
+            review_log.exception("❌ 获取课程回顾数据时发生错误: %s", e)
+            return jsonify({"error": f"获取课程回顾数据时发生错误: {str(e)}"}), 500
+        finally:
+            conn.close()
 
-        print("✅ 成功获取课程回顾数据")
-        return jsonify(response_data)
+    if course_id not in found:
+        review_log.info("❌ 课程不存在 - CourseID: %s", course_id)
+        return jsonify({"error": "课程不存在"}), 404
 
-    except Exception as e:
-        print(f"❌ 获取课程回顾数据时发生错误: {str(e)}")
-        print(f"❌ 错误类型: {type(e).__name__}")
-        if hasattr(e, 'args'):
-            print(f"❌ 错误参数: {e.args}")
-        if 'conn' in locals() and conn.is_connected():
-            conn.rollback()
-        return jsonify({"error": f"获取课程回顾数据时发生错误: {str(e)}"}), 500
+    review_log.debug("✅ 成功获取课程回顾数据")
+    return jsonify(found[course_id])
 
-    finally:
+# ✅ 一次取得多門課的課程回顧（回顧紀錄頁面用）：/course_reviews?ids=1,2,3
+MAX_REVIEW_BATCH = 100
+
+@app.route('/course_reviews', methods=['GET'])
+@query_budget(2)
+@fallback.stale_on_error
+def get_course_reviews():
+    try:
+        course_ids = list(dict.fromkeys(int(i) for i in request.args.get('ids', '').split(',') if i.strip()))
+    except ValueError:
+        return jsonify({"error": "ids 必須是以逗號分隔的課程 ID"}), 400
+    if not course_ids:
+        return jsonify({"error": "缺少必要參數 ids"}), 400
+    if len(course_ids) > MAX_REVIEW_BATCH:
+        return jsonify({"error": f"一次最多查詢 {MAX_REVIEW_BATCH} 門課程"}), 400
+
+    found, missing = review_cache.lookup(course_ids)
+    if missing:
+        conn = get_db_connection(read_only=True)
         try:
-            if cursor:
-                cursor.close()
-            if conn and conn.is_connected():
-                conn.close()
-            print("✅ 数据库连接已关闭")
+            found.update(review_cache.load(conn, missing))
+        except UNAVAILABLE_ERRORS:
+            raise  # 回 503 + Retry-After
         except Exception as e:
-            print(f"⚠️ 关闭数据库连接时发生错误: {str(e)}")
-            # 不抛出异常，因为这是在 finally 块中 
-        
+            review_log.exception("❌ 获取课程回顾数据时发生错误: %s", e)
+            return jsonify({"error": f"获取课程回顾数据时发生错误: {str(e)}"}), 500
+        finally:
+            conn.close()
+
+    return jsonify({
+        "reviews": [dict(found[course_id], course_id=course_id) for course_id in course_ids if course_id in found],
+        "not_found": [course_id for course_id in course_ids if course_id not in found]
+    }), 200
+
 # ✅ 抽卡
 @app.route('/draw_card/<int:user_id>', methods=['POST'])
+@query_budget(6)  # 鎖 Users + 5 次（使用者快取沒有時再 +1）
+@ratelimit.per_user("30/minute")
+@idempotency.idempotent
 def draw_card(user_id):
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "資料庫連接失敗"}), 500
-            
-        cursor = conn.cursor(dictionary=True)
-        
-        # 獲取抽卡類型（普通/高級）
-        draw_type = request.args.get('type', 'normal')
-        
-        # 獲取用戶當前資源
-        cursor.execute("SELECT coins, diamonds FROM Users WHERE user_id = %s", (user_id,))
-        user = cursor.fetchone()
+    # 獲取抽卡類型（普通/高級）
+    draw_type = request.args.get('type', 'normal')
+
+    # 設定抽卡機率
+    if draw_type == 'normal':
+        probabilities = {
+            '絕密': 0.05,   # 絕密 5%
+            '機密': 0.25,  # 機密 25%
+            '隱密': 0.7   # 隱密 70%
+        }
+    else:
+        probabilities = {
+            '絕密': 0.15,   # 絕密 15%
+            '機密': 0.35,  # 機密 35%
+            '隱密': 0.5   # 隱密 50%
+        }
+
+    # 先鎖 Users 再碰 UserCards（transactions.run）；死結重來時會重新抽一次
+    def draw(conn):
+        # 獲取用戶當前資源（從使用者快取）
+        user = user_cache.get(conn, user_id)
         
         if not user:
             return jsonify({"error": "用戶不存在"}), 404
@@ -1479,66 +1441,33 @@ def draw_card(user_id):
         elif draw_type == 'premium' and user['diamonds'] < 3:
             return jsonify({"error": "鑽石不足"}), 400
         
-        # 設定抽卡機率
-        if draw_type == 'normal':
-            probabilities = {
-                '絕密': 0.05,   # 絕密 5%
-                '機密': 0.25,  # 機密 25%
-                '隱密': 0.7   # 隱密 70%
-            }
-        else:
-            probabilities = {
-                '絕密': 0.15,   # 絕密 15%
-                '機密': 0.35,  # 機密 35%
-                '隱密': 0.5   # 隱密 50%
-            }
-        
         # 隨機抽取卡片
-        import random
         rarity = random.choices(list(probabilities.keys()), weights=list(probabilities.values()))[0]
         
         # 根據稀有度選擇卡片
-        cursor.execute("""
-            SELECT card_id, name, rarity 
-            FROM Cards 
-            WHERE rarity = %s 
-            ORDER BY RAND() 
-            LIMIT 1
-        """, (rarity,))
-        card = cursor.fetchone()
+        card = cards.random_card(conn, rarity)
         
         if not card:
             return jsonify({"error": "找不到對應稀有度的卡片"}), 500
 
         # 檢查用戶是否已經擁有這張卡片
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM UserCards 
-            WHERE user_id = %s AND card_id = %s
-        """, (user_id, card['card_id']))
-        card_count = cursor.fetchone()['count']
+        card_count = cards.count_owned(conn, user_id, card['card_id'])
         
-        # 扣除資源
+        # 扣除資源（快取的餘額可能是舊的，真正夠不夠以這句 UPDATE 為準）
         if draw_type == 'normal':
-            cursor.execute("UPDATE Users SET coins = coins - 500 WHERE user_id = %s", (user_id,))
+            if not users.spend(conn, user_id, coins=500):
+                return jsonify({"error": "金幣不足"}), 400
+            user_cache.changed(conn, user_id, coins=-500)
         else:
-            cursor.execute("UPDATE Users SET diamonds = diamonds - 3 WHERE user_id = %s", (user_id,))
+            if not users.spend(conn, user_id, diamonds=3):
+                return jsonify({"error": "鑽石不足"}), 400
+            user_cache.changed(conn, user_id, diamonds=-3)
         
         # 記錄抽卡結果（使用 UserCards 表）
-
-        cursor.execute("""
-            INSERT INTO UserCards (user_id, card_id, obtained_date)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE obtained_date = %s
-        """, (user_id, card['card_id'], get_taiwan_now(), get_taiwan_now()))
+        cards.grant(conn, user_id, card['card_id'], get_taiwan_now())
         
         # 獲取更新後的資源數量
-        cursor.execute("SELECT coins, diamonds FROM Users WHERE user_id = %s", (user_id,))
-        updated_user = cursor.fetchone()
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        updated_user = users.get_balance(conn, user_id)
         
         return jsonify({
             "success": True,
@@ -1549,37 +1478,54 @@ def draw_card(user_id):
             "remaining_diamonds": updated_user['diamonds'],
             "is_new_teacher_card": (card_count == 0)  # 如果是第一次獲得這張卡片就是 true
         }), 200
-        
+
+    try:
+        return transactions.run(draw, lock_user=user_id)
+    except UNAVAILABLE_ERRORS:
+        raise  # 回 503 + Retry-After
     except Exception as e:
-        print(f"抽卡錯誤: {str(e)}")
-        if 'conn' in locals():
-            conn.rollback()
-            conn.close()
+        log.exception("抽卡錯誤: %s", e)
         return jsonify({"error": "抽卡過程中發生錯誤"}), 500
 
 # ✅ 獲取用戶擁有的卡片
 @app.route('/user_cards/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@fallback.stale_on_error
 def get_user_cards(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # 查询用户拥有的所有卡片
-    cursor.execute("""
-        SELECT C.card_id, C.name, C.rarity, UC.is_selected
-        FROM Cards C
-        JOIN UserCards UC ON C.card_id = UC.card_id
-        WHERE UC.user_id = %s
-    """, (user_id,))
-    
-    cards = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+    conn = get_db_connection(read_only=True)
+    try:
+        # 查询用户拥有的所有卡片
+        user_cards = cards.list_user_cards(conn, user_id)
+    finally:
+        conn.close()
     
     return jsonify({
-        "cards": cards
+        "cards": user_cards
     }), 200
 
+# ✅ 卡片圖鑑（所有卡片）
+@app.route('/cards', methods=['GET'])
+@query_budget(1)
+@fallback.stale_on_error
+def get_card_catalog():
+    # 共用快照裡已經是序列化好的回應，直接送出
+    data = snapshots.get_bytes("cards")
+    if data is not None:
+        response = app.response_class(data, mimetype="application/json")
+    else:
+        conn = get_db_connection(read_only=True)
+        try:
+            catalog = cards.list_all(conn)
+        finally:
+            conn.close()
+        response = jsonify({
+            "cards": catalog
+        })
+
+    # 卡片只有上架新卡（快照重建）時才會變：壓縮結果可以快取，client 快取 5 分鐘後用 ETag 確認
+    compression.mark_revalidate(max_age=300)
+    return response, 200
+
 # ✅ 選擇老師卡片
 '''@app.route('/select_teacher_card', methods=['POST'])
 def select_teacher_card():
@@ -1626,32 +1572,18 @@ def select_teacher_card():
 
 # ✅ 選擇老師卡片
 @app.route('/select_teacher_card', methods=['POST'])
+@query_budget(2)
 def select_teacher_card():
     data = request.json
     user_id = data.get('user_id')
     card_id = data.get('card_id')
     
     conn = get_db_connection()
-    cursor = conn.cursor()
     
     try:
-        # 先将该用户所有卡片设置为未选中
-        cursor.execute("""
-            UPDATE UserCards 
-            SET is_selected = 0
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        # 将选中的卡片设置为已选中
-        cursor.execute("""
-            UPDATE UserCards 
-            SET is_selected = 1
-            WHERE user_id = %s AND card_id = %s
-        """, (user_id, card_id))
-        
+        # 先将该用户所有卡片设置为未选中，再将选中的卡片设置为已选中
+        cards.select_teacher_card(conn, user_id, card_id)
         conn.commit()
-        cursor.close()
-        conn.close()
         
         return jsonify({
             "message": "老師卡片選擇成功",
@@ -1659,14 +1591,16 @@ def select_teacher_card():
             "success": True
         }), 200
         
+    except UNAVAILABLE_ERRORS:
+        raise  # 回 503 + Retry-After
     except Exception as e:
         conn.rollback()
-        cursor.close()
-        conn.close()
         return jsonify({
             "error": f"選擇老師卡片發生錯誤: {str(e)}",
             "success": False
         }), 500
+    finally:
+        conn.close()
 
 if __name__ == '__main__':
     app.run(debug=False, host='0.0.0.0', port=8000)
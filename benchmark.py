@@ -0,0 +1,508 @@
+# ✅ 壓力測試 / 效能基準工具
+#
+# 用法：
+#   python benchmark.py --mix mixed --duration 30 --concurrency 16 --users 1-1000
+#   python benchmark.py --base-url http://127.0.0.1:8000 --mix ranking
+#   python benchmark.py --compare bench/old.json bench/new.json
+#   python benchmark.py --json-bench                 # 只比較 JSON 序列化（Flask 內建 vs orjson）
+#   python benchmark.py --signin-race 20 --concurrency 8   # 同時領簽到獎勵，確認只有一個成功
+#
+# 不指定 --base-url 時直接在程序內用 Flask test client 打 app.py（連 DATABASE_URL 指定的
+# 本機 MySQL / MariaDB），可以精準算出每個請求的 SQL 次數；
+# 指定 --base-url 時打真的 HTTP 伺服器，SQL 次數讀回應的 X-DB-Queries 標頭
+# （伺服器要設 METRICS_DEBUG_HEADERS=1），否則用 MySQL 的 Questions 計數器估算整體平均。
+#
+# prep 欄是每個請求有幾句 SQL 重用了 prepared statement（= 省掉幾次 MySQL 解析，讀 X-DB-Prepared 標頭），
+# 結果 JSON 的 totals.mysql_status 另外記下整段測試期間 MySQL 的 Com_stmt_prepare / Com_stmt_execute 增加量。
+# 要量 prepared statement 的效果：分別用 DB_PREPARED_STATEMENTS=0 / 1 跑一次再 --compare。
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlparse
+
+
+# ✅ 各種情境：每個情境回傳一串 (名稱, 方法, 路徑, JSON body) 依序送出
+def scenario_home(rng, user_id):
+    # 首頁一打開就會一起發出的請求
+    return [
+        ("GET /user/<id>", "GET", f"/user/{user_id}", None),
+        ("GET /weekly_points/<id>", "GET", f"/weekly_points/{user_id}", None),
+        ("GET /courses_count/<id>", "GET", f"/courses_count/{user_id}", None),
+        ("GET /latest_course/<id>", "GET", f"/latest_course/{user_id}", None),
+        ("GET /signin/status/<id>", "GET", f"/signin/status/{user_id}", None),
+        ("GET /weekly_tasks/<id>", "GET", f"/weekly_tasks/{user_id}", None),
+        ("GET /courses/<id>", "GET", f"/courses/{user_id}", None),
+    ]
+
+
+def scenario_vr(rng, user_id):
+    # VR 端上課時不斷回報學習點數
+    return [
+        ("POST /update_learning_points", "POST", "/update_learning_points",
+         {"user_id": user_id, "points": rng.randint(1, 20)})
+        for _ in range(rng.randint(3, 10))
+    ]
+
+
+def scenario_ranking(rng, user_id):
+    # 排行榜畫面定時輪詢
+    return [
+        ("GET /daily_rankings", "GET", f"/daily_rankings?user_id={user_id}", None),
+        ("GET /weekly_rankings", "GET", f"/weekly_rankings?user_id={user_id}", None),
+    ]
+
+
+def scenario_draw(rng, user_id):
+    # 連續抽卡
+    draw_type = "premium" if rng.random() < 0.2 else "normal"
+    return [
+        ("POST /draw_card/<id>", "POST", f"/draw_card/{user_id}?type={draw_type}", None)
+        for _ in range(rng.randint(1, 10))
+    ]
+
+
+SCENARIOS = {
+    "home": scenario_home,
+    "vr": scenario_vr,
+    "ranking": scenario_ranking,
+    "draw": scenario_draw,
+}
+
+# ✅ 情境權重（mixed 模擬正式環境的流量比例）
+MIXES = {
+    "home": {"home": 1},
+    "vr": {"vr": 1},
+    "ranking": {"ranking": 1},
+    "draw": {"draw": 1},
+    "mixed": {"home": 4, "vr": 3, "ranking": 2, "draw": 1},
+}
+
+
+# ✅ 程序內 client：直接呼叫 app.py，SQL 次數讀回應的 X-DB-Queries 標頭
+# （metrics.py 在每個請求裡計數，transactions.run()、progress_buffer 等不經過 app.get_db_connection 的也算得到）
+class InProcessClient:
+    def __init__(self):
+        # 所有請求都來自同一個 IP，壓測時不限流（要量限流本身的開銷就明確設 RATELIMIT_ENABLED=1）
+        os.environ.setdefault("RATELIMIT_ENABLED", "0")
+        # 回應帶 X-DB-Queries / X-DB-Prepared
+        os.environ["METRICS_DEBUG_HEADERS"] = "1"
+        import app as app_module
+
+        self._client = app_module.app.test_client()
+
+    def request(self, method, path, body):
+        resp = self._client.open(path, method=method, json=body)
+        queries = resp.headers.get("X-DB-Queries")
+        prepared = resp.headers.get("X-DB-Prepared")
+        return (resp.status_code, len(resp.get_data()), int(queries) if queries else 0,
+                int(prepared) if prepared else None)
+
+
+# ✅ HTTP client：每個執行緒各自一條 keep-alive 連線
+class HttpClient:
+    def __init__(self, base_url):
+        parsed = urlparse(base_url)
+        self._host = parsed.hostname
+        self._port = parsed.port or 80
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self._host, self._port, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method, path, body):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        try:
+            conn = self._conn()
+            conn.request(method, path, body=payload, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.HTTPException, OSError):
+            self._local.conn = None
+            raise
+        # 伺服器開了 METRICS_DEBUG_HEADERS=1 時可以拿到精確的 SQL 次數
+        queries = resp.getheader("X-DB-Queries")
+        prepared = resp.getheader("X-DB-Prepared")
+        return (resp.status, len(data), int(queries) if queries is not None else None,
+                int(prepared) if prepared is not None else None)
+
+
+# ✅ 從 MySQL 讀取計數器：Questions（HTTP 模式下估算 SQL 次數用）、prepared statement 的 PREPARE / EXECUTE 次數
+MYSQL_STATUS = ("Questions", "Com_stmt_prepare", "Com_stmt_execute", "Com_stmt_reprepare")
+
+
+def read_mysql_status():
+    try:
+        from db import backend, db_config
+        import mysql.connector
+
+        if backend.dialect != "mysql":
+            return None
+
+        conn = mysql.connector.connect(**db_config)
+        cursor = conn.cursor()
+        cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN (%s, %s, %s, %s)", MYSQL_STATUS)
+        values = {name: int(value) for name, value in cursor.fetchall()}
+        cursor.close()
+        conn.close()
+        return values
+    except Exception as e:
+        print(f"⚠️ 無法讀取 MySQL 狀態計數器: {e}")
+        return None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # nearest-rank 百分位數
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_user_range(text):
+    start, _, end = text.partition("-")
+    start = int(start)
+    end = int(end) if end else start
+    return start, end
+
+
+def run(client, mix, duration, concurrency, user_range, seed):
+    weights = MIXES[mix]
+    names = list(weights.keys())
+    scenario_weights = [weights[n] for n in names]
+
+    samples = defaultdict(list)     # 名稱 -> [(延遲秒數, status, bytes, queries, prepared)]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        local_samples = defaultdict(list)
+        while time.perf_counter() < deadline:
+            user_id = rng.randint(*user_range)
+            scenario = SCENARIOS[rng.choices(names, weights=scenario_weights)[0]]
+            for name, method, path, body in scenario(rng, user_id):
+                start = time.perf_counter()
+                try:
+                    status, size, queries, prepared = client.request(method, path, body)
+                except Exception as e:
+                    status, size, queries, prepared = f"error:{type(e).__name__}", 0, None, None
+                local_samples[name].append((time.perf_counter() - start, status, size, queries, prepared))
+                if time.perf_counter() >= deadline:
+                    break
+        with lock:
+            for name, values in local_samples.items():
+                samples[name].extend(values)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def summarize(samples, elapsed):
+    endpoints = {}
+    for name, values in sorted(samples.items()):
+        latencies = sorted(v[0] * 1000 for v in values)
+        statuses = defaultdict(int)
+        for v in values:
+            statuses[str(v[1])] += 1
+        queries = [v[3] for v in values if v[3] is not None]
+        prepared = [v[4] for v in values if v[4] is not None]
+        errors = sum(c for s, c in statuses.items() if not s.isdigit() or int(s) >= 500)
+        endpoints[name] = {
+            "count": len(values),
+            "errors": errors,
+            "statuses": dict(statuses),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "max_ms": round(latencies[-1], 3),
+            "mean_bytes": round(sum(v[2] for v in values) / len(values), 1),
+            "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+            "prepared_per_request": round(sum(prepared) / len(prepared), 2) if prepared else None,
+        }
+    return endpoints
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def print_table(endpoints):
+    header = f"{'endpoint':<34}{'count':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'q/req':>7}{'prep':>6}{'err':>6}"
+    print(header)
+    print("-" * len(header))
+    for name, s in endpoints.items():
+        q = "-" if s["queries_per_request"] is None else f"{s['queries_per_request']:.1f}"
+        prep = "-" if s.get("prepared_per_request") is None else f"{s['prepared_per_request']:.1f}"
+        print(f"{name:<34}{s['count']:>8}{s['throughput_rps']:>9.1f}{s['p50_ms']:>9.2f}"
+              f"{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}{q:>7}{prep:>6}{s['errors']:>6}")
+
+
+# ✅ 比較兩次結果（例如不同 commit）
+def compare(old_path, new_path):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"舊: {old['meta'].get('commit')} ({old_path})")
+    print(f"新: {new['meta'].get('commit')} ({new_path})")
+    header = f"{'endpoint':<34}{'p50 Δ%':>10}{'p95 Δ%':>10}{'p99 Δ%':>10}{'rps Δ%':>10}{'q/req':>12}{'prep':>12}"
+    print(header)
+    print("-" * len(header))
+
+    def delta(a, b):
+        if not a or b is None:
+            return "-"
+        return f"{(b - a) / a * 100:+.1f}"
+
+    for name in sorted(set(old["endpoints"]) | set(new["endpoints"])):
+        a = old["endpoints"].get(name)
+        b = new["endpoints"].get(name)
+        if not a or not b:
+            print(f"{name:<34}{'(只存在其中一邊)':>20}")
+            continue
+        q = f"{a['queries_per_request']}→{b['queries_per_request']}"
+        prep = f"{a.get('prepared_per_request')}→{b.get('prepared_per_request')}"
+        print(f"{name:<34}{delta(a['p50_ms'], b['p50_ms']):>10}{delta(a['p95_ms'], b['p95_ms']):>10}"
+              f"{delta(a['p99_ms'], b['p99_ms']):>10}{delta(a['throughput_rps'], b['throughput_rps']):>10}{q:>12}"
+              f"{prep:>12}")
+
+
+# ✅ JSON 序列化 micro-benchmark：用接近真實大小的回應比較 Flask 內建 json 與 orjson
+def json_payloads():
+    from decimal import Decimal
+
+    rng = random.Random(1)
+    now = datetime(2025, 1, 6, 10, 30)
+    topics = ["微積分", "線性代數", "機率與統計", "資料結構", "演算法", "普通物理", "有機化學", "台灣史"]
+    courses = [{
+        "course_id": i, "user_id": 42, "course_name": f"{rng.choice(topics)}第{i}章重點整理",
+        "progress": rng.choice([0.0, 50.0, 100.0]), "progress_one_to_one": 100.0, "progress_classroom": 0.0,
+        "current_stage": "classroom", "is_favorite": rng.randint(0, 1), "is_vr_ready": 0,
+        "vr_started_at": now, "file_type": "pdf", "teacher_card_id": None,
+        "created_at": now, "updated_at": now,
+    } for i in range(50)]
+    rankings = {
+        "date": "2025-01-06",
+        "rankings": [{"user_id": i, "username": f"學習者{i}", "avatar_id": i % 8,
+                      "daily_points": Decimal(rng.randint(100, 5000)), "ranking": i} for i in range(1, 11)],
+        "userRank": {"user_id": 99, "username": "學習者99", "avatar_id": 3,
+                     "daily_points": Decimal(120), "ranking": 523},
+    }
+    review = {
+        "accuracy_score": 82, "understanding_score": 75, "expression_score": 90, "interaction_score": 68,
+        "teacher_comment": "今天的表現非常出色，特別是在概念解釋方面有明顯進步。" * 4,
+        "student1_feedback": "你把複雜的概念講得很清楚！尤其是在解釋那個難懂的部分時，用了很好的比喻。" * 2,
+        "student2_feedback": "我覺得你的邏輯思維很清晰，解題過程也很有條理。" * 2,
+        "student3_feedback": "你提出的觀點很有創意！讓我看到這個理論的新角度。" * 2,
+        "earned_points": 156,
+        "good_points": ["概念解釋清晰準確", "舉例生動有趣", "與同學互動熱絡"],
+        "improvement_points": ["可以多分享實際應用場景", "建議控制節奏，不要說太快"],
+    }
+    cards = {"cards": [{"card_id": i, "name": f"老師卡{i:02d}", "rarity": rng.choice(["絕密", "機密", "隱密"]),
+                        "is_selected": int(i == 3)} for i in range(60)]}
+    return {"courses": courses, "rankings": rankings, "course_review": review, "user_cards": cards}
+
+
+def json_bench(iterations):
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+
+    import json_provider
+
+    app = Flask("json-bench")
+    builtin = DefaultJSONProvider(app)
+    builtin.ensure_ascii = False
+    fast = json_provider.FastJSONProvider(app)
+    # 跟 jsonify 回應時一樣用緊湊格式
+    providers = {"flask": lambda obj: builtin.dumps(obj, separators=(",", ":"))}
+    if json_provider.orjson is not None:
+        providers["orjson"] = fast.dumps
+    else:
+        print("⚠️ 沒有安裝 orjson，只量測 Flask 內建 json")
+
+    header = f"{'payload':<16}{'provider':<10}{'bytes':>9}{'µs/op':>10}{'MB/s':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, payload in json_payloads().items():
+        reference = json.loads(builtin.dumps(payload))
+        for provider_name, dumps in providers.items():
+            encoded = dumps(payload)
+            # 輸出內容要跟 Flask 內建的完全相同
+            if json.loads(encoded) != reference:
+                print(f"❌ {name} 的 {provider_name} 輸出與 Flask 內建不同")
+            start = time.perf_counter()
+            for _ in range(iterations):
+                dumps(payload)
+            per_op = (time.perf_counter() - start) / iterations
+            size = len(encoded.encode("utf-8"))
+            print(f"{name:<16}{provider_name:<10}{size:>9}{per_op * 1e6:>10.1f}{size / per_op / 1e6:>9.1f}")
+
+
+# ✅ 併發測試：同一個使用者同時送出多個領取簽到獎勵的請求，應該只有一個成功、獎勵只加一次
+def signin_race(client, rounds, concurrency, user_range, seed):
+    import db
+    from repositories import signin
+
+    rng = random.Random(seed)
+    conn = db.connect_raw()
+    cursor = conn.cursor()
+    failures = 0
+    try:
+        for round_no in range(1, rounds + 1):
+            user_id = rng.randint(*user_range)
+            # 把簽到記錄改成今天還沒領過（沒有記錄就建立）
+            cursor.execute("DELETE FROM SigninRecords WHERE user_id = %s", (user_id,))
+            cursor.execute("INSERT INTO SigninRecords (user_id, signin_day, has_claimed_today, last_signin_date, "
+                           "weekly_streak) VALUES (%s, 1, 0, NULL, 0)", (user_id,))
+            cursor.execute("SELECT total_signin_days, coins, diamonds FROM Users WHERE user_id = %s", (user_id,))
+            before = cursor.fetchone()
+            conn.commit()
+            if before is None:
+                print(f"⚠️ 使用者 {user_id} 不存在，略過")
+                continue
+
+            barrier = threading.Barrier(concurrency)
+            statuses = []
+            lock = threading.Lock()
+
+            def claim():
+                barrier.wait()
+                status = client.request("POST", f"/signin/claim/{user_id}", None)[0]
+                with lock:
+                    statuses.append(status)
+
+            threads = [threading.Thread(target=claim) for _ in range(concurrency)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            cursor.execute("SELECT total_signin_days, coins, diamonds FROM Users WHERE user_id = %s", (user_id,))
+            after = cursor.fetchone()
+            conn.commit()
+            succeeded = statuses.count(200)
+            reward = after[0] - before[0], after[1] - before[1], after[2] - before[2]
+            expected = signin.REWARDS[1]
+            ok = succeeded == 1 and reward == (1, expected["coins"], expected["diamonds"])
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} 第 {round_no} 輪 user {user_id}：{concurrency} 個請求 {succeeded} 個成功，"
+                  f"簽到天數 +{reward[0]}、金幣 +{reward[1]}、鑽石 +{reward[2]}（狀態碼 {sorted(statuses)}）")
+    finally:
+        cursor.close()
+        conn.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FeynDora API 壓力測試")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--duration", type=float, default=30, help="測試秒數")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時發送請求的執行緒數")
+    parser.add_argument("--users", default="1-1000", help="使用者 ID 範圍，例如 1-1000")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--base-url", help="打真的 HTTP 伺服器（預設在程序內直接呼叫 app）")
+    parser.add_argument("--out", help="結果 JSON 路徑（預設 bench/<commit>-<mix>.json）")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="比較兩份結果 JSON")
+    parser.add_argument("--json-bench", nargs="?", type=int, const=2000, metavar="N",
+                        help="只跑 JSON 序列化 micro-benchmark（每種回應序列化 N 次）")
+    parser.add_argument("--signin-race", type=int, metavar="ROUNDS",
+                        help="只跑簽到併發測試：每輪 --concurrency 個請求同時領同一個使用者的簽到獎勵")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.json_bench:
+        json_bench(args.json_bench)
+        return
+
+    user_range = parse_user_range(args.users)
+    client = HttpClient(args.base_url) if args.base_url else InProcessClient()
+
+    if args.signin_race:
+        failures = signin_race(client, args.signin_race, args.concurrency, user_range, args.seed)
+        print(f"\n{args.signin_race} 輪中 {failures} 輪失敗")
+        raise SystemExit(1 if failures else 0)
+
+    status_before = read_mysql_status()
+    samples, elapsed = run(client, args.mix, args.duration, args.concurrency, user_range, args.seed)
+    status_after = read_mysql_status()
+
+    endpoints = summarize(samples, elapsed)
+    total_requests = sum(s["count"] for s in endpoints.values())
+    totals = {
+        "requests": total_requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total_requests / elapsed, 2) if elapsed else 0,
+    }
+    if status_before and status_after:
+        # MySQL 整台伺服器的計數（包含其他連線）
+        totals["mysql_status"] = {name: status_after.get(name, 0) - status_before.get(name, 0) for name in MYSQL_STATUS}
+        if args.base_url and total_requests:
+            # HTTP 模式只能估算整體平均
+            totals["queries_per_request_estimate"] = round(totals["mysql_status"]["Questions"] / total_requests, 2)
+
+    commit = git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "mix": args.mix,
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "seed": args.seed,
+            "target": args.base_url or "in-process",
+        },
+        "totals": totals,
+        "endpoints": endpoints,
+    }
+
+    print_table(endpoints)
+    print(f"\n總計 {total_requests} 個請求，{totals['throughput_rps']} req/s")
+    if "mysql_status" in totals:
+        mysql_status = totals["mysql_status"]
+        print(f"MySQL：PREPARE {mysql_status['Com_stmt_prepare']} 次、EXECUTE {mysql_status['Com_stmt_execute']} 次、"
+              f"重新 PREPARE {mysql_status['Com_stmt_reprepare']} 次")
+
+    out = args.out or os.path.join("bench", f"{commit or 'nocommit'}-{args.mix}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"✅ 結果已寫入 {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# ✅ 斷路器：DB 連續失敗就先「斷開」，之後的請求直接失敗，不要每個都卡到連線逾時
+#
+#   closed     正常；連續失敗 DB_BREAKER_FAILURES 次（預設 5）→ open
+#   open       直接拒絕，DB_BREAKER_RESET 秒後（預設 10）→ half_open
+#   half_open  只放 DB_BREAKER_PROBES 個請求（預設 1）去試，成功 → closed，失敗 → 回到 open
+#              試的請求一直沒有結果（例如沒下 SQL）的話，再過 DB_BREAKER_RESET 秒會放下一批
+#
+# 狀態放在每個 worker 自己的記憶體：每個 worker 各自判斷，最多多浪費幾次失敗。
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger("feyndora.db.breaker")
+
+FAILURE_THRESHOLD = int(os.getenv("DB_BREAKER_FAILURES", "5"))
+RESET_TIMEOUT = float(os.getenv("DB_BREAKER_RESET", "10"))
+HALF_OPEN_PROBES = int(os.getenv("DB_BREAKER_PROBES", "1"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT,
+                 half_open_probes=HALF_OPEN_PROBES, on_change=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self._on_change = on_change
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+    # ✅ 這個請求可以碰 DB 嗎？斷開時回傳 False
+    def allow(self):
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                if self.state == OPEN or self._probes >= self.half_open_probes:
+                    return False
+            else:
+                # 冷卻時間到（或上一批試探一直沒有結果），放新的一批
+                self._opened_at = time.monotonic()
+                self._probes = 0
+                self._set_state(HALF_OPEN)
+            self._probes += 1
+            return True
+
+    def success(self):
+        if self.state == CLOSED and self.failures == 0:
+            return
+        with self._lock:
+            self.failures = 0
+            self._set_state(CLOSED)
+
+    def failure(self):
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    # 還要幾秒才會再試（給 Retry-After 用）
+    def retry_after(self):
+        if self.state == CLOSED:
+            return 0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        previous, self.state = self.state, state
+        level = logging.INFO if state != OPEN else logging.WARNING
+        log.log(level, "DB 斷路器 %s: %s → %s", self.name, previous, state,
+                extra={"breaker": self.name, "failures": self.failures})
+        if self._on_change is not None:
+            self._on_change(self.name, state)
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures,
+                "retry_after": round(self.retry_after(), 3)}
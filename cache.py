@@ -0,0 +1,76 @@
+# ✅ 行程內的 LRU 快取（每個 worker 各自一份）
+#
+# maxsize 是容量上限：預設每筆算 1（= 最多幾筆），給 weigh 的話用 weigh(value) 計算（例如 len = bytes 數）。
+# ttl（秒）可以不給；給了的話過期的資料會當成沒有（不同 worker 的快取無法互相通知，用 ttl 限制最久會舊多久）。
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, maxsize, ttl=None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._weigh = weigh or (lambda value: 1)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        weight = self._weigh(value)
+        if weight > self.maxsize:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, expires_at, weight)
+            self.weight += weight
+            while self.weight > self.maxsize:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.weight -= evicted
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._remove(key)
+        return entry[0] if entry is not None else None
+
+    # 刪掉所有符合條件的資料（例如某個使用者的），回傳刪了幾筆
+    def discard_if(self, predicate):
+        with self._lock:
+            keys = [key for key, (value, _, _) in self._entries.items() if predicate(key, value)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {"entries": len(self._entries), "weight": self.weight, "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses}
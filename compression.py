@@ -0,0 +1,137 @@
+# ✅ 回應壓縮：依 Accept-Encoding 選 br / zstd / gzip（br、zstd 要另外裝 brotli、zstandard 才會啟用）
+#
+# COMPRESS_MIN_SIZE       小於這個大小（bytes）不壓縮（預設 1024，太小的回應壓了反而更大、更慢）
+# COMPRESS_LEVEL          gzip 等級 1-9（預設 6）
+# COMPRESS_BR_LEVEL       brotli 等級 0-11（預設 5）
+# COMPRESS_ZSTD_LEVEL     zstd 等級 1-22（預設 3）
+# COMPRESS_ALGORITHMS     伺服器偏好順序（預設 "br,zstd,gzip"），設成空字串就關閉壓縮
+# COMPRESS_CACHE_BYTES    不會變 / 很少變的回應（mark_immutable、mark_revalidate）壓縮結果的快取上限（預設 8MB，0 = 不快取）
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import g, request
+
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # brotli 是選配
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard 是選配
+    zstandard = None
+
+MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+BR_LEVEL = int(os.getenv("COMPRESS_BR_LEVEL", "5"))
+ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", "3"))
+CACHE_BYTES = int(os.getenv("COMPRESS_CACHE_BYTES", str(8 * 1024 * 1024)))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def _gzip(data):
+    # mtime=0：同樣的內容壓出同樣的 bytes
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=BR_LEVEL)
+
+
+_zstd_local = threading.local()
+
+
+def _zstd(data):
+    compressor = getattr(_zstd_local, "compressor", None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return compressor.compress(data)
+
+
+CODECS = {"gzip": _gzip}
+if brotli is not None:
+    CODECS["br"] = _brotli
+if zstandard is not None:
+    CODECS["zstd"] = _zstd
+
+ALGORITHMS = [name.strip() for name in os.getenv("COMPRESS_ALGORITHMS", "br,zstd,gzip").split(",")
+              if name.strip() in CODECS]
+
+
+# ✅ 壓縮結果的快取（只給 mark_immutable / mark_revalidate 的回應用），以內容的 hash 當 key、用壓縮後的 bytes 數計算容量
+_cache = LRUCache(CACHE_BYTES, weigh=len)
+
+
+# ✅ 告訴壓縮層「這個回應內容不會再變」：壓縮結果會被快取，並加上 Cache-Control 讓 client / CDN 也能快取
+def mark_immutable(max_age=86400):
+    g.response_immutable_max_age = max_age
+
+
+# ✅ 很少變、但還是會變的回應（例如快照重建後的卡片圖鑑）：client 最多快取 max_age 秒，
+# 之後帶 If-None-Match 回來問，內容沒變回 304（不用再下載一次）；壓縮結果一樣會快取
+def mark_revalidate(max_age=300):
+    g.response_revalidate_max_age = max_age
+
+
+def negotiate():
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+    for name in ALGORITHMS:
+        quality = accepted.quality(name)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compress(data, encoding, cacheable):
+    if not cacheable or CACHE_BYTES <= 0:
+        return CODECS[encoding](data)
+    key = (encoding, hashlib.blake2b(data, digest_size=16).digest())
+    compressed = _cache.get(key)
+    if compressed is None:
+        compressed = CODECS[encoding](data)
+        _cache.put(key, compressed)
+    return compressed
+
+
+def _after_request(response):
+    max_age = g.get("response_immutable_max_age")
+    revalidate_max_age = g.get("response_revalidate_max_age")
+    if response.status_code == 200:
+        if max_age is not None:
+            response.headers["Cache-Control"] = f"public, max-age={max_age}, immutable"
+        elif revalidate_max_age is not None:
+            response.headers["Cache-Control"] = f"public, max-age={revalidate_max_age}"
+            # 用壓縮前的內容算，所以是 weak ETag（不同壓縮方式的 bytes 不一樣，但內容相同）
+            response.add_etag(weak=True)
+            response.make_conditional(request)
+
+    if (not ALGORITHMS or request.method == "HEAD" or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or not (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate()
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding, cacheable=max_age is not None or revalidate_max_age is not None))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def stats():
+    return {"algorithms": ALGORITHMS, "cache": _cache.stats()}
+
+
+def init_app(app):
+    app.after_request(_after_request)
@@ -0,0 +1,336 @@
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+from flask import has_request_context, request
+
+import metrics
+import query_log
+import statements
+from breaker import CircuitBreaker
+from pool import ConnectionPool, PoolTimeout
+from repositories.backends import MySQLBackend, create_backend
+from shm import SharedExpiryMap
+
+log = logging.getLogger("feyndora.db")
+
+
+def parse_database_url(database_url):
+    url = urlparse(database_url)
+    return {
+        'host': url.hostname,
+        'user': url.username,
+        'password': url.password,
+        'database': url.path[1:],
+        'port': url.port
+    }
+
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+if DATABASE_URL:
+    db_config = parse_database_url(DATABASE_URL)
+else:
+    db_config = {
+        'host': '127.0.0.1',
+        'user': 'root',
+        'password': 'my-secret-pw',
+        'database': 'feyndora'
+    }
+
+# DB_BACKEND=sqlite 時改用內嵌 SQLite（SQLITE_PATH 指定檔案），不需要 MySQL 伺服器
+backend = create_backend(os.getenv("DB_BACKEND", "mysql"), db_config, os.getenv("SQLITE_PATH", "feyndora.db"))
+primary_pool = ConnectionPool("primary", backend.connect)
+primary_breaker = CircuitBreaker("primary", on_change=metrics.record_breaker)
+
+
+# ✅ 拿不到 DB 連線（斷路器開啟中、連線失敗、連線池等待逾時），retry_after 是建議幾秒後再試
+class DatabaseUnavailable(Exception):
+    def __init__(self, message, retry_after=0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ✅ DB 無法使用：拿不到連線，或查詢途中連線中斷 / 逾時。API 裡的 except Exception 前要先放行這些，
+# 才會回 503 + Retry-After（讀取 API 回傳過期的回應，見 fallback.py），不會變成 500
+UNAVAILABLE_ERRORS = (DatabaseUnavailable,) + backend.unavailable_errors
+
+# ✅ 讀寫分離（只支援 MySQL）
+# DATABASE_REPLICA_URLS     逗號分隔的唯讀 replica，唯讀的 API 會分流過去
+# REPLICA_MAX_LAG           複寫延遲超過幾秒就暫停使用該 replica（預設 5）
+# REPLICA_CHECK_INTERVAL    幾秒檢查一次 replica 延遲（預設 5）
+# READ_YOUR_WRITES_SECONDS  使用者寫入後幾秒內，他的讀取都走 primary（預設 = REPLICA_MAX_LAG）
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", str(REPLICA_MAX_LAG)))
+
+
+class Replica:
+    def __init__(self, name, config):
+        self.name = name
+        self.pool = ConnectionPool(name, MySQLBackend(config).connect)
+        # 第一次檢查前先當作正常
+        self.healthy = True
+        self.lag = None
+
+    def check(self):
+        try:
+            raw = self.pool.acquire()
+        except (PoolTimeout,) + backend.errors as e:
+            self._set_health(False, f"無法連線: {e}")
+            return
+        try:
+            cursor = raw.cursor(dictionary=True)
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except backend.errors:
+                # MySQL 8.0.22 以前 / MariaDB
+                cursor.execute("SHOW SLAVE STATUS")
+            status = cursor.fetchone()
+            cursor.close()
+        except backend.errors as e:
+            self.pool.release(raw, discard=True)
+            self._set_health(False, f"查詢複寫狀態失敗: {e}")
+            return
+        self.pool.release(raw)
+
+        if not status:
+            # 沒有設定複寫（例如手動同步的唯讀主機），視為沒有延遲
+            self.lag = 0
+        else:
+            self.lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+        if self.lag is None:
+            self._set_health(False, "複寫已停止")
+        elif self.lag > REPLICA_MAX_LAG:
+            self._set_health(False, f"延遲 {self.lag} 秒")
+        else:
+            self._set_health(True, f"延遲 {self.lag} 秒")
+
+    def _set_health(self, healthy, reason):
+        if healthy != self.healthy:
+            level = logging.INFO if healthy else logging.WARNING
+            log.log(level, "replica %s %s: %s", self.name, "恢復使用" if healthy else "暫停使用", reason)
+        self.healthy = healthy
+
+
+replicas = []
+if backend.dialect == "mysql":
+    for i, replica_url in enumerate(filter(None, (u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",")))):
+        replicas.append(Replica(f"replica{i + 1}", parse_database_url(replica_url)))
+
+_health_pid = None
+_health_lock = threading.Lock()
+_recent_writers = None
+
+
+def _health_loop():
+    while True:
+        for replica in replicas:
+            replica.check()
+        time.sleep(REPLICA_CHECK_INTERVAL)
+
+
+# 每個 worker 第一次分流時才啟動背景檢查（gunicorn fork 之後執行緒不會跟過來）
+def _ensure_health_checks():
+    global _health_pid
+    if _health_pid == os.getpid():
+        return
+    with _health_lock:
+        if _health_pid != os.getpid():
+            _health_pid = os.getpid()
+            threading.Thread(target=_health_loop, name="replica-health", daemon=True).start()
+
+
+# ✅ 最近寫過資料的使用者（跨 worker 共用），這段時間內讀取都走 primary
+def _writers():
+    global _recent_writers
+    if _recent_writers is None:
+        _recent_writers = SharedExpiryMap("recent-writers")
+    return _recent_writers
+
+
+def _mark_written(user_id):
+    _writers().touch(user_id, READ_YOUR_WRITES_SECONDS)
+
+
+def _recently_wrote(user_id):
+    return user_id is not None and _writers().get(user_id) is not None
+
+
+# 沒有明確傳 user_id 時，從網址 / query string / JSON body 找
+def request_user_id():
+    if not has_request_context():
+        return None
+    user_id = (request.view_args or {}).get("user_id") or request.args.get("user_id")
+    if user_id is None:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            user_id = body.get("user_id")
+    try:
+        return int(user_id) if user_id is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# ✅ 包一層 cursor：每次 execute 計時、計算回傳筆數（給 /metrics 用），太慢的記進慢查詢 log
+# 連線中斷、逾時記到斷路器，成功的話斷路器歸零
+# 熱門 SQL（repositories.hot）改用這條連線的 prepared statement 執行（statements.py）
+class InstrumentedCursor:
+    def __init__(self, cursor, breaker=None, raw=None, dictionary=False):
+        self._cursor = cursor
+        self._result = cursor
+        self._breaker = breaker
+        self._raw = raw
+        self._dictionary = dictionary
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        result = None
+        try:
+            statement_cache = statements.cache_for(self._raw) if self._raw is not None else None
+            if statement_cache is not None and not args and not kwargs and statements.is_hot(operation):
+                self._result, reused = statement_cache.execute(self._raw, operation, params, self._dictionary)
+                metrics.record_prepared(reused)
+            else:
+                self._result = self._cursor
+                result = self._cursor.execute(operation, params, *args, **kwargs)
+        except backend.unavailable_errors:
+            if self._breaker is not None:
+                self._breaker.failure()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.record_query(elapsed)
+            query_log.check_slow_query(operation, params, elapsed)
+        if self._breaker is not None:
+            self._breaker.success()
+        return result
+
+    def fetchone(self):
+        row = self._result.fetchone()
+        if row is not None:
+            metrics.record_rows(1)
+        return row
+
+    def fetchall(self):
+        rows = self._result.fetchall()
+        metrics.record_rows(len(rows))
+        return rows
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._result.fetchmany(*args, **kwargs)
+        metrics.record_rows(len(rows))
+        return rows
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    # rowcount、lastrowid、description 跟著最後一次 execute 走
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, pool=None, role="primary", user_id=None, breaker=None):
+        self._conn = conn
+        self._pool = pool
+        self.role = role
+        self.user_id = user_id
+        self._breaker = breaker
+        self._after_commit = []
+
+    @property
+    def dialect(self):
+        return backend.dialect
+
+    def cursor(self, *args, **kwargs):
+        # prepared statement 只有 MySQL 用（SQLite 本來就會快取 statement）
+        raw = self._conn if backend.dialect == "mysql" and not args and not kwargs.get("raw") else None
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._breaker, raw,
+                                  dictionary=kwargs.get("dictionary", False))
+
+    def commit(self):
+        self._conn.commit()
+        # 寫入後一段時間內，這個使用者的讀取改走 primary，才看得到自己剛寫的資料
+        if replicas and self.role == "primary" and self.user_id is not None:
+            _mark_written(self.user_id)
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._after_commit = []
+        self._conn.rollback()
+
+    # ✅ commit 成功後才執行（例如更新快取）；rollback 或沒 commit 就 close 的話不會執行
+    def on_commit(self, callback):
+        self._after_commit.append(callback)
+
+    # 放回連線池（可以重複呼叫）
+    def close(self):
+        self._after_commit = []
+        raw, self._conn = self._conn, None
+        if raw is None:
+            return
+        if self._pool is not None:
+            self._pool.release(raw)
+        else:
+            raw.close()
+
+    def is_connected(self):
+        return self._conn is not None
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# ✅ 沒有包裝的原始連線（工具程式、EXPLAIN 用）
+def connect_raw():
+    return backend.connect()
+
+
+def pool_stats():
+    return {"primary": dict(primary_pool.stats(), breaker=primary_breaker.stats()),
+            **{r.name: r.pool.stats() for r in replicas}}
+
+
+# ✅ read_only=True 的 API 分流到 replica；寫入、剛寫過資料的使用者、replica 延遲太大時走 primary
+# 拿不到連線丟 DatabaseUnavailable（app 回 503）；primary 斷路器開啟中會直接丟，不等連線逾時
+def get_db_connection(read_only=False, user_id=None):
+    start = time.perf_counter()
+    try:
+        if user_id is None and replicas:
+            user_id = request_user_id()
+        if read_only and replicas and not _recently_wrote(user_id):
+            _ensure_health_checks()
+            healthy = [r for r in replicas if r.healthy]
+            if healthy:
+                replica = random.choice(healthy)
+                try:
+                    conn = InstrumentedConnection(replica.pool.acquire(), replica.pool, role="replica")
+                    metrics.record_route("replica")
+                    return conn
+                except PoolTimeout as e:
+                    log.warning("replica 連線池已滿，改走 primary: %s", e, extra={"replica": replica.name})
+                except backend.errors as e:
+                    log.warning("replica 連線失敗，改走 primary: %s", e, extra={"replica": replica.name})
+                    replica.healthy = False
+        if not primary_breaker.allow():
+            raise DatabaseUnavailable("資料庫暫時無法使用（斷路器開啟中）", primary_breaker.retry_after())
+        try:
+            raw = primary_pool.acquire()
+        except (PoolTimeout,) + backend.errors as e:
+            primary_breaker.failure()
+            log.error("資料庫連接錯誤: %s", e)
+            raise DatabaseUnavailable(f"資料庫連接錯誤: {e}", primary_breaker.retry_after()) from e
+        conn = InstrumentedConnection(raw, primary_pool, role="primary", user_id=user_id, breaker=primary_breaker)
+        metrics.record_route("primary")
+        return conn
+    finally:
+        metrics.record_connection_wait(time.perf_counter() - start)
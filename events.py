@@ -0,0 +1,163 @@
+# ✅ 推播給頭盔 / 前端的事件（Server-Sent Events），取代一直輪詢 /current_stage
+#
+# GET /events/<user_id> 保持連線，這個使用者的課程有變化時送出：
+#   course_ready     /continue_course：課程已標記為 VR Ready（data: course_id, started_at）
+#   progress         /update_progress：進度更新（data: course_id + 四個進度欄位）
+#   course_finished  /finish_course：課程已結束（data: course_id）
+#   resync           中間有事件沒送到，client 要自己重新查一次 /current_stage
+# 每個事件的 id 是 pub/sub 的序號，斷線重連時瀏覽器會自動帶 Last-Event-ID，還在緩衝區裡的事件會補送。
+# 事件透過 pubsub.py 跨 worker 分送，哪個 worker 收到寫入請求都一樣。
+# GET /events/rankings/<daily|weekly> 是排行榜的即時更新，見 leaderboard_feed.py。
+#
+# 每條連線佔一個 worker 執行緒（start.sh 用 gthread），所以每個 worker 有上限，
+# 超過回 503 + Retry-After，client 這段時間退回輪詢。
+#   EVENTS_MAX_STREAMS   每個 worker 最多幾條連線（預設 GUNICORN_THREADS 的一半，沒設就是 16）
+#   EVENTS_KEEPALIVE     多久沒事件就送一行註解，避免被 proxy 斷線（預設 15 秒）
+#   EVENTS_MAX_AGE       一條連線最多開多久，到了讓 client 重連，worker 重啟時不會卡著（預設 600 秒）
+#   EVENTS_RETRY_MS      告訴瀏覽器斷線後隔多久重連（預設 3000 毫秒）
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import Response, jsonify, request
+
+import metrics
+import pubsub
+
+log = logging.getLogger("feyndora.events")
+
+MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", str(max(1, int(os.getenv("GUNICORN_THREADS", "32")) // 2))))
+KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+MAX_AGE = float(os.getenv("EVENTS_MAX_AGE", "600"))
+RETRY_MS = int(os.getenv("EVENTS_RETRY_MS", "3000"))
+RETRY_AFTER = 5
+
+COURSE_READY = "course_ready"
+PROGRESS = "progress"
+COURSE_FINISHED = "course_finished"
+
+_open = 0
+_open_lock = threading.Lock()
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+# ✅ 發布到使用者的頻道；推播失敗不影響 API 本身（client 還會輪詢）
+def publish(user_id, event, data):
+    try:
+        pubsub.publish(user_channel(user_id), event, data)
+    except Exception as e:
+        log.warning("發布事件失敗: %s", e, extra={"user_id": user_id, "event": event})
+
+
+def course_ready(user_id, course_id, started_at):
+    publish(user_id, COURSE_READY, {"course_id": course_id, "started_at": started_at})
+
+
+def progress(user_id, course_id, values):
+    publish(user_id, PROGRESS, {"course_id": course_id, **values})
+
+
+def course_finished(user_id, course_id):
+    publish(user_id, COURSE_FINISHED, {"course_id": course_id})
+
+
+def _acquire():
+    global _open
+    with _open_lock:
+        if _open >= MAX_STREAMS:
+            return False
+        _open += 1
+        return True
+
+
+def _release():
+    global _open
+    with _open_lock:
+        _open -= 1
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _format(message):
+    if message is pubsub.RESYNC:
+        return "event: resync\ndata: null\n\n"
+    return f"id: {message.seq}\nevent: {message.event}\ndata: {_dumps(message.data)}\n\n"
+
+
+def _last_event_id():
+    value = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+# ✅ 回傳這個頻道的 SSE 回應；連線數滿了回 503
+# snapshot：回傳 (version, 完整資料) 的函式（例如排行榜）。有的話連上時先送一次 snapshot 事件，
+# 之後只轉送 version 比它新的訊息；漏掉訊息或收到 reset 時重新送 snapshot，不用 client 自己重查
+def stream(channel, name="user", snapshot=None):
+    if not _acquire():
+        metrics.record_rejected("event_streams")
+        response = jsonify({"error": "推播連線已滿，請先改用輪詢"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(RETRY_AFTER)
+        return response
+
+    try:
+        # 有完整快照可以送的頻道不用補送
+        since = _last_event_id() if snapshot is None else None
+        subscription = pubsub.subscribe(channel, since=since)
+    except Exception:
+        _release()
+        raise
+
+    def generate():
+        metrics.event_stream_opened(name)
+        deadline = time.monotonic() + MAX_AGE
+        version = 0
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if snapshot is not None:
+                # 先訂閱再讀快照，中間的變化不會漏掉（已經包含在快照裡的由 version 擋掉）
+                current = snapshot()
+                if current is not None:
+                    version = current[0]
+                    yield f"event: snapshot\ndata: {_dumps(current[1])}\n\n"
+            while time.monotonic() < deadline:
+                message = subscription.get(timeout=min(KEEPALIVE, max(0.0, deadline - time.monotonic())))
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if snapshot is None:
+                    yield _format(message)
+                    continue
+                if message is not pubsub.RESYNC and message.data["version"] <= version:
+                    continue
+                if message is pubsub.RESYNC or message.event == "reset":
+                    current = snapshot()
+                    if current is not None:
+                        version = current[0]
+                        yield f"event: snapshot\ndata: {_dumps(current[1])}\n\n"
+                    continue
+                version = message.data["version"]
+                yield _format(message)
+        finally:
+            metrics.event_stream_closed(name)
+
+    def close():
+        subscription.close()
+        _release()
+
+    response = Response(generate(), mimetype="text/event-stream")
+    # client 斷線時 gunicorn 寫入失敗會關掉回應；generator 還沒開始跑也會呼叫
+    response.call_on_close(close)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # Nginx 不要緩衝
+    return response
@@ -0,0 +1,74 @@
+# ✅ DB 掛掉時的備援：讀取 API 回傳上一次成功的回應（標記為過期），其他 API 快速回 503
+#
+# 加了 @stale_on_error 的 GET API，每次成功（200）都把回應存一份在 worker 記憶體裡（以完整網址為 key）；
+# 之後 DB 無法使用（斷路器開啟、連不上、連線中斷）時改回傳這份，帶上：
+#   Warning: 110 - "Response is Stale"
+#   Age: 距離這份回應產生過了幾秒
+# 沒存過的話照樣回 503 + Retry-After。
+#
+# STALE_CACHE_BYTES   每個 worker 最多存多少 bytes（預設 16MB，LRU 淘汰）
+# STALE_CACHE_TTL     最舊可以回傳幾秒前的回應（預設 86400）
+import functools
+import logging
+import math
+import os
+import time
+
+from flask import current_app, jsonify, request
+
+import db
+import metrics
+from cache import LRUCache
+
+log = logging.getLogger("feyndora.fallback")
+
+CACHE_BYTES = int(os.getenv("STALE_CACHE_BYTES", str(16 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("STALE_CACHE_TTL", "86400"))
+
+# 完整網址 → (產生時間, content_type, body)
+_cache = LRUCache(CACHE_BYTES, ttl=CACHE_TTL, weigh=lambda entry: len(entry[2]))
+
+
+# ✅ 放在 @app.route 下面（跟 @query_budget 一樣）
+def stale_on_error(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.full_path
+        try:
+            response = current_app.make_response(fn(*args, **kwargs))
+        except db.UNAVAILABLE_ERRORS as e:
+            entry = _cache.get(key)
+            if entry is None:
+                raise
+            created_at, content_type, body = entry
+            log.warning("DB 無法使用，回傳過期的回應: %s", e, extra={"path": key, "age": time.time() - created_at})
+            metrics.record_stale()
+            response = current_app.response_class(body, content_type=content_type)
+            response.headers["Warning"] = '110 - "Response is Stale"'
+            response.headers["Age"] = str(int(time.time() - created_at))
+            response.headers["Cache-Control"] = "no-store"
+            return response
+
+        if response.status_code == 200 and not response.is_streamed and not response.direct_passthrough:
+            _cache.put(key, (time.time(), response.content_type, response.get_data()))
+        return response
+
+    return wrapper
+
+
+def _database_unavailable(e):
+    metrics.record_rejected("db_unavailable")
+    retry_after = getattr(e, "retry_after", 0) or 1
+    response = jsonify({"error": "資料庫暫時無法使用，請稍後再試"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(math.ceil(retry_after))
+    return response
+
+
+def stats():
+    return _cache.stats()
+
+
+def init_app(app):
+    for error in db.UNAVAILABLE_ERRORS:
+        app.register_error_handler(error, _database_unavailable)
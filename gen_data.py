@@ -0,0 +1,357 @@
+# ✅ 產生大量假資料（壓力測試 / 排行榜、搜尋、成就效能測試用）
+#
+# 用法：
+#   python gen_data.py --users 100000 --days 60 --seed 1 --truncate
+#   python gen_data.py --users 2000000 --load-data          # 用 LOAD DATA LOCAL INFILE 匯入
+#   DB_BACKEND=sqlite SQLITE_PATH=bench.db python gen_data.py --users 10000   # 寫進內嵌 SQLite
+#
+# 所有假帳號的密碼都是 password123（只算一次 bcrypt，不然幾百萬個 hash 會算到天荒地老）。
+# 資料依照 app.py 使用的欄位產生，使用者 / 課程 ID 直接指定，方便各表互相對應。
+import argparse
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import bcrypt
+import mysql.connector
+
+import db
+from app import get_today
+from db import db_config
+from migrations.m0004_leaderboard_histogram import rebuild as rebuild_rank_histogram
+from repositories import groups
+
+TABLE_COLUMNS = {
+    "Users": ["user_id", "username", "email", "password", "total_learning_points", "coins", "diamonds",
+              "account_created_at", "avatar_id", "total_signin_days"],
+    "Courses": ["course_id", "user_id", "course_name", "progress", "progress_one_to_one", "progress_classroom",
+                "current_stage", "is_favorite", "is_vr_ready", "vr_started_at", "file_type", "created_at",
+                "updated_at", "teacher_card_id"],
+    "CourseChapters": ["course_id", "chapter_type", "is_completed"],
+    "LearningPointsLog": ["user_id", "date", "daily_points"],
+    "SigninRecords": ["user_id", "signin_day", "has_claimed_today", "last_signin_date", "weekly_streak"],
+    "WeeklyTasks": ["user_id", "task_id", "week_start", "is_claimed"],
+    "Achievements": ["user_id", "badge_name", "is_claimed", "claimed_at"],
+    "Cards": ["card_id", "name", "rarity"],
+    "UserCards": ["user_id", "card_id", "obtained_date", "is_selected"],
+    "CourseReviews": ["course_id", "user_id", "accuracy_score", "understanding_score", "expression_score",
+                      "interaction_score", "teacher_comment", "student1_feedback", "student2_feedback",
+                      "student3_feedback", "good_points", "improvement_points"],
+    "CoursePointsLog": ["course_id", "earned_points"],
+    "ActiveVRSessions": ["user_id", "course_id", "started_at"],
+    "StudyGroups": ["group_id", "name", "owner_user_id", "created_at"],
+    "GroupMembers": ["group_id", "user_id", "joined_at"],
+    "GroupMemberPoints": ["group_id", "board", "period_start", "user_id", "points"],
+}
+
+# 依外鍵順序：先清子表、後建父表
+TRUNCATE_ORDER = ["GroupMemberPoints", "GroupMembers", "StudyGroups", "ActiveVRSessions", "CoursePointsLog", "CourseReviews", "UserCards", "Achievements", "WeeklyTasks",
+                  "SigninRecords", "LearningPointsLog", "CourseChapters", "Courses", "Cards", "Users"]
+
+RARITIES = [("絕密", 0.1), ("機密", 0.3), ("隱密", 0.6)]
+COURSE_TOPICS = ["微積分", "線性代數", "機率與統計", "資料結構", "演算法", "作業系統", "計算機網路",
+                 "資料庫系統", "經濟學原理", "會計學", "管理學", "心理學導論", "普通物理", "有機化學",
+                 "分子生物學", "英文寫作", "日文入門", "中國文學史", "台灣史", "行銷管理"]
+FILE_TYPES = ["pdf", "pptx", "docx", "txt"]
+BADGES = ["新增一門課程", "完整上完一門課", "學習積分達到 500 分"]
+GOOD_POINTS = '["概念解釋清晰準確", "舉例生動有趣", "與同學互動熱絡"]'
+IMPROVEMENT_POINTS = '["可以多分享實際應用場景", "建議控制節奏，不要說太快"]'
+
+
+# ✅ 一次寫一批的 writer：multi-row INSERT
+class InsertWriter:
+    def __init__(self, conn, table, batch_size):
+        self.conn = conn
+        self.table = table
+        self.columns = TABLE_COLUMNS[table]
+        self.batch_size = batch_size
+        self.rows = []
+        self.count = 0
+        placeholders = "(" + ", ".join(["%s"] * len(self.columns)) + ")"
+        self._prefix = f"INSERT INTO {table} ({', '.join(self.columns)}) VALUES "
+        self._placeholders = placeholders
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        sql = self._prefix + ", ".join([self._placeholders] * len(self.rows))
+        params = [value for row in self.rows for value in row]
+        cursor = self.conn.cursor()
+        cursor.execute(sql, params)
+        cursor.close()
+        self.conn.commit()
+        self.count += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+
+# ✅ 先寫成 TSV，最後用 LOAD DATA LOCAL INFILE 一次匯入
+class LoadDataWriter:
+    def __init__(self, conn, table, tmpdir):
+        self.conn = conn
+        self.table = table
+        self.columns = TABLE_COLUMNS[table]
+        self.path = os.path.join(tmpdir, f"{table}.tsv")
+        self._file = open(self.path, "w", encoding="utf-8", newline="")
+        self.count = 0
+
+    @staticmethod
+    def _escape(value):
+        if value is None:
+            return "\\N"
+        return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+    def add(self, row):
+        self._file.write("\t".join(self._escape(v) for v in row) + "\n")
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s INTO TABLE {self.table}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+            LINES TERMINATED BY '\\n'
+            ({', '.join(self.columns)})
+        """, (self.path,))
+        cursor.close()
+        self.conn.commit()
+
+
+def make_writers(conn, args, tmpdir):
+    if args.load_data:
+        return {t: LoadDataWriter(conn, t, tmpdir) for t in TABLE_COLUMNS}
+    return {t: InsertWriter(conn, t, args.batch) for t in TABLE_COLUMNS}
+
+
+def make_cards(rng, count):
+    cards = []
+    for card_id in range(1, count + 1):
+        rarity = rng.choices([r for r, _ in RARITIES], weights=[w for _, w in RARITIES])[0]
+        cards.append((card_id, f"老師{card_id:03d}", rarity))
+    return cards
+
+
+def generate(writers, args):
+    rng = random.Random(args.seed)
+    today = get_today()
+    week_start = today - timedelta(days=today.weekday())
+    now = datetime.combine(today, datetime.min.time()) + timedelta(hours=12)
+    first_day = today - timedelta(days=args.days - 1)
+    password = bcrypt.hashpw(b"password123", bcrypt.gensalt()).decode("utf-8")
+
+    cards = make_cards(rng, args.cards)
+    for card in cards:
+        writers["Cards"].add(card)
+
+    course_id = args.start_id
+    started = time.perf_counter()
+
+    for i in range(args.users):
+        user_id = args.start_id + i
+
+        # 活躍度長尾分佈：少數重度使用者 + 大量偶爾上線的使用者
+        activity = rng.betavariate(0.6, 2.5)
+        skill = rng.lognormvariate(3.0, 0.8)
+        created_at = now - timedelta(days=rng.randint(args.days, args.days + 365), minutes=rng.randint(0, 1439))
+
+        # 學習點數：每天依活躍度決定有沒有上線
+        total_points = 0
+        today_points = None
+        weekly_points = 0
+        weekly_active_days = 0
+        last_active = None
+        day = first_day
+        while day <= today:
+            if rng.random() < activity:
+                points = max(1, int(rng.lognormvariate(math.log(skill), 0.7)))
+                writers["LearningPointsLog"].add((user_id, day, points))
+                total_points += points
+                last_active = day
+                if day == today:
+                    today_points = points
+                if day >= week_start:
+                    weekly_points += points
+                    weekly_active_days += 1
+            day += timedelta(days=1)
+
+        # 課程數：指數分佈，越活躍的人課程越多
+        n_courses = min(args.max_courses, int(rng.expovariate(1 / max(0.3, activity * args.courses_per_user * 2))))
+        completed_courses = 0
+        active_session = None
+        for _ in range(n_courses):
+            created = created_at + timedelta(days=rng.randint(0, args.days), minutes=rng.randint(0, 1439))
+            created = min(created, now)
+            updated = min(now, created + timedelta(days=rng.randint(0, 14)))
+            stage_roll = rng.random()
+            if stage_roll < 0.35:
+                stage, p1, p2 = "completed", 100, 100
+                completed_courses += 1
+            elif stage_roll < 0.65:
+                stage, p1, p2 = "classroom", 100, rng.choice([0, 33, 66])
+            else:
+                stage, p1, p2 = "one_to_one", rng.choice([0, 20, 40, 60, 80]), 0
+            is_vr_ready = 1 if stage != "completed" and rng.random() < 0.02 else 0
+            writers["Courses"].add((
+                course_id, user_id, f"{rng.choice(COURSE_TOPICS)} 第{rng.randint(1, 18)}章",
+                (p1 + p2) / 2, p1, p2, stage, int(rng.random() < 0.15), is_vr_ready,
+                updated if is_vr_ready else None, rng.choice(FILE_TYPES), created, updated,
+                rng.choice(cards)[0] if rng.random() < 0.5 else None,
+            ))
+            # VR session 登記 vr_started_at 最新的那門（跟 /continue_course 一樣每人一筆）
+            if is_vr_ready and (active_session is None or updated >= active_session[2]):
+                active_session = (user_id, course_id, updated)
+            for n in range(args.chapters):
+                writers["CourseChapters"].add((course_id, "one_to_one", int(n < p1 * args.chapters // 100)))
+            for n in range(args.chapters):
+                writers["CourseChapters"].add((course_id, "classroom", int(n < p2 * args.chapters // 100)))
+            if stage == "completed":
+                scores = [min(100, max(0, int(rng.gauss(75, 12)))) for _ in range(4)]
+                writers["CourseReviews"].add((
+                    course_id, user_id, *scores,
+                    "今天的表現非常出色，特別是在概念解釋方面有明顯進步。",
+                    "你把複雜的概念講得很清楚！", "邏輯很清晰，解題過程很有條理。", "你提出的觀點很有創意！",
+                    GOOD_POINTS, IMPROVEMENT_POINTS,
+                ))
+                writers["CoursePointsLog"].add((course_id, rng.randint(50, 300)))
+            course_id += 1
+        if active_session:
+            writers["ActiveVRSessions"].add(active_session)
+
+        # 簽到
+        signin_days = rng.randint(0, args.days) if last_active else 0
+        streak = min(7, weekly_active_days)
+        writers["SigninRecords"].add((
+            user_id, (signin_days % 7) + 1, 0, last_active, streak,
+        ))
+
+        # 本週任務（只有本週有上線的人才會有）
+        if weekly_active_days:
+            for task_id in (1, 2, 3):
+                writers["WeeklyTasks"].add((user_id, task_id, week_start, int(rng.random() < 0.1)))
+
+        # 成就
+        earned = []
+        if n_courses >= 1:
+            earned.append(BADGES[0])
+        if completed_courses >= 1:
+            earned.append(BADGES[1])
+        if total_points >= 500:
+            earned.append(BADGES[2])
+        for badge in earned:
+            claimed = rng.random() < 0.7
+            writers["Achievements"].add((user_id, badge, int(claimed), now if claimed else None))
+
+        # 卡片收藏
+        n_cards = min(len(cards), int(rng.expovariate(1 / max(0.5, activity * 10))))
+        selected = None
+        for idx, card in enumerate(rng.sample(cards, n_cards)):
+            if idx == 0:
+                selected = card[0]
+            writers["UserCards"].add((user_id, card[0], created_at + timedelta(days=rng.randint(0, args.days)),
+                                      int(card[0] == selected)))
+
+        writers["Users"].add((
+            user_id, f"user{user_id}", f"user{user_id}@example.com", password, total_points,
+            rng.randint(0, 20000), rng.randint(0, 50), created_at, rng.randint(1, 12), signin_days,
+        ))
+
+        # 班級：每 --group-size 人一班，第一個人當老師；小組排行榜的點數跟 /groups/<id>/members 加入時一樣起算
+        if args.group_size > 0:
+            group_id = (user_id - 1) // args.group_size + 1
+            if (user_id - 1) % args.group_size == 0 or i == 0:
+                writers["StudyGroups"].add((group_id, f"班級{group_id}", user_id, now))
+            writers["GroupMembers"].add((group_id, user_id, now))
+            if today_points is not None:
+                writers["GroupMemberPoints"].add((group_id, "daily", today, user_id, today_points))
+            if weekly_active_days:
+                writers["GroupMemberPoints"].add((group_id, "weekly", week_start, user_id, weekly_points))
+            writers["GroupMemberPoints"].add((group_id, "all", groups.ALL_TIME, user_id, total_points))
+
+        if (i + 1) % 10000 == 0:
+            elapsed = time.perf_counter() - started
+            print(f"  已產生 {i + 1}/{args.users} 位使用者（{(i + 1) / elapsed:.0f} 位/秒）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="產生 FeynDora 假資料")
+    parser.add_argument("--users", type=int, default=10000, help="使用者數量")
+    parser.add_argument("--days", type=int, default=60, help="學習點數紀錄往回幾天")
+    parser.add_argument("--courses-per-user", type=float, default=3, help="平均每人課程數")
+    parser.add_argument("--max-courses", type=int, default=50)
+    parser.add_argument("--chapters", type=int, default=5, help="每門課每種章節的數量")
+    parser.add_argument("--cards", type=int, default=60, help="卡片種類數")
+    parser.add_argument("--start-id", type=int, default=1, help="起始使用者 / 課程 ID")
+    parser.add_argument("--group-size", type=int, default=30, help="每個班級幾人（0 = 不建立班級）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=2000, help="multi-row INSERT 每批筆數")
+    parser.add_argument("--load-data", action="store_true", help="改用 LOAD DATA LOCAL INFILE 匯入")
+    parser.add_argument("--truncate", action="store_true", help="匯入前清空所有相關資料表")
+    args = parser.parse_args()
+
+    if db.backend.dialect == "sqlite":
+        if args.load_data:
+            parser.error("--load-data 只支援 MySQL")
+        conn = db.connect_raw()
+        # SQLite 沒有 TRUNCATE；外鍵檢查要在交易外關掉
+        disable_checks = ["PRAGMA foreign_keys = OFF"]
+        enable_checks = ["PRAGMA foreign_keys = ON"]
+        truncate = "DELETE FROM {}"
+    else:
+        conn = mysql.connector.connect(**db_config, charset="utf8mb4", allow_local_infile=args.load_data)
+        disable_checks = ["SET time_zone = '+08:00'", "SET foreign_key_checks = 0", "SET unique_checks = 0"]
+        enable_checks = ["SET unique_checks = 1", "SET foreign_key_checks = 1"]
+        truncate = "TRUNCATE TABLE {}"
+
+    cursor = conn.cursor()
+    # 大量匯入時先關掉檢查，匯入完再打開
+    for statement in disable_checks:
+        cursor.execute(statement)
+    if args.truncate:
+        for table in TRUNCATE_ORDER:
+            print(f"🧹 清空 {table}")
+            cursor.execute(truncate.format(table))
+        conn.commit()
+    cursor.close()
+
+    tmpdir = tempfile.mkdtemp(prefix="feyndora-gen-") if args.load_data else None
+    started = time.perf_counter()
+    try:
+        writers = make_writers(conn, args, tmpdir)
+        generate(writers, args)
+        # 父表先匯入
+        for table in reversed(TRUNCATE_ORDER):
+            writers[table].close()
+            print(f"✅ {table}: {writers[table].count} 筆")
+        # 排行榜名次估算用的點數分布（?approx=1）依匯入的 LearningPointsLog 重算
+        cursor = conn.cursor()
+        rebuild_rank_histogram(cursor)
+        cursor.close()
+        conn.commit()
+        print("✅ LeaderboardHistogram 已重算")
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        cursor = conn.cursor()
+        for statement in enable_checks:
+            cursor.execute(statement)
+        cursor.close()
+        conn.close()
+
+    print(f"🎉 完成，共花費 {time.perf_counter() - started:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
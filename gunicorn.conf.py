@@ -0,0 +1,7 @@
+# ✅ gunicorn 設定（start.sh 使用）
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # worker 結束時清掉它的 metrics 檔案，避免 /metrics 合併到已死掉的 worker
+    multiprocess.mark_process_dead(worker.pid)
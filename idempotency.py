@@ -0,0 +1,153 @@
+# ✅ Idempotency-Key：VR 端網路不穩時會重送寫入請求，同一個 key 的重送直接回傳第一次的結果，不再碰 MySQL
+#
+# 記錄放在 SHM_DIR（預設 /dev/shm）裡的一個小 SQLite 檔，所有 gunicorn worker 共用。
+#   IDEMPOTENCY_TTL           完成的結果保留幾秒（預設 3600）
+#   IDEMPOTENCY_LOCK_TIMEOUT  第一次請求處理中最多佔住這個 key 幾秒（預設 30，worker 當掉時之後的重送才能重新執行）
+#
+# 同一個 key：
+#   處理中又收到 → 409 + Retry-After（client 稍後再送就會拿到結果）
+#   body 跟第一次不同 → 422（key 被拿去用在別的請求）
+#   5xx 不記錄，重送會重新執行
+import functools
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app, jsonify, request
+
+import metrics
+import shm
+
+log = logging.getLogger("feyndora.idempotency")
+
+TTL = float(os.getenv("IDEMPOTENCY_TTL", "3600"))
+LOCK_TIMEOUT = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "30"))
+MAX_KEY_LENGTH = 255
+HEADER = "Idempotency-Key"
+
+
+class IdempotencyStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # 放在記憶體裡的暫存資料，不用 fsync
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency (
+                    key TEXT PRIMARY KEY,
+                    fingerprint BLOB NOT NULL,
+                    state TEXT NOT NULL,
+                    status INTEGER,
+                    content_type TEXT,
+                    body BLOB,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency (expires_at)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # 回傳 ("new", None) / ("replay", (status, content_type, body)) / ("in_progress", None) / ("mismatch", None)
+    def begin(self, key, fingerprint):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT fingerprint, state, status, content_type, body FROM idempotency "
+                "WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            if row is None:
+                conn.execute("INSERT OR REPLACE INTO idempotency (key, fingerprint, state, expires_at) "
+                             "VALUES (?, ?, 'pending', ?)", (key, fingerprint, now + LOCK_TIMEOUT))
+                result = "new", None
+            elif row[0] != fingerprint:
+                result = "mismatch", None
+            elif row[1] == "done":
+                result = "replay", (row[2], row[3], row[4])
+            else:
+                result = "in_progress", None
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        # 偶爾順便清掉過期的記錄
+        if random.random() < 0.01:
+            conn.execute("DELETE FROM idempotency WHERE expires_at <= ?", (now,))
+        return result
+
+    def complete(self, key, status, content_type, body):
+        self._conn().execute(
+            "UPDATE idempotency SET state = 'done', status = ?, content_type = ?, body = ?, expires_at = ? "
+            "WHERE key = ?", (status, content_type, body, time.time() + TTL, key))
+
+    def abandon(self, key):
+        self._conn().execute("DELETE FROM idempotency WHERE key = ? AND state = 'pending'", (key,))
+
+
+store = IdempotencyStore(os.path.join(shm.SHM_DIR, f"{shm.SHM_PREFIX}-idempotency.db"))
+
+
+def _reject(message, status, result):
+    metrics.record_idempotency(result)
+    response = jsonify({"error": message})
+    response.status_code = status
+    if status == 409:
+        response.headers["Retry-After"] = "1"
+    return response
+
+
+# ✅ 放在 @app.route 下面；沒帶 Idempotency-Key 的請求照常執行
+def idempotent(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return _reject(f"{HEADER} 最長 {MAX_KEY_LENGTH} 個字元", 400, "invalid")
+
+        # 同一個 key 只對同一個 API 有效；body 的 hash 用來確認重送的是同一個請求
+        scoped_key = f"{request.method} {request.path} {key}"
+        fingerprint = hashlib.blake2b(request.get_data(), digest_size=16).digest()
+        try:
+            state, stored = store.begin(scoped_key, fingerprint)
+        except sqlite3.Error as e:
+            # 記錄壞掉時不擋請求，只是失去重送保護
+            log.warning("Idempotency 記錄讀取失敗，直接執行: %s", e)
+            return fn(*args, **kwargs)
+
+        if state == "replay":
+            metrics.record_idempotency("replayed")
+            status, content_type, body = stored
+            response = current_app.response_class(body, status=status, content_type=content_type)
+            response.headers["Idempotent-Replayed"] = "true"
+            return response
+        if state == "in_progress":
+            return _reject("相同的請求正在處理中，請稍後再試", 409, "in_progress")
+        if state == "mismatch":
+            return _reject(f"{HEADER} 已經用在內容不同的請求", 422, "mismatch")
+
+        try:
+            response = current_app.make_response(fn(*args, **kwargs))
+        except Exception:
+            store.abandon(scoped_key)
+            raise
+        try:
+            if response.status_code >= 500 or response.is_streamed:
+                store.abandon(scoped_key)
+            else:
+                store.complete(scoped_key, response.status_code, response.content_type, response.get_data())
+        except sqlite3.Error as e:
+            log.warning("Idempotency 記錄寫入失敗: %s", e)
+        return response
+
+    return wrapper
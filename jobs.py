@@ -0,0 +1,35 @@
+# ✅ 背景工作：請求不需要等結果的 DB 寫入（例如結束課程後先建好預設評價），丟給執行緒池做
+#
+# JOB_WORKERS   每個 worker 的背景執行緒數（預設 2）
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("feyndora.jobs")
+
+WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _lock:
+        # fork 出來的 worker 要有自己的執行緒池
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="feyndora-job")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def submit(fn, *args, **kwargs):
+    def run():
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            log.exception("背景工作失敗", extra={"job": fn.__name__})
+
+    return _get_executor().submit(run)
@@ -0,0 +1,85 @@
+# ✅ 用 orjson 輸出 JSON（課程列表、排行榜、課程回顧這類大回應的序列化快很多）
+#
+# 輸出格式跟 Flask 內建的一樣：
+#   datetime / date → HTTP 日期字串（"Mon, 06 Jan 2025 10:00:00 GMT"）
+#   Decimal（SUM() 的結果）、UUID → 字串
+#   dict 依 key 排序，結尾換行，debug 模式縮排
+# 另外 bytes 會用 UTF-8 解碼成字串（內建的會直接出錯）。
+# 沒裝 orjson、或遇到 orjson 處理不了的值（例如超過 64 位元的整數）時，自動退回 Flask 內建的 json。
+import dataclasses
+import decimal
+import logging
+import uuid
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # orjson 是選配
+    orjson = None
+
+log = logging.getLogger("feyndora.json")
+
+if orjson is not None:
+    # 日期交給 _default 轉成 HTTP 日期
+    BASE_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def _default(o):
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if isinstance(o, (bytes, bytearray, memoryview)):
+        return bytes(o).decode("utf-8", "replace")
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # 回應一律輸出 UTF-8 原文（對應 JSON_AS_ASCII = False），中文不轉成 \uXXXX
+    ensure_ascii = False
+    default = staticmethod(_default)
+
+    def _options(self, indent=False):
+        options = BASE_OPTIONS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj, indent=False):
+        try:
+            return orjson.dumps(obj, default=_default, option=self._options(indent))
+        except TypeError as e:
+            log.debug("orjson 無法序列化，改用內建 json: %s", e)
+            return super().dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b"\n", mimetype=self.mimetype)
+
+
+def init_app(app):
+    if orjson is None:
+        log.info("沒有安裝 orjson，使用 Flask 內建的 JSON")
+        app.json.ensure_ascii = False
+        return
+    app.json = FastJSONProvider(app)
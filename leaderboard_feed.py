@@ -0,0 +1,73 @@
+# ✅ 排行榜即時更新：連上時送一次前 10 名，之後只送有變的部分，排行榜畫面不用一直輪詢
+#
+# 排行榜前 10 名本來就由 snapshots.py 的 refresher 重建（/update_learning_points 之後，每 SNAPSHOT_INTERVAL 秒最多一次）。
+# 每次重建完跟上一版比較，算出變化透過 pubsub.py 發給所有 worker，一次計算給所有連線用：
+#   delta  {"version", "base", "changes": [...]}，changes 每一筆是
+#          {"op": "join", 整筆資料}              進入前 10 名
+#          {"op": "update", "user_id", 有變的欄位}  名次（ranking）、點數、名稱、頭像變了
+#          {"op": "leave", "user_id"}              掉出前 10 名
+#   reset  換日 / 換週、第一次建好、或變化太多塞不進一則訊息 → 各連線重新送一次完整的前 10 名
+import events
+import pubsub
+import snapshots
+
+BOARDS = {"daily": ("daily_leaderboard", "daily_points"), "weekly": ("weekly_leaderboard", "weekly_points")}
+FIELDS = ("ranking", "username", "avatar_id")
+
+DELTA = "delta"
+RESET = "reset"
+
+
+def channel(board):
+    return f"leaderboard:{board}"
+
+
+# ✅ 兩版前 10 名的差異，順序跟新的排行榜一樣，最後是掉出去的
+def diff(old_rows, new_rows, score):
+    old = {row["user_id"]: row for row in old_rows}
+    changes = []
+    for row in new_rows:
+        before = old.pop(row["user_id"], None)
+        if before is None:
+            changes.append({"op": "join", **row})
+            continue
+        changed = {field: row.get(field) for field in (score, *FIELDS) if row.get(field) != before.get(field)}
+        if changed:
+            changes.append({"op": "update", "user_id": row["user_id"], **changed})
+    changes.extend({"op": "leave", "user_id": user_id} for user_id in old)
+    return changes
+
+
+# snapshots 的 on_publish：refresher 寫入新的一版後算出變化發布出去
+def _publisher(board):
+    score = BOARDS[board][1]
+
+    def on_publish(previous, current):
+        (base, old), (version, new) = previous, current
+        if old is None or old["key"] != new["key"]:
+            pubsub.publish(channel(board), RESET, {"version": version})
+            return
+        changes = diff(old["rankings"], new["rankings"], score)
+        if not changes:
+            return  # 定時重建但沒有變化
+        if pubsub.publish(channel(board), DELTA, {"version": version, "base": base, "changes": changes}) is None:
+            pubsub.publish(channel(board), RESET, {"version": version})
+
+    return on_publish
+
+
+def register(board, build, max_age):
+    snapshots.register(BOARDS[board][0], build, max_age=max_age, on_publish=_publisher(board))
+
+
+def _snapshot(board):
+    current = snapshots.current(BOARDS[board][0])
+    if current is None:
+        return None  # 還沒建好，建好時會收到 reset
+    version, value = current
+    return version, {"version": version, "key": value["key"], "rankings": value["rankings"]}
+
+
+# ✅ /events/rankings/<board> 的 SSE 回應
+def stream(board):
+    return events.stream(channel(board), name="leaderboard", snapshot=lambda: _snapshot(board))
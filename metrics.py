@@ -0,0 +1,271 @@
+# ✅ 每個 API 的延遲、DB 等待時間、SQL 次數等指標（Prometheus 格式，/metrics 提供）
+#
+# gunicorn 多 worker 時要設定 PROMETHEUS_MULTIPROC_DIR（start.sh 已處理），
+# 每個 worker 各自寫檔，/metrics 讀取時再合併成一份。
+import logging
+import os
+import time
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+log = logging.getLogger("feyndora.metrics")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+SESSION_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+REQUEST_LATENCY = Histogram(
+    "feyndora_request_duration_seconds", "API 請求總耗時",
+    ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS)
+DB_CONNECTION_WAIT = Histogram(
+    "feyndora_db_connection_wait_seconds", "每個請求等待取得 DB 連線的時間",
+    ["endpoint"], buckets=LATENCY_BUCKETS)
+DB_QUERY_TIME = Histogram(
+    "feyndora_db_query_duration_seconds", "每個請求花在 SQL 上的時間",
+    ["endpoint"], buckets=LATENCY_BUCKETS)
+DB_QUERIES = Histogram(
+    "feyndora_db_queries_per_request", "每個請求執行的 SQL 次數",
+    ["endpoint"], buckets=COUNT_BUCKETS)
+DB_ROWS = Histogram(
+    "feyndora_db_rows_per_request", "每個請求從 DB 讀回的筆數",
+    ["endpoint"], buckets=ROW_BUCKETS)
+DB_PREPARED = Counter(
+    "feyndora_db_prepared_statements_total", "熱門 SQL 走 prepared statement 的次數（hit = 重用，不用重新解析；prepare = 第一次準備）",
+    ["endpoint", "result"])
+TRANSACTION_RETRIES = Counter(
+    "feyndora_db_transaction_retries_total", "交易因死結 / 等鎖逾時重來的次數（retried = 重試，gave_up = 重試完還是失敗）",
+    ["endpoint", "reason", "result"])
+DB_ROUTES = Counter(
+    "feyndora_db_connections_total", "取得 DB 連線的次數（primary / replica）",
+    ["role"])
+REQUESTS_REJECTED = Counter(
+    "feyndora_requests_rejected_total", "被限流（429）或過載保護（503）擋下的請求數",
+    ["endpoint", "reason"])
+DB_BREAKER = Counter(
+    "feyndora_db_breaker_transitions_total", "DB 斷路器切換狀態的次數（open / half_open / closed）",
+    ["name", "state"])
+STALE_RESPONSES = Counter(
+    "feyndora_stale_responses_total", "DB 無法使用時改回傳上一次成功回應的次數",
+    ["endpoint"])
+IDEMPOTENCY = Counter(
+    "feyndora_idempotency_total", "帶 Idempotency-Key 的重送請求（replayed / in_progress / mismatch / invalid）",
+    ["endpoint", "result"])
+SNAPSHOT_BYTES = Gauge(
+    "feyndora_shm_snapshot_bytes", "共用記憶體快照的大小（used = 目前資料，capacity = 佔用的共用記憶體）",
+    ["name", "kind"], multiprocess_mode="max")
+PROGRESS_UPDATES = Counter(
+    "feyndora_progress_updates_total",
+    "VR 進度回報（written = 直接寫入，buffered = 合併等下次寫，flushed = 背景寫入，"
+    "settled = 跟其他課程操作一起寫入，superseded = 被結束課程蓋掉）",
+    ["result"])
+VR_SESSIONS = Counter(
+    "feyndora_vr_sessions_total",
+    "VR 上課 session（started = /continue_course；ended 依原因：progress = 第一次回報進度，finished = 結束課程）",
+    ["event", "reason"])
+VR_SESSION_DURATION = Histogram(
+    "feyndora_vr_session_duration_seconds", "VR session 從 /continue_course 到結束的時間",
+    ["reason"], buckets=SESSION_BUCKETS)
+VR_SESSIONS_ACTIVE = Gauge(
+    "feyndora_vr_sessions_active", "目前登記中的 VR session 數（/metrics 被讀取時查 DB）",
+    multiprocess_mode="mostrecent")
+VR_SESSION_OLDEST = Gauge(
+    "feyndora_vr_session_oldest_seconds", "登記中最久的 VR session 開始了幾秒（/metrics 被讀取時查 DB）",
+    multiprocess_mode="mostrecent")
+PUBSUB_PUBLISHED = Counter(
+    "feyndora_pubsub_published_total", "發布到跨 worker pub/sub 的訊息", ["event"])
+PUBSUB_DROPPED = Counter(
+    "feyndora_pubsub_dropped_total",
+    "沒送到的訊息（too_large = 超過大小上限，slow_subscriber = 訂閱者佇列滿了，overrun = 被新訊息蓋掉）",
+    ["reason"])
+EVENT_STREAMS = Gauge(
+    "feyndora_event_streams_open", "目前開著的 SSE 連線數", ["stream"], multiprocess_mode="livesum")
+RESPONSE_SIZE = Histogram(
+    "feyndora_response_size_bytes", "回應大小",
+    ["endpoint"], buckets=SIZE_BUCKETS)
+
+# 開啟後每個回應會帶 X-DB-Queries / X-DB-Time 標頭（benchmark.py 會讀）
+DEBUG_HEADERS = os.getenv("METRICS_DEBUG_HEADERS", "0") == "1"
+
+
+# ✅ 單一請求累計的 DB 數據，存在 flask.g
+class RequestStats:
+    __slots__ = ("connection_wait", "query_time", "queries", "rows", "prepared")
+
+    def __init__(self):
+        self.connection_wait = 0.0
+        self.query_time = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.prepared = 0  # 重用 prepared statement、省掉解析的 SQL 次數
+
+
+def current_stats():
+    if not has_request_context():
+        return None
+    return g.get("db_stats")
+
+
+def record_connection_wait(seconds):
+    stats = current_stats()
+    if stats is not None:
+        stats.connection_wait += seconds
+
+
+def record_query(seconds):
+    stats = current_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_time += seconds
+
+
+def record_prepared(reused):
+    stats = current_stats()
+    if stats is None:
+        return
+    if reused:
+        stats.prepared += 1
+    DB_PREPARED.labels(request.endpoint or "unknown", "hit" if reused else "prepare").inc()
+
+
+def record_transaction_retry(reason, result):
+    endpoint = request.endpoint if has_request_context() else None
+    TRANSACTION_RETRIES.labels(endpoint or "unknown", reason, result).inc()
+
+
+def record_route(role):
+    DB_ROUTES.labels(role).inc()
+
+
+def record_rejected(reason):
+    REQUESTS_REJECTED.labels(request.endpoint or "unknown", reason).inc()
+
+
+def record_breaker(name, state):
+    DB_BREAKER.labels(name, state).inc()
+
+
+def record_stale():
+    STALE_RESPONSES.labels(request.endpoint or "unknown").inc()
+
+
+def record_idempotency(result):
+    IDEMPOTENCY.labels(request.endpoint or "unknown", result).inc()
+
+
+def record_snapshot(name, used, capacity):
+    SNAPSHOT_BYTES.labels(name, "used").set(used)
+    SNAPSHOT_BYTES.labels(name, "capacity").set(capacity)
+
+
+def record_progress(result):
+    PROGRESS_UPDATES.labels(result).inc()
+
+
+def record_vr_session_started():
+    VR_SESSIONS.labels("started", "continue").inc()
+
+
+def record_vr_session_ended(reason, seconds):
+    VR_SESSIONS.labels("ended", reason).inc()
+    if seconds is not None:
+        VR_SESSION_DURATION.labels(reason).observe(max(0.0, seconds))
+
+
+def set_vr_sessions(active, oldest_seconds):
+    VR_SESSIONS_ACTIVE.set(active)
+    VR_SESSION_OLDEST.set(oldest_seconds)
+
+
+def record_pubsub_published(event):
+    PUBSUB_PUBLISHED.labels(event).inc()
+
+
+def record_pubsub_dropped(reason):
+    PUBSUB_DROPPED.labels(reason).inc()
+
+
+def event_stream_opened(stream):
+    EVENT_STREAMS.labels(stream).inc()
+
+
+def event_stream_closed(stream):
+    EVENT_STREAMS.labels(stream).dec()
+
+
+def record_rows(count):
+    stats = current_stats()
+    if stats is not None:
+        stats.rows += count
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    g.db_stats = RequestStats()
+
+
+def _after_request(response):
+    started = g.get("request_started")
+    stats = g.get("db_stats")
+    if started is None or stats is None:
+        return response
+
+    endpoint = request.endpoint or "unknown"
+    if endpoint == "metrics":
+        return response
+
+    REQUEST_LATENCY.labels(endpoint, request.method, str(response.status_code)).observe(
+        time.perf_counter() - started)
+    DB_CONNECTION_WAIT.labels(endpoint).observe(stats.connection_wait)
+    DB_QUERY_TIME.labels(endpoint).observe(stats.query_time)
+    DB_QUERIES.labels(endpoint).observe(stats.queries)
+    DB_ROWS.labels(endpoint).observe(stats.rows)
+    if not response.is_streamed:
+        RESPONSE_SIZE.labels(endpoint).observe(response.calculate_content_length() or 0)
+
+    if DEBUG_HEADERS:
+        response.headers["X-DB-Queries"] = str(stats.queries)
+        response.headers["X-DB-Time"] = f"{stats.query_time * 1000:.3f}"
+        response.headers["X-DB-Prepared"] = str(stats.prepared)
+    return response
+
+
+# /metrics 被讀取前執行（更新要查 DB 才知道的 gauge），出錯不影響其他指標
+_scrape_hooks = []
+
+
+def on_scrape(fn):
+    _scrape_hooks.append(fn)
+    return fn
+
+
+def metrics_view():
+    for hook in _scrape_hooks:
+        try:
+            hook()
+        except Exception as e:
+            log.warning("更新 /metrics 指標失敗: %s", e)
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # 多 worker：合併所有 worker 寫出的檔案
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,200 @@
+# ✅ 資料庫遷移工具
+#
+# 用法：
+#   python migrate.py status              # 目前版本與待執行的遷移
+#   python migrate.py up [--to N]         # 升到最新（或指定版本）
+#   python migrate.py down --to N         # 降回版本 N（0 = 全部回滾）
+#   python migrate.py advise [檔案 ...]    # 對程式裡每一句 SQL 跑 EXPLAIN，找出全表掃描
+# DB_BACKEND=sqlite 時對 SQLITE_PATH 的檔案執行
+import argparse
+import ast
+import glob
+import os
+import re
+import sys
+
+from db import connect_raw
+from migrations import dialect, load_migrations, to_sqlite_ddl
+from query_log import explain
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+HISTORY_DDL = """
+    CREATE TABLE IF NOT EXISTS SchemaMigrations (
+        version INT PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+
+def applied_versions(cursor):
+    cursor.execute(to_sqlite_ddl(HISTORY_DDL)[0] if dialect(cursor) == "sqlite" else HISTORY_DDL)
+    cursor.execute("SELECT version FROM SchemaMigrations ORDER BY version")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def cmd_status(conn, args):
+    cursor = conn.cursor()
+    applied = set(applied_versions(cursor))
+    for m in load_migrations():
+        mark = "✅" if m.VERSION in applied else "⏳"
+        print(f"{mark} {m.VERSION:04d} {m.DESCRIPTION}")
+    cursor.close()
+
+
+def cmd_up(conn, args):
+    cursor = conn.cursor(buffered=True)
+    applied = set(applied_versions(cursor))
+    for m in load_migrations():
+        if m.VERSION in applied or (args.to is not None and m.VERSION > args.to):
+            continue
+        print(f"⬆️  {m.VERSION:04d} {m.DESCRIPTION}")
+        m.up(cursor)
+        # DDL 在 MySQL 會自動 commit，每做完一個就記一筆
+        cursor.execute("INSERT INTO SchemaMigrations (version, description) VALUES (%s, %s)",
+                       (m.VERSION, m.DESCRIPTION))
+        conn.commit()
+    cursor.close()
+    print("✅ 已是最新版本")
+
+
+def cmd_down(conn, args):
+    if args.to is None:
+        sys.exit("down 需要指定 --to 版本（0 = 全部回滾）")
+    cursor = conn.cursor(buffered=True)
+    applied = set(applied_versions(cursor))
+    for m in reversed(load_migrations()):
+        if m.VERSION not in applied or m.VERSION <= args.to:
+            continue
+        print(f"⬇️  {m.VERSION:04d} {m.DESCRIPTION}")
+        m.down(cursor)
+        cursor.execute("DELETE FROM SchemaMigrations WHERE version = %s", (m.VERSION,))
+        conn.commit()
+    cursor.close()
+    print(f"✅ 已回到版本 {args.to}")
+
+
+# 算出 SQL 字串：字串常數、hot("...")、模組層級的字串常數，以及只用到這些常數的 f-string；算不出來回傳 None
+def _literal(node, constants):
+    if isinstance(node, ast.Constant):
+        return node.value if isinstance(node.value, str) else None
+    if isinstance(node, ast.Name):
+        return constants.get(node.id)
+    if _is_hot(node):
+        return _literal(node.args[0], constants)
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.FormattedValue):
+                if value.conversion != -1 or value.format_spec is not None:
+                    return None
+                value = value.value
+            part = _literal(value, constants)
+            if part is None:
+                return None
+            parts.append(part)
+        return "".join(parts)
+    return None
+
+
+def _is_hot(node):
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "hot"
+            and len(node.args) == 1)
+
+
+# ✅ 索引建議：從程式碼撈出所有 SQL，代入範例參數跑 EXPLAIN
+# 包含模組層級的 hot() 常數（最常跑的 SQL，很多是經過 helper 執行的）和 cursor.execute(...) 的 SQL
+def extract_statements(path):
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    constants = {}
+    seen = set()
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            sql = _literal(node.value, constants)
+            if sql is None:
+                continue
+            constants[node.targets[0].id] = sql
+            if _is_hot(node.value) and sql not in seen:
+                seen.add(sql)
+                yield node.lineno, sql
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr == "execute" and node.args):
+            sql = _literal(node.args[0], constants)
+            if sql is not None and sql not in seen:
+                seen.add(sql)
+                yield node.lineno, sql
+
+
+_DATE_BEFORE = re.compile(r"(date|week_start|_at)\s*(=|<>|>=|<=|>|<|BETWEEN)\s*$"
+                          r"|(date|week_start|_at)\s+BETWEEN\s+%s\s+AND\s*$", re.I)
+
+
+def sample_sql(sql):
+    # %s 依前面的欄位名稱換成看起來合理的值：日期欄位用今天，其他用 '1'
+    parts = sql.split("%s")
+    out = [parts[0]]
+    for i, part in enumerate(parts[1:], start=1):
+        before = "%s".join(parts[:i])[-80:]
+        out.append("CURDATE()" if _DATE_BEFORE.search(before) else "'1'")
+        out.append(part)
+    return "".join(out)
+
+
+def cmd_advise(conn, args):
+    # 預設檢查這個專案的 app.py 和 repositories/（從哪個目錄執行都一樣）
+    paths = args.paths or [os.path.join(ROOT, "app.py")] + sorted(glob.glob(os.path.join(ROOT, "repositories", "*.py")))
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    flagged = 0
+    for path in paths:
+        name = path if args.paths else os.path.relpath(path, ROOT)
+        for lineno, sql in extract_statements(path):
+            statement = " ".join(sql.split())
+            if not statement.upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+                continue
+            try:
+                plan, full_scans = explain(cursor, sample_sql(statement))
+            except Exception as e:
+                print(f"⚠️ {name}:{lineno} 無法 EXPLAIN: {e}")
+                continue
+            if dialect(cursor) == "sqlite":
+                for table in full_scans:
+                    flagged += 1
+                    print(f"❌ {name}:{lineno} 全表掃描 {table}")
+                    print(f"     {statement[:160]}")
+                continue
+            for row in plan:
+                scan = row.get("type")
+                if scan in ("ALL", "index") and row.get("table") and not str(row.get("table")).startswith("<"):
+                    flagged += 1
+                    kind = "全表掃描" if scan == "ALL" else "全索引掃描"
+                    print(f"❌ {name}:{lineno} {kind} {row['table']} (rows≈{row.get('rows')}, "
+                          f"key={row.get('key')}, extra={row.get('Extra')})")
+                    print(f"     {statement[:160]}")
+    cursor.close()
+    print(f"\n共 {flagged} 處需要檢查" if flagged else "\n✅ 沒有發現全表掃描")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FeynDora 資料庫遷移")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status")
+    up = sub.add_parser("up")
+    up.add_argument("--to", type=int)
+    down = sub.add_parser("down")
+    down.add_argument("--to", type=int)
+    advise = sub.add_parser("advise")
+    advise.add_argument("paths", nargs="*")
+    args = parser.parse_args()
+
+    conn = connect_raw()
+    try:
+        {"status": cmd_status, "up": cmd_up, "down": cmd_down, "advise": cmd_advise}[args.command](conn, args)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
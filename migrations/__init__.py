@@ -0,0 +1,106 @@
+# ✅ 資料庫版本遷移
+#
+# 每個遷移是 migrations/mNNNN_說明.py，內容：
+#   VERSION = N
+#   DESCRIPTION = "..."
+#   def up(cursor): ...
+#   def down(cursor): ...
+# up / down 都要可以重複執行（已存在就跳過），執行紀錄寫在 SchemaMigrations 表。
+# DDL 一律用 MySQL 寫法，透過 execute_ddl() 執行時會自動轉成 SQLite 版本。
+import importlib
+import pkgutil
+import re
+
+
+def load_migrations():
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        if info.name.startswith("m") and info.name[1:5].isdigit():
+            migrations.append(importlib.import_module(f"{__name__}.{info.name}"))
+    migrations.sort(key=lambda m: m.VERSION)
+    versions = [m.VERSION for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"遷移版本號重複: {versions}")
+    return migrations
+
+
+def dialect(cursor):
+    return getattr(cursor, "dialect", "mysql")
+
+
+_TABLE_NAME = re.compile(r"CREATE TABLE IF NOT EXISTS (\w+)", re.I)
+_INLINE_KEY = re.compile(r"^\s*(UNIQUE )?KEY (\w+) \(([^)]*)\),?\s*$", re.I | re.M)
+
+
+# ✅ MySQL 的 CREATE TABLE 轉成 SQLite：自動遞增、表選項、行內索引
+def to_sqlite_ddl(ddl):
+    table = _TABLE_NAME.search(ddl).group(1)
+    indexes = []
+
+    def pull_key(match):
+        unique, name, columns = match.groups()
+        if unique:
+            return f"            CONSTRAINT {name} UNIQUE ({columns}),\n"
+        indexes.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        return ""
+
+    ddl = _INLINE_KEY.sub(pull_key, ddl)
+    ddl = ddl.replace("INT AUTO_INCREMENT PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT")
+    # 預設時間跟 MySQL 連線一樣用台灣時間
+    ddl = ddl.replace("DEFAULT CURRENT_TIMESTAMP", "DEFAULT (datetime('now', '+8 hours'))")
+    ddl = re.sub(r"\)\s*ENGINE=\w+ DEFAULT CHARSET=\w+", ")", ddl)
+    # 拿掉行內索引後可能留下結尾多餘的逗號
+    ddl = re.sub(r",(\s*\)\s*)$", r"\1", ddl.rstrip())
+    return [ddl] + indexes
+
+
+def execute_ddl(cursor, ddl):
+    statements = to_sqlite_ddl(ddl) if dialect(cursor) == "sqlite" else [ddl]
+    for statement in statements:
+        cursor.execute(statement)
+
+
+def table_exists(cursor, table):
+    if dialect(cursor) == "sqlite":
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", (table,))
+    else:
+        cursor.execute("""
+            SELECT 1 FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+    return cursor.fetchone() is not None
+
+
+def index_exists(cursor, table, name):
+    if dialect(cursor) == "sqlite":
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+                       (table, name))
+    else:
+        cursor.execute("""
+            SELECT 1 FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+            LIMIT 1
+        """, (table, name))
+    return cursor.fetchone() is not None
+
+
+# MySQL 沒有 CREATE INDEX IF NOT EXISTS，自己先查
+def create_index(cursor, table, name, columns, unique=False):
+    if index_exists(cursor, table, name):
+        return False
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    if dialect(cursor) == "sqlite":
+        cursor.execute(f"CREATE {kind} {name} ON {table} ({', '.join(columns)})")
+    else:
+        cursor.execute(f"ALTER TABLE {table} ADD {kind} {name} ({', '.join(columns)})")
+    return True
+
+
+def drop_index(cursor, table, name):
+    if not table_exists(cursor, table) or not index_exists(cursor, table, name):
+        return False
+    if dialect(cursor) == "sqlite":
+        cursor.execute(f"DROP INDEX {name}")
+    else:
+        cursor.execute(f"ALTER TABLE {table} DROP INDEX {name}")
+    return True
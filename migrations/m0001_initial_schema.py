@@ -0,0 +1,160 @@
+# ✅ 初始資料表（app.py 用到的所有表）
+from migrations import execute_ddl
+
+VERSION = 1
+DESCRIPTION = "initial schema"
+
+TABLES = [
+    ("Users", """
+        CREATE TABLE IF NOT EXISTS Users (
+            user_id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            total_learning_points INT NOT NULL DEFAULT 0,
+            coins INT NOT NULL DEFAULT 0,
+            diamonds INT NOT NULL DEFAULT 0,
+            total_signin_days INT NOT NULL DEFAULT 0,
+            avatar_id INT NOT NULL DEFAULT 1,
+            account_created_at DATETIME NULL,
+            UNIQUE KEY uq_users_username (username),
+            UNIQUE KEY uq_users_email (email)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("Cards", """
+        CREATE TABLE IF NOT EXISTS Cards (
+            card_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            rarity VARCHAR(10) NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("Courses", """
+        CREATE TABLE IF NOT EXISTS Courses (
+            course_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            course_name VARCHAR(255) NOT NULL,
+            progress FLOAT NOT NULL DEFAULT 0,
+            progress_one_to_one FLOAT NOT NULL DEFAULT 0,
+            progress_classroom FLOAT NOT NULL DEFAULT 0,
+            current_stage VARCHAR(20) NOT NULL DEFAULT 'one_to_one',
+            is_favorite BOOLEAN NOT NULL DEFAULT FALSE,
+            is_vr_ready BOOLEAN NOT NULL DEFAULT FALSE,
+            vr_started_at DATETIME NULL,
+            file_type VARCHAR(20) NULL,
+            teacher_card_id INT NULL,
+            created_at DATETIME NULL,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT fk_courses_user FOREIGN KEY (user_id) REFERENCES Users (user_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("CourseChapters", """
+        CREATE TABLE IF NOT EXISTS CourseChapters (
+            chapter_id INT AUTO_INCREMENT PRIMARY KEY,
+            course_id INT NOT NULL,
+            chapter_type VARCHAR(20) NOT NULL,
+            chapter_name VARCHAR(255) NULL,
+            is_completed TINYINT(1) NOT NULL DEFAULT 0,
+            CONSTRAINT fk_chapters_course FOREIGN KEY (course_id) REFERENCES Courses (course_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("LearningPointsLog", """
+        CREATE TABLE IF NOT EXISTS LearningPointsLog (
+            log_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            date DATE NOT NULL,
+            daily_points INT NOT NULL DEFAULT 0,
+            CONSTRAINT fk_points_user FOREIGN KEY (user_id) REFERENCES Users (user_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("SigninRecords", """
+        CREATE TABLE IF NOT EXISTS SigninRecords (
+            user_id INT PRIMARY KEY,
+            signin_day INT NOT NULL DEFAULT 1,
+            has_claimed_today BOOLEAN NOT NULL DEFAULT FALSE,
+            last_signin_date DATE NULL,
+            weekly_streak INT NOT NULL DEFAULT 0,
+            CONSTRAINT fk_signin_user FOREIGN KEY (user_id) REFERENCES Users (user_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("WeeklyTasks", """
+        CREATE TABLE IF NOT EXISTS WeeklyTasks (
+            user_id INT NOT NULL,
+            task_id INT NOT NULL,
+            week_start DATE NOT NULL,
+            is_claimed TINYINT(1) NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, task_id, week_start),
+            CONSTRAINT fk_tasks_user FOREIGN KEY (user_id) REFERENCES Users (user_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("Achievements", """
+        CREATE TABLE IF NOT EXISTS Achievements (
+            achievement_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            badge_name VARCHAR(100) NOT NULL,
+            is_claimed BOOLEAN NOT NULL DEFAULT FALSE,
+            claimed_at DATETIME NULL,
+            UNIQUE KEY uq_achievements_user_badge (user_id, badge_name),
+            CONSTRAINT fk_achievements_user FOREIGN KEY (user_id) REFERENCES Users (user_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("UserCards", """
+        CREATE TABLE IF NOT EXISTS UserCards (
+            user_id INT NOT NULL,
+            card_id INT NOT NULL,
+            obtained_date DATETIME NULL,
+            is_selected TINYINT(1) NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, card_id),
+            CONSTRAINT fk_usercards_user FOREIGN KEY (user_id) REFERENCES Users (user_id) ON DELETE CASCADE,
+            CONSTRAINT fk_usercards_card FOREIGN KEY (card_id) REFERENCES Cards (card_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("CourseReviews", """
+        CREATE TABLE IF NOT EXISTS CourseReviews (
+            review_id INT AUTO_INCREMENT PRIMARY KEY,
+            course_id INT NOT NULL,
+            user_id INT NOT NULL,
+            accuracy_score INT NOT NULL DEFAULT 50,
+            understanding_score INT NOT NULL DEFAULT 50,
+            expression_score INT NOT NULL DEFAULT 50,
+            interaction_score INT NOT NULL DEFAULT 50,
+            teacher_comment TEXT NULL,
+            student1_feedback TEXT NULL,
+            student2_feedback TEXT NULL,
+            student3_feedback TEXT NULL,
+            good_points TEXT NULL,
+            improvement_points TEXT NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_reviews_course_user (course_id, user_id),
+            CONSTRAINT fk_reviews_course FOREIGN KEY (course_id) REFERENCES Courses (course_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("CoursePointsLog", """
+        CREATE TABLE IF NOT EXISTS CoursePointsLog (
+            log_id INT AUTO_INCREMENT PRIMARY KEY,
+            course_id INT NOT NULL,
+            earned_points INT NOT NULL DEFAULT 0,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_course_points_course (course_id),
+            CONSTRAINT fk_course_points_course FOREIGN KEY (course_id) REFERENCES Courses (course_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    ("SavedCourses", """
+        CREATE TABLE IF NOT EXISTS SavedCourses (
+            user_id INT NOT NULL,
+            course_name VARCHAR(255) NOT NULL,
+            PRIMARY KEY (user_id, course_name),
+            CONSTRAINT fk_saved_user FOREIGN KEY (user_id) REFERENCES Users (user_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+]
+
+
+def up(cursor):
+    for _, ddl in TABLES:
+        execute_ddl(cursor, ddl)
+
+
+def down(cursor):
+    # 反過來刪，子表先刪
+    for table, _ in reversed(TABLES):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
@@ -0,0 +1,42 @@
+# ✅ 熱門查詢需要的複合索引
+from migrations import create_index, drop_index
+
+VERSION = 2
+DESCRIPTION = "composite indexes for hot queries"
+
+INDEXES = [
+    # 日 / 週排行榜：WHERE date (BETWEEN) ... GROUP BY user_id SUM(daily_points)
+    # 多帶 daily_points 讓排行榜只讀索引不回表
+    ("LearningPointsLog", "idx_lpl_date_user", ["date", "user_id", "daily_points"], False),
+    # 每人每天只會有一筆，update_learning_points 可以直接 upsert
+    ("LearningPointsLog", "uq_lpl_user_date", ["user_id", "date"], True),
+    # current_stage / get_chapter_progress 的章節統計
+    ("CourseChapters", "idx_chapters_course_type_done", ["course_id", "chapter_type", "is_completed"], False),
+    # current_stage：WHERE user_id AND is_vr_ready ORDER BY vr_started_at DESC
+    ("Courses", "idx_courses_user_vr", ["user_id", "is_vr_ready", "vr_started_at"], False),
+    # latest_course：ORDER BY updated_at DESC
+    ("Courses", "idx_courses_user_updated", ["user_id", "updated_at"], False),
+    # 課程列表 / 搜尋：ORDER BY created_at DESC
+    ("Courses", "idx_courses_user_created", ["user_id", "created_at"], False),
+    # 抽卡依稀有度挑卡
+    ("Cards", "idx_cards_rarity", ["rarity"], False),
+]
+
+
+def up(cursor):
+    # 建唯一索引前先確認沒有重複的 (user_id, date)，有的話請先人工合併
+    cursor.execute("""
+        SELECT user_id, date, COUNT(*) AS n FROM LearningPointsLog
+        GROUP BY user_id, date HAVING n > 1 LIMIT 5
+    """)
+    duplicates = cursor.fetchall()
+    if duplicates:
+        raise RuntimeError(f"LearningPointsLog 有重複的 (user_id, date)，請先合併後再執行: {duplicates}")
+
+    for table, name, columns, unique in INDEXES:
+        create_index(cursor, table, name, columns, unique)
+
+
+def down(cursor):
+    for table, name, _, _ in reversed(INDEXES):
+        drop_index(cursor, table, name)
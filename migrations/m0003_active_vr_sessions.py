@@ -0,0 +1,38 @@
+# ✅ 目前在 VR 裡上課的課程：每個使用者一筆，/current_stage 直接用 user_id 查（原本要在 Courses 裡找 is_vr_ready 的課程排序）
+from migrations import execute_ddl
+
+VERSION = 3
+DESCRIPTION = "active VR session registry"
+
+DDL = """
+    CREATE TABLE IF NOT EXISTS ActiveVRSessions (
+        user_id INT PRIMARY KEY,
+        course_id INT NOT NULL,
+        started_at DATETIME NOT NULL,
+        KEY idx_vr_sessions_course (course_id),
+        CONSTRAINT fk_vr_sessions_user FOREIGN KEY (user_id) REFERENCES Users (user_id) ON DELETE CASCADE,
+        CONSTRAINT fk_vr_sessions_course FOREIGN KEY (course_id) REFERENCES Courses (course_id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+
+def up(cursor):
+    execute_ddl(cursor, DDL)
+    # 把現在 is_vr_ready 的課程搬進來：每個使用者取 vr_started_at 最新的一門（跟原本 /current_stage 的查詢一樣）
+    cursor.execute("DELETE FROM ActiveVRSessions")
+    cursor.execute("""
+        INSERT INTO ActiveVRSessions (user_id, course_id, started_at)
+        SELECT c.user_id, c.course_id, c.vr_started_at
+        FROM Courses c
+        WHERE c.is_vr_ready = TRUE AND c.vr_started_at IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM Courses n
+              WHERE n.user_id = c.user_id AND n.is_vr_ready = TRUE AND n.vr_started_at IS NOT NULL
+                AND (n.vr_started_at > c.vr_started_at
+                     OR (n.vr_started_at = c.vr_started_at AND n.course_id > c.course_id))
+          )
+    """)
+
+
+def down(cursor):
+    cursor.execute("DROP TABLE IF EXISTS ActiveVRSessions")
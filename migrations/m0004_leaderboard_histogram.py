@@ -0,0 +1,54 @@
+# ✅ 日 / 週排行榜的點數分布：前10名以外的使用者可以選擇用分布估算名次（repositories/rank_histogram.py）
+from collections import Counter
+
+from migrations import dialect, execute_ddl
+from repositories import rank_histogram
+
+VERSION = 4
+DESCRIPTION = "leaderboard score histogram"
+
+DDL = """
+    CREATE TABLE IF NOT EXISTS LeaderboardHistogram (
+        board VARCHAR(8) NOT NULL,
+        period_start DATE NOT NULL,
+        bucket INT NOT NULL,
+        users INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (board, period_start, bucket)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# 該週的週一
+WEEK_START = {
+    "mysql": "DATE_SUB(date, INTERVAL WEEKDAY(date) DAY)",
+    "sqlite": "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')",
+}
+
+
+def up(cursor):
+    execute_ddl(cursor, DDL)
+    rebuild(cursor)
+
+
+# ✅ 用現有的 LearningPointsLog 重算每天 / 每週的分布（整份重建；gen_data.py 匯入假資料後也會呼叫）
+def rebuild(cursor):
+    cursor.execute("DELETE FROM LeaderboardHistogram")
+    counts = Counter()
+    cursor.execute("SELECT date, daily_points FROM LearningPointsLog WHERE daily_points > 0")
+    for day, points in cursor.fetchall():
+        counts["daily", day, rank_histogram.bucket(int(points))] += 1
+    cursor.execute(f"""
+        SELECT {WEEK_START[dialect(cursor)]} AS week_start, user_id, SUM(daily_points) AS points
+        FROM LearningPointsLog
+        GROUP BY week_start, user_id
+    """)
+    for week_start, _, points in cursor.fetchall():
+        if points > 0:
+            counts["weekly", week_start, rank_histogram.bucket(int(points))] += 1
+    if counts:
+        cursor.executemany(
+            "INSERT INTO LeaderboardHistogram (board, period_start, bucket, users) VALUES (%s, %s, %s, %s)",
+            [(board, start, index, users) for (board, start, index), users in counts.items()])
+
+
+def down(cursor):
+    cursor.execute("DROP TABLE IF EXISTS LeaderboardHistogram")
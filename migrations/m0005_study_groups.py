@@ -0,0 +1,56 @@
+# ✅ 班級 / 小組排行榜：成員名單 + 每個小組成員的日 / 週 / 生涯點數（/update_learning_points 直接累加），
+# 小組排行榜只讀小組自己的資料，不用掃整個 LearningPointsLog
+from migrations import execute_ddl
+
+VERSION = 5
+DESCRIPTION = "study groups and group leaderboards"
+
+TABLES = [
+    ("StudyGroups", """
+        CREATE TABLE IF NOT EXISTS StudyGroups (
+            group_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            owner_user_id INT NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_groups_owner (owner_user_id),
+            CONSTRAINT fk_groups_owner FOREIGN KEY (owner_user_id) REFERENCES Users (user_id) ON DELETE SET NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    # 一個人在哪些小組：加點數時用 user_id 找
+    ("GroupMembers", """
+        CREATE TABLE IF NOT EXISTS GroupMembers (
+            group_id INT NOT NULL,
+            user_id INT NOT NULL,
+            joined_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (group_id, user_id),
+            KEY idx_group_members_user (user_id),
+            CONSTRAINT fk_group_members_group FOREIGN KEY (group_id) REFERENCES StudyGroups (group_id) ON DELETE CASCADE,
+            CONSTRAINT fk_group_members_user FOREIGN KEY (user_id) REFERENCES Users (user_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+    # board：daily / weekly / all（生涯，period_start 固定 1970-01-01）
+    # 排行榜：WHERE group_id, board, period_start ORDER BY points DESC，只讀索引的前幾筆
+    ("GroupMemberPoints", """
+        CREATE TABLE IF NOT EXISTS GroupMemberPoints (
+            group_id INT NOT NULL,
+            board VARCHAR(8) NOT NULL,
+            period_start DATE NOT NULL,
+            user_id INT NOT NULL,
+            points INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (group_id, board, period_start, user_id),
+            KEY idx_group_points_rank (group_id, board, period_start, points),
+            CONSTRAINT fk_group_points_member FOREIGN KEY (group_id, user_id)
+                REFERENCES GroupMembers (group_id, user_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """),
+]
+
+
+def up(cursor):
+    for _, ddl in TABLES:
+        execute_ddl(cursor, ddl)
+
+
+def down(cursor):
+    for table, _ in reversed(TABLES):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
@@ -0,0 +1,112 @@
+# ✅ DB 連線池：每個 DB 主機各一個，連線用完放回去，不用每個請求重新連線 + SET time_zone
+#
+# DB_POOL_SIZE          每個 worker 對每台主機最多幾條連線（預設 5）
+# DB_POOL_TIMEOUT       池子滿了最多等幾秒（預設 5），等不到丟 PoolTimeout
+# DB_POOL_IDLE_CHECK    閒置超過幾秒的連線，拿出來前先確認還活著（預設 30）
+import collections
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger("feyndora.db.pool")
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+IDLE_CHECK = float(os.getenv("DB_POOL_IDLE_CHECK", "30"))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, name, connect, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+        self._connect = connect
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        # fork 出來的 worker 不能沿用父 process 的連線
+        self._pid = os.getpid()
+        self._idle = collections.deque()
+        self._created = 0
+        self.waiters = 0
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            if self._pid != os.getpid():
+                self._reset()
+            while True:
+                if self._idle:
+                    raw, released_at = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    raw = released_at = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"{self.name} 連線池已滿（{self.size} 條），等待逾時")
+                self.waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self.waiters -= 1
+
+        if raw is not None and time.monotonic() - released_at > IDLE_CHECK and not _alive(raw):
+            log.info("丟棄失效的閒置連線", extra={"pool": self.name})
+            _close_quietly(raw)
+            raw = None
+        if raw is None:
+            try:
+                raw = self._connect()
+            except Exception:
+                self._forget()
+                raise
+        return raw
+
+    def release(self, raw, discard=False):
+        if not discard:
+            try:
+                # 沒 commit 的交易不能帶給下一個請求
+                if getattr(raw, "in_transaction", True):
+                    raw.rollback()
+            except Exception:
+                discard = True
+        if self._pid != os.getpid():
+            _close_quietly(raw)
+            return
+        if discard:
+            _close_quietly(raw)
+            self._forget()
+            return
+        with self._cond:
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def _forget(self):
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def stats(self):
+        return {"size": self.size, "open": self._created, "idle": len(self._idle), "waiters": self.waiters}
+
+
+def _alive(raw):
+    try:
+        return raw.is_connected()
+    except Exception:
+        return False
+
+
+def _close_quietly(raw):
+    try:
+        raw.close()
+    except Exception:
+        pass
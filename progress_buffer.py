@@ -0,0 +1,456 @@
+# ✅ VR 進度合併寫入：VR 端上課時每幾秒就回報一次進度，同一門課在 PROGRESS_FLUSH_INTERVAL 秒內只寫一次 Courses
+#
+# PROGRESS_FLUSH_INTERVAL   同一門課最少隔幾秒寫一次 DB（預設 5；設成 0 關閉，每次都直接寫）
+# PROGRESS_LEASE            寫入中最多佔住這門課幾秒（預設 10，worker 當掉時別的 worker 才能接手）
+#
+# 每門課最新的進度放在 SHM_DIR（預設 /dev/shm）裡的一個小 SQLite 檔（跟 idempotency 一樣），所有 worker 共用：
+#   /update_progress   階段（current_stage）變了、新的一堂課（/continue_course 之後）的第一筆、或距離上次寫入
+#                      超過間隔 → 直接寫 DB；其他只更新共用記錄，背景執行緒到時間再把「最新的一筆」寫進去
+#   /continue_course、/current_stage   先把還沒寫的進度寫進自己的交易，再做自己的事
+#   /finish_course     結束課程會把進度整個蓋成 100 / completed，還沒寫的進度直接丟掉
+#   /latest_course、/courses   回傳時套上還沒寫進 DB 的進度，client 看到的跟每次都直接寫一樣
+# 記錄同時記住課程屬於哪個使用者，/update_progress 不用每次先 SELECT 確認課程存在；
+# 也記住這門課是不是還登記著 VR session（ActiveVRSessions），只有新的一堂課第一次寫進度時才去移除。
+# 同一門課同時只有一個人在寫（lease），寫進 DB 的順序跟回報的順序一樣，舊的進度不會蓋掉新的。
+import atexit
+import contextlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import metrics
+import shm
+from db import DatabaseUnavailable, get_db_connection
+from repositories import courses, vr_sessions
+
+log = logging.getLogger("feyndora.progress")
+
+INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "5"))
+LEASE = float(os.getenv("PROGRESS_LEASE", "10"))
+OWNER_TTL = 3600  # 課程屬於誰記多久，之後重新跟 DB 確認（課程被刪掉、DB 重建時不會一直記著）
+FIELDS = ("progress", "progress_one_to_one", "progress_classroom", "current_stage")
+
+
+class ProgressStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # 放在記憶體裡的暫存資料，不用 fsync
+            # current_stage 是 NULL：不知道 DB 裡的階段（新的一堂課），下一筆進度直接寫
+            # dirty：最新的進度還沒寫進 DB；forced：要馬上寫（階段變了），不等間隔
+            # seq：每次回報 +1，寫完時用來確認寫進去的是不是最新的一筆
+            # session_open：這門課可能還登記著 VR session（ActiveVRSessions），下次寫進度時一起移除
+            # session_started：/continue_course 的時間（移除時算 session 持續多久，不用再查 DB）
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS course_progress (
+                    course_id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    progress REAL,
+                    progress_one_to_one REAL,
+                    progress_classroom REAL,
+                    current_stage TEXT,
+                    dirty INTEGER NOT NULL DEFAULT 0,
+                    forced INTEGER NOT NULL DEFAULT 0,
+                    seq INTEGER NOT NULL DEFAULT 0,
+                    written_at REAL NOT NULL DEFAULT 0,
+                    lease_until REAL NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    session_open INTEGER NOT NULL DEFAULT 1,
+                    session_started REAL
+                )
+            """)
+            # 舊版建的檔案（/dev/shm 重新部署後還在）補上欄位
+            columns = {column[1] for column in conn.execute("PRAGMA table_info(course_progress)")}
+            for column, ddl in (("session_open", "INTEGER NOT NULL DEFAULT 1"), ("session_started", "REAL")):
+                if column not in columns:
+                    try:
+                        conn.execute(f"ALTER TABLE course_progress ADD COLUMN {column} {ddl}")
+                    except sqlite3.OperationalError:
+                        pass  # 別的 worker 剛好先加了
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_course_progress_user ON course_progress (user_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_course_progress_dirty ON course_progress (dirty)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def owner(self, course_id):
+        row = self._conn().execute(
+            "SELECT user_id FROM course_progress WHERE course_id = ? AND updated_at > ?",
+            (course_id, time.time() - OWNER_TTL)).fetchone()
+        return row["user_id"] if row else None
+
+    def remember(self, course_id, user_id):
+        self._conn().execute("""
+            INSERT INTO course_progress (course_id, user_id, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (course_id) DO UPDATE SET user_id = excluded.user_id, updated_at = excluded.updated_at
+        """, (course_id, user_id, time.time()))
+
+    # ✅ 記下最新進度；回傳 True 代表呼叫的人拿到 lease，要馬上寫進 DB
+    def record(self, course_id, values, interval):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT current_stage, written_at, lease_until FROM course_progress WHERE course_id = ?",
+                (course_id,)).fetchone()
+            if row is None:
+                return None
+            forced = row["current_stage"] is None or row["current_stage"] != values["current_stage"]
+            write_now = (forced or now - row["written_at"] >= interval) and row["lease_until"] <= now
+            conn.execute("""
+                UPDATE course_progress
+                SET progress = ?, progress_one_to_one = ?, progress_classroom = ?, current_stage = ?,
+                    dirty = 1, forced = forced OR ?, seq = seq + 1, updated_at = ?,
+                    lease_until = CASE WHEN ? THEN ? ELSE lease_until END
+                WHERE course_id = ?
+            """, (*(values[field] for field in FIELDS), forced, now, write_now, now + LEASE, course_id))
+        return write_now
+
+    # ✅ 拿這門課的 lease（別人在寫的話最多等 wait 秒），回傳目前的記錄；沒有記錄或等不到回傳 None
+    def acquire(self, course_id, wait=0.0):
+        deadline = time.monotonic() + wait
+        while True:
+            now = time.time()
+            with self._transaction() as conn:
+                row = conn.execute("SELECT * FROM course_progress WHERE course_id = ?", (course_id,)).fetchone()
+                if row is None:
+                    return None
+                if row["lease_until"] <= now:
+                    conn.execute("UPDATE course_progress SET lease_until = ? WHERE course_id = ?",
+                                 (now + LEASE, course_id))
+                    return dict(row)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.01)
+
+    def leased(self, course_id):
+        row = self._conn().execute("SELECT * FROM course_progress WHERE course_id = ?", (course_id,)).fetchone()
+        return dict(row) if row else None
+
+    # ✅ 放掉 lease。written_seq：已經 commit 進 DB 的是第幾筆（沒寫成功傳 None）
+    # values：呼叫的人自己寫進 DB 的進度（例如 /current_stage 重新計算的），期間沒有新的回報才採用
+    # session：commit 之後 VR session 是否還登記著（None = 沒變）；session_started：新登記的 session 開始時間
+    # 回傳 True 代表期間又有新的回報而且該馬上寫（階段變了或已經到間隔）
+    def release(self, course_id, written_seq=None, values=None, interval=0.0, session=None, session_started=None):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT seq FROM course_progress WHERE course_id = ?", (course_id,)).fetchone()
+            if row is None:
+                return False
+            if written_seq is None:
+                conn.execute("UPDATE course_progress SET lease_until = 0 WHERE course_id = ?", (course_id,))
+                return False
+            if session is not None:
+                # 新的一堂課開始時已經有新的回報在等：要馬上寫，才會結束 VR Ready 狀態
+                conn.execute("""
+                    UPDATE course_progress SET session_open = ?, forced = forced OR ?, session_started = ?
+                    WHERE course_id = ?
+                """, (int(session), int(session), session_started if session else None, course_id))
+            if row["seq"] == written_seq:
+                fields = values or {}
+                assignments = "".join(f", {field} = :{field}" for field in fields if field != "current_stage")
+                if "current_stage" in fields:
+                    # 新的一堂課（current_stage 是 NULL、還登記著 VR session）要等 /update_progress 真的寫過才結束，
+                    # /current_stage 寫回的階段不能蓋掉，不然第一筆進度會被合併，VR Ready 狀態一直不會結束
+                    assignments += (", current_stage = CASE WHEN current_stage IS NULL AND session_open = 1"
+                                    " AND :current_stage IS NOT NULL THEN NULL ELSE :current_stage END")
+                conn.execute(f"""
+                    UPDATE course_progress
+                    SET dirty = 0, forced = 0, written_at = :now, lease_until = 0, updated_at = :now{assignments}
+                    WHERE course_id = :course_id
+                """, dict(fields, now=now, course_id=course_id))
+            else:
+                conn.execute("UPDATE course_progress SET written_at = ?, lease_until = 0 WHERE course_id = ?",
+                             (now, course_id))
+                again = conn.execute(
+                    "SELECT 1 FROM course_progress WHERE course_id = ? AND dirty = 1 AND (forced = 1 OR ? <= 0)",
+                    (course_id, interval)).fetchone()
+                return again is not None
+        return False
+
+    # 到時間該寫、而且沒人在寫的課程
+    def due(self, interval):
+        now = time.time()
+        rows = self._conn().execute("""
+            SELECT course_id FROM course_progress
+            WHERE dirty = 1 AND (forced = 1 OR written_at <= ?) AND lease_until <= ?
+        """, (now - interval, now)).fetchall()
+        return [row["course_id"] for row in rows]
+
+    def pending_by_user(self, user_id):
+        rows = self._conn().execute(
+            "SELECT * FROM course_progress WHERE user_id = ? AND dirty = 1", (user_id,)).fetchall()
+        return {row["course_id"]: dict(row) for row in rows}
+
+    def forget(self, course_id):
+        self._conn().execute("DELETE FROM course_progress WHERE course_id = ?", (course_id,))
+
+    def cleanup(self):
+        self._conn().execute("DELETE FROM course_progress WHERE dirty = 0 AND updated_at <= ?",
+                             (time.time() - OWNER_TTL,))
+
+
+store = ProgressStore(os.path.join(shm.SHM_DIR, f"{shm.SHM_PREFIX}-progress.db"))
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _normalize(values):
+    # DB 欄位是 FLOAT，套上去的進度也用 float，跟從 DB 讀出來的一樣
+    return {"progress": float(values["progress"]),
+            "progress_one_to_one": float(values["progress_one_to_one"]),
+            "progress_classroom": float(values["progress_classroom"]),
+            "current_stage": values["current_stage"]}
+
+
+# ✅ 課程屬於哪個使用者（記錄裡沒有回傳 None，呼叫的人查 DB 後用 remember() 記下來）
+def owner(course_id):
+    try:
+        return store.owner(course_id)
+    except sqlite3.Error as e:
+        log.warning("進度記錄讀取失敗: %s", e)
+        return None
+
+
+def remember(course_id, user_id):
+    try:
+        store.remember(course_id, user_id)
+    except sqlite3.Error as e:
+        log.warning("進度記錄寫入失敗: %s", e)
+
+
+# ✅ /update_progress：記下最新進度，該寫的時候寫進 DB；回傳 False 代表課程已經不存在
+# conn：已經拿好的連線（查過課程擁有者的話），沒有的話要寫時才拿
+def update(course_id, user_id, values, conn=None):
+    values = _normalize(values)
+    _ensure_flusher()
+    if INTERVAL > 0:
+        try:
+            write_now = store.record(course_id, values, INTERVAL)
+        except sqlite3.Error as e:
+            log.warning("進度記錄寫入失敗，直接寫 DB: %s", e)
+            write_now = None
+        if write_now is False:
+            metrics.record_progress("buffered")
+            return True
+        if write_now:
+            return _write_leased(course_id, conn)
+
+    # 關閉合併、記錄壞掉或記錄剛好被清掉：照原本的方式直接寫
+    with _connection(conn, user_id) as conn:
+        updated = _write(conn, course_id, user_id, values)
+        conn.commit()
+    metrics.record_progress("written")
+    return updated > 0
+
+
+def _session_seconds(row):
+    started = row.get("session_started") if row else None
+    return time.time() - started if started else None
+
+
+# 寫進度會結束 VR Ready 狀態：這門課還登記著 VR session 的話一起移除
+# row：進度記錄（有的話用來判斷 session 是否還登記著、算 session 持續多久）
+def _write(conn, course_id, user_id, values, row=None):
+    updated = courses.update_progress(conn, course_id, *(values[field] for field in FIELDS))
+    if updated and (row is None or row["session_open"]):
+        if vr_sessions.end(conn, user_id, course_id):
+            seconds = _session_seconds(row)
+            conn.on_commit(lambda: metrics.record_vr_session_ended("progress", seconds))
+    return updated
+
+
+@contextlib.contextmanager
+def _connection(conn, user_id):
+    if conn is not None:
+        conn.user_id = user_id  # 寫入後這個使用者的讀取走 primary
+        yield conn
+        return
+    conn = get_db_connection(user_id=user_id)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+# 已經拿到 lease：把記錄裡最新的進度寫進 DB，寫的期間又有該馬上寫的回報就再寫一次
+def _write_leased(course_id, conn=None, result="written"):
+    while True:
+        row = store.leased(course_id)
+        if row is None:
+            return False
+        try:
+            with _connection(conn, row["user_id"]) as db_conn:
+                updated = _write(db_conn, course_id, row["user_id"], row, row)
+                db_conn.commit()
+        except Exception:
+            store.release(course_id)
+            raise
+        metrics.record_progress(result)
+        if updated == 0:
+            store.forget(course_id)
+            return False
+        if not store.release(course_id, row["seq"], interval=INTERVAL, session=False) or not store.acquire(course_id):
+            return True
+
+
+# ✅ /continue_course、/current_stage、/finish_course 用：先拿到這門課的 lease，把還沒寫的進度寫進 conn 的交易
+# （supersede=True 時不寫，因為這次的寫入會整個蓋掉），呼叫的人 commit 之後呼叫 settlement.done()。
+#   with progress_buffer.settle(conn, course_id) as settlement:
+#       ...寫入、commit...
+#       settlement.done(values)   # values：這次寫進 DB 的進度
+# new_session=True：開始新的一堂課（登記了 VR session，started_at 是開始時間），下一筆進度直接寫；
+# session_ended=True：這次移除了 VR session
+class Settlement:
+    def __init__(self, row):
+        self.row = row
+        self.pending = row if row and row["dirty"] else None
+        self.committed = False
+        self.values = None
+        self.session = None
+        self.session_started = None
+
+    # 這門課可能還登記著 VR session（沒有記錄的話不知道，當作有）
+    @property
+    def session_open(self):
+        return self.row is None or (bool(self.row["session_open"]) and self.session is not False)
+
+    # 目前的 session 開始多久了（不知道回傳 None）
+    @property
+    def session_seconds(self):
+        return _session_seconds(self.row)
+
+    def done(self, values=None, new_session=False, session_ended=False, started_at=None):
+        self.committed = True
+        self.values = dict(values or {})
+        if new_session:
+            self.values["current_stage"] = None
+            self.session = True
+            self.session_started = started_at.timestamp() if started_at else time.time()
+        elif session_ended:
+            self.session = False
+
+
+@contextlib.contextmanager
+def settle(conn, course_id, supersede=False):
+    try:
+        row = store.acquire(course_id, wait=LEASE)
+    except sqlite3.Error as e:
+        log.warning("進度記錄讀取失敗: %s", e)
+        row = None
+    settlement = Settlement(row)
+    if row is None:
+        yield settlement
+        return
+    try:
+        if settlement.pending and not supersede:
+            conn.user_id = row["user_id"]
+            _write(conn, course_id, row["user_id"], row, row)
+            settlement.session = False
+            metrics.record_progress("settled")
+        elif settlement.pending:
+            metrics.record_progress("superseded")
+        yield settlement
+    finally:
+        written_seq = row["seq"] if settlement.committed else None
+        try:
+            if store.release(course_id, written_seq, settlement.values, INTERVAL, settlement.session,
+                             settlement.session_started):
+                _flush_one(course_id)
+        except sqlite3.Error as e:
+            log.warning("進度記錄寫入失敗: %s", e)
+
+
+# ✅ 把還沒寫進 DB 的進度套到 DB 讀出來的課程上（rows 裡要有 course_id）
+def overlay(user_id, rows):
+    try:
+        pending = store.pending_by_user(user_id) if rows else {}
+    except sqlite3.Error as e:
+        log.warning("進度記錄讀取失敗: %s", e)
+        return rows
+    if not pending:
+        return rows
+    merged = []
+    for row in rows:
+        entry = pending.get(row["course_id"])
+        if entry is not None:
+            row = dict(row, **{field: entry[field] for field in FIELDS if field in row})
+        merged.append(row)
+    return merged
+
+
+def forget(course_id):
+    try:
+        store.forget(course_id)
+    except sqlite3.Error as e:
+        log.warning("進度記錄寫入失敗: %s", e)
+
+
+def _flush_one(course_id):
+    if store.acquire(course_id):
+        _write_leased(course_id, result="flushed")
+
+
+# ✅ 到時間的進度寫進 DB；final=True（worker 結束時）不等間隔，全部寫掉
+def flush_due(final=False):
+    for course_id in store.due(0 if final else INTERVAL):
+        try:
+            _flush_one(course_id)
+        except DatabaseUnavailable:
+            return  # DB 無法使用時留著，下一輪再寫
+        except Exception:
+            log.exception("寫入 VR 進度失敗", extra={"course_id": course_id})
+
+
+def _ensure_flusher():
+    global _flusher_pid
+    if _flusher_pid == os.getpid() or INTERVAL <= 0:
+        return
+    with _flusher_lock:
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(target=_flush_loop, name="progress-flusher", daemon=True).start()
+
+
+def _flush_loop():
+    # 每個 worker 都跑，靠 lease 分工；某個 worker 結束了，其他 worker 會接手它留下的進度
+    while True:
+        time.sleep(min(INTERVAL, 1.0))
+        try:
+            flush_due()
+            if random.random() < 0.01:
+                store.cleanup()
+        except Exception:
+            log.exception("VR 進度背景寫入失敗")
+
+
+def _flush_at_exit():
+    if _flusher_pid != os.getpid():
+        return
+    try:
+        flush_due(final=True)
+    except Exception:
+        log.exception("結束前寫入 VR 進度失敗")
+
+
+atexit.register(_flush_at_exit)
@@ -0,0 +1,233 @@
+# ✅ 跨 worker 的 pub/sub（本機版）：一個 worker 發布的訊息，所有 worker 裡訂閱同一個頻道的連線都收得到
+#
+# 訊息放在 /dev/shm 的一個環狀緩衝區（shm.py），每則訊息有遞增的序號：
+#   發布：上檔案鎖，寫進下一格，再把「最新序號」+1
+#   訂閱：每個 worker 一個背景執行緒，每 PUBSUB_POLL 秒看一次最新序號，把新訊息分給這個 worker 裡的訂閱者
+# 訂閱者太慢（自己的佇列滿了）或背景執行緒跟不上（訊息被新訊息蓋掉）時，訂閱者會收到 RESYNC，
+# 自己重新查一次完整狀態。之後要換成 Redis pub/sub 只需要換掉這個模組，publish() / subscribe() 的用法不變。
+#
+# PUBSUB_SLOTS          環狀緩衝區幾格（預設 4096，也就是斷線重連時最多補回最近 4096 則）
+# PUBSUB_MESSAGE_BYTES  每則訊息最大 bytes（預設 1024，超過的不發布）
+# PUBSUB_POLL           背景執行緒多久看一次新訊息（預設 0.05 秒）
+# PUBSUB_QUEUE          每個訂閱者最多暫存幾則還沒送出的訊息（預設 256）
+import collections
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+
+import metrics
+import shm
+
+log = logging.getLogger("feyndora.pubsub")
+
+SLOTS = int(os.getenv("PUBSUB_SLOTS", "4096"))
+MESSAGE_BYTES = int(os.getenv("PUBSUB_MESSAGE_BYTES", "1024"))
+POLL_INTERVAL = float(os.getenv("PUBSUB_POLL", "0.05"))
+QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE", "256"))
+
+HEADER_SIZE = 64
+HEAD = struct.Struct("<Q")     # offset 0：最新的序號
+SLOT = struct.Struct("<QI")    # 每格開頭：序號（寫入中是 0）、長度
+SLOT_SIZE = SLOT.size + MESSAGE_BYTES
+
+Message = collections.namedtuple("Message", "seq channel event data")
+RESYNC = Message(0, None, "resync", None)
+
+
+class Ring:
+    def __init__(self, name="pubsub", slots=SLOTS):
+        self.slots = slots
+        self._name = name
+        self._segment = None
+
+    def _open(self):
+        # 第一次用到才打開（fork 之後每個 worker 自己打開，檔案鎖才不會共用）
+        if self._segment is None:
+            fd, buf = shm.open_segment(self._name, HEADER_SIZE + self.slots * SLOT_SIZE)
+            self._segment = buf, shm.SegmentLock(fd)
+        return self._segment
+
+    def head(self):
+        return HEAD.unpack_from(self._open()[0], 0)[0]
+
+    def append(self, payload):
+        buf, lock = self._open()
+        with lock:
+            seq = HEAD.unpack_from(buf, 0)[0] + 1
+            offset = HEADER_SIZE + (seq % self.slots) * SLOT_SIZE
+            SLOT.pack_into(buf, offset, 0, 0)  # 先標成寫入中，讀到一半的人會知道被蓋掉了
+            buf[offset + SLOT.size:offset + SLOT.size + len(payload)] = payload
+            SLOT.pack_into(buf, offset, seq, len(payload))
+            HEAD.pack_into(buf, 0, seq)
+        return seq
+
+    # 讀第 seq 則；已經被新訊息蓋掉回傳 None
+    def read(self, seq):
+        buf, _ = self._open()
+        offset = HEADER_SIZE + (seq % self.slots) * SLOT_SIZE
+        stored, length = SLOT.unpack_from(buf, offset)
+        if stored != seq:
+            return None
+        payload = bytes(buf[offset + SLOT.size:offset + SLOT.size + length])
+        if SLOT.unpack_from(buf, offset)[0] != seq:
+            return None
+        return payload
+
+
+class Subscription:
+    def __init__(self, channel):
+        self.channel = channel
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._resync = False
+        self._last = 0  # 已經交出去的最後一個序號（補送和即時分送可能重複）
+
+    def deliver(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._resync = True
+            metrics.record_pubsub_dropped("slow_subscriber")
+
+    def resync(self):
+        self._resync = True
+        try:
+            self._queue.put_nowait(RESYNC)  # 叫醒正在等的 get()
+        except queue.Full:
+            pass
+
+    # ✅ 等下一則訊息，timeout 秒內沒有回傳 None；漏掉訊息時回傳 RESYNC（佇列清空重來）
+    def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._resync:
+                self._resync = False
+                with self._queue.mutex:
+                    self._queue.queue.clear()
+                return RESYNC
+            try:
+                message = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+            if message is RESYNC:
+                continue
+            if message.seq > self._last:
+                self._last = message.seq
+                return message
+
+    def close(self):
+        _unregister(self)
+
+
+_ring = Ring()
+_subscribers = {}  # 頻道 → 這個 worker 裡的訂閱者
+_lock = threading.Lock()
+_dispatcher_pid = None
+
+
+def _decode(seq, payload):
+    message = json.loads(payload)
+    return Message(seq, message["channel"], message["event"], message.get("data"))
+
+
+# ✅ 發布到頻道（所有 worker 的訂閱者都會收到），回傳序號；太大發布不了回傳 None
+def publish(channel, event, data=None):
+    payload = json.dumps({"channel": channel, "event": event, "data": data},
+                         ensure_ascii=False, separators=(",", ":"), default=str).encode()
+    if len(payload) > MESSAGE_BYTES:
+        log.warning("訊息太大，不發布", extra={"channel": channel, "event": event, "bytes": len(payload)})
+        metrics.record_pubsub_dropped("too_large")
+        return None
+    seq = _ring.append(payload)
+    metrics.record_pubsub_published(event)
+    return seq
+
+
+# ✅ 訂閱頻道；since：client 斷線前收到的最後一個序號（SSE 的 Last-Event-ID），還在緩衝區裡的會先補送
+def subscribe(channel, since=None):
+    _ensure_dispatcher()
+    subscription = Subscription(channel)
+    with _lock:
+        # 先登記再補送，中間發布的訊息才不會漏掉（重複的在 get() 用序號擋掉）
+        _subscribers.setdefault(channel, set()).add(subscription)
+        head = _ring.head()
+    subscription._last = head if since is None else min(since, head)
+    if since is not None and since > head:
+        subscription.resync()  # 序號比目前還新：共用記憶體被清掉過（重開機）
+    elif since is not None and since < head:
+        if head - since >= _ring.slots:
+            subscription.resync()
+        else:
+            for seq in range(since + 1, head + 1):
+                payload = _ring.read(seq)
+                if payload is None:
+                    subscription.resync()
+                    break
+                message = _decode(seq, payload)
+                if message.channel == channel:
+                    subscription.deliver(message)
+    return subscription
+
+
+def _unregister(subscription):
+    with _lock:
+        subscribers = _subscribers.get(subscription.channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del _subscribers[subscription.channel]
+
+
+def _ensure_dispatcher():
+    global _dispatcher_pid
+    if _dispatcher_pid == os.getpid():
+        return
+    with _lock:
+        if _dispatcher_pid != os.getpid():
+            _dispatcher_pid = os.getpid()
+            _subscribers.clear()  # fork 前的訂閱者不屬於這個 worker
+            threading.Thread(target=_dispatch_loop, args=(_ring.head(),), name="pubsub-dispatcher",
+                             daemon=True).start()
+
+
+def _dispatch_loop(last):
+    while True:
+        time.sleep(POLL_INTERVAL)
+        try:
+            head = _ring.head()
+            if head == last:
+                continue
+            if head - last > _ring.slots:
+                # 落後太多，中間的訊息已經被蓋掉
+                _resync_all("overrun")
+                last = head - _ring.slots
+            for seq in range(last + 1, head + 1):
+                payload = _ring.read(seq)
+                if payload is None:
+                    _resync_all("overrun")
+                    continue
+                message = _decode(seq, payload)
+                with _lock:
+                    subscribers = list(_subscribers.get(message.channel, ()))
+                for subscription in subscribers:
+                    subscription.deliver(message)
+            last = head
+        except Exception:
+            log.exception("分送訊息失敗")
+
+
+def _resync_all(reason):
+    metrics.record_pubsub_dropped(reason)
+    with _lock:
+        subscriptions = [s for subscribers in _subscribers.values() for s in subscribers]
+    for subscription in subscriptions:
+        subscription.resync()
+
+
+def stats():
+    with _lock:
+        return {"head": _ring.head(), "channels": len(_subscribers),
+                "subscribers": sum(len(subscribers) for subscribers in _subscribers.values())}
@@ -0,0 +1,136 @@
+# ✅ 慢查詢紀錄（附 EXPLAIN）＋ 每個 API 的 SQL 次數預算
+#
+# SLOW_QUERY_MS        超過幾毫秒算慢查詢（預設 200，設 0 關閉）
+# SLOW_QUERY_EXPLAIN   慢查詢是否自動補抓 EXPLAIN（預設 1）
+# QUERY_BUDGET_MODE    超過 SQL 次數預算時：warn（記 log，預設）/ raise（直接丟例外，測試用）/ off
+import logging
+import os
+import re
+import threading
+import time
+
+from flask import current_app, g, request
+
+logger = logging.getLogger("feyndora.sql")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "1") == "1"
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn")
+
+# 同一句 SQL 幾秒內只 EXPLAIN 一次，避免 DB 慢的時候又被 EXPLAIN 灌爆
+EXPLAIN_INTERVAL = 300
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE")
+
+_explained_at = {}
+_explained_lock = threading.Lock()
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+# ✅ 把 SQL 正規化：去掉多餘空白、字面值換成 ?，同一種查詢才能歸在一起
+def normalize_sql(sql):
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode("utf-8", "replace")
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def _loggable_params(normalized, params):
+    if params is None:
+        return None
+    if "password" in normalized.lower():
+        return "<redacted>"
+    values = params.values() if isinstance(params, dict) else params
+    return [v if not isinstance(v, str) or len(v) <= 200 else v[:200] + "…" for v in values]
+
+
+# ✅ 回傳 (執行計畫, 全表掃描的表)；SQLite 用 EXPLAIN QUERY PLAN，沒有走索引的是 "SCAN 表名"
+def explain(cursor, sql, params=None):
+    if getattr(cursor, "dialect", "mysql") == "sqlite":
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        plan = cursor.fetchall()
+        full_scans = [row["detail"].split()[1] for row in plan
+                      if row["detail"].startswith("SCAN ") and " INDEX " not in row["detail"]
+                      and not row["detail"].startswith("SCAN CONSTANT ROW")]
+        return plan, full_scans
+    cursor.execute("EXPLAIN " + sql, params)
+    plan = cursor.fetchall()
+    return plan, [row.get("table") for row in plan if row.get("type") == "ALL"]
+
+
+def _explain(sql, params, normalized):
+    # 用另一條連線跑 EXPLAIN：原本的 cursor 可能還有沒讀完的結果
+    from db import connect_raw
+
+    try:
+        conn = connect_raw()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            plan, full_scans = explain(cursor, sql, params)
+            cursor.close()
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.warning("EXPLAIN 失敗: %s | %s", e, normalized)
+        return
+
+    logger.warning("慢查詢 EXPLAIN: %s | plan=%s%s", normalized, plan,
+                   f" | ⚠️ 全表掃描: {full_scans}" if full_scans else "")
+
+
+# ✅ db.py 的 cursor 每次 execute 完都會呼叫
+def check_slow_query(sql, params, seconds):
+    if SLOW_QUERY_MS <= 0 or seconds * 1000 < SLOW_QUERY_MS:
+        return
+
+    normalized = normalize_sql(sql)
+    logger.warning("慢查詢 %.1fms: %s | params=%s", seconds * 1000, normalized,
+                   _loggable_params(normalized, params))
+
+    if not SLOW_QUERY_EXPLAIN or not normalized.upper().startswith(EXPLAINABLE):
+        return
+
+    now = time.monotonic()
+    with _explained_lock:
+        if now - _explained_at.get(normalized, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+            return
+        _explained_at[normalized] = now
+
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode("utf-8", "replace")
+    # 背景執行，不拖慢目前的請求
+    threading.Thread(target=_explain, args=(sql, params, normalized), daemon=True).start()
+
+
+# ✅ 宣告某個 API 最多可以下幾次 SQL
+def query_budget(limit):
+    def decorator(fn):
+        fn.query_budget = limit
+        return fn
+    return decorator
+
+
+def _check_budget(response):
+    stats = g.get("db_stats")
+    view = current_app.view_functions.get(request.endpoint)
+    limit = getattr(view, "query_budget", None)
+    if stats is None or limit is None or stats.queries <= limit:
+        return response
+
+    message = f"{request.endpoint} 執行了 {stats.queries} 次 SQL，超過預算 {limit} 次"
+    if QUERY_BUDGET_MODE == "raise" or current_app.config.get("QUERY_BUDGET_STRICT"):
+        raise QueryBudgetExceeded(message)
+    logger.warning("⚠️ %s (%s)", message, request.path)
+    return response
+
+
+def init_app(app):
+    if QUERY_BUDGET_MODE != "off":
+        app.after_request(_check_budget)
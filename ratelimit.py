@@ -0,0 +1,151 @@
+# ✅ 限流 + 過載保護
+#
+# 限流（flask-limiter）：每個使用者 / 每個 IP 各自計數，計數放在 /dev/shm 的共用檔案（shm.py），
+# 所有 gunicorn worker 看到的是同一份，不用另外架 Redis。
+#   RATELIMIT_ENABLED        設成 0 關閉限流（預設 1）
+#   RATELIMIT_DEFAULT        每個 IP 對所有 API 的預設上限（預設 "1200/minute"，教室 NAT 後面會有很多學生）
+#   RATELIMIT_STORAGE_URI    計數存放位置（預設 "feyndora-shm://"；也可以用 "memory://"、"redis://..."）
+#   PROXY_COUNT              前面有幾層反向代理（Nginx 算 1），設了才會用 X-Forwarded-For 判斷 IP（預設 0）
+#
+# 過載保護：DB 連線池排隊的請求超過 ADMISSION_MAX_WAITERS 時，新請求直接回 503 + Retry-After，
+# 不要讓所有請求一起排到逾時。
+#   ADMISSION_MAX_WAITERS    預設等於 DB_POOL_SIZE，設成 0 關閉
+#   ADMISSION_RETRY_AFTER    回給 client 的 Retry-After 秒數（預設 2）
+import logging
+import os
+import time
+
+from flask import jsonify, request
+
+import db
+import metrics
+import pool
+import shm
+
+try:
+    from flask_limiter import Limiter
+    from flask_limiter.errors import RateLimitExceeded
+    from limits.storage import Storage
+except ImportError:  # flask-limiter 沒裝時只有過載保護
+    Limiter = None
+
+log = logging.getLogger("feyndora.ratelimit")
+
+ENABLED = os.getenv("RATELIMIT_ENABLED", "1") == "1"
+DEFAULT_LIMIT = os.getenv("RATELIMIT_DEFAULT", "1200/minute")
+STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "feyndora-shm://")
+PROXY_COUNT = int(os.getenv("PROXY_COUNT", "0"))
+MAX_WAITERS = int(os.getenv("ADMISSION_MAX_WAITERS", str(pool.POOL_SIZE)))
+RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+
+# 不限流、不擋的路徑
+EXEMPT_ENDPOINTS = {"metrics", "static"}
+
+
+def ip_key():
+    return f"ip:{request.remote_addr or 'unknown'}"
+
+
+# 找得到 user_id（網址 / query string / JSON body）就以使用者計數，找不到退回 IP
+def user_key():
+    user_id = db.request_user_id()
+    return f"user:{user_id}" if user_id is not None else ip_key()
+
+
+if Limiter is not None:
+    # ✅ limits 的 storage：計數放在 shm.SharedCounterMap（固定視窗）
+    class SharedMemoryStorage(Storage):
+        STORAGE_SCHEME = ["feyndora-shm"]
+
+        def __init__(self, uri=None, **options):
+            super().__init__(uri, **options)
+            self._counters = None
+
+        @property
+        def counters(self):
+            # 第一次用到才打開，fork 之後每個 worker 自己 mmap
+            if self._counters is None:
+                self._counters = shm.SharedCounterMap("ratelimit")
+            return self._counters
+
+        @property
+        def base_exceptions(self):
+            return OSError
+
+        def incr(self, key, expiry, amount=1):
+            return self.counters.incr(key, expiry, amount)
+
+        def get(self, key):
+            return self.counters.get(key)[0]
+
+        def get_expiry(self, key):
+            return self.counters.get(key)[1] or time.time()
+
+        def check(self):
+            return True
+
+        def reset(self):
+            self.counters.reset()
+
+        def clear(self, key):
+            self.counters.clear(key)
+
+    limiter = Limiter(
+        key_func=ip_key,
+        storage_uri=STORAGE_URI,
+        default_limits=[DEFAULT_LIMIT] if DEFAULT_LIMIT else [],
+        strategy="fixed-window",
+        headers_enabled=True,  # 回應帶 X-RateLimit-* 與 Retry-After
+        enabled=ENABLED,
+    )
+else:
+    limiter = None
+
+
+# ✅ API 專屬的上限，寫法跟 @query_budget 一樣放在 @app.route 下面，例如 @per_user("120/minute")
+def per_user(limit):
+    if limiter is None:
+        return lambda fn: fn
+    return limiter.limit(limit, key_func=user_key)
+
+
+def per_ip(limit):
+    if limiter is None:
+        return lambda fn: fn
+    return limiter.limit(limit, key_func=ip_key)
+
+
+def _rate_limited(e):
+    metrics.record_rejected("rate_limit")
+    log.info("請求太頻繁", extra={"limit": str(e.description), "key": user_key()})
+    return jsonify({"error": "請求太頻繁，請稍後再試"}), 429
+
+
+def _admission_control():
+    if MAX_WAITERS <= 0 or request.endpoint in EXEMPT_ENDPOINTS or request.method == "OPTIONS":
+        return None
+    waiters = db.primary_pool.waiters
+    if waiters < MAX_WAITERS:
+        return None
+    metrics.record_rejected("overload")
+    log.warning("DB 連線池排隊過長，拒絕請求", extra={"waiters": waiters, "path": request.path})
+    response = jsonify({"error": "伺服器忙碌中，請稍後再試"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(RETRY_AFTER)
+    return response
+
+
+def init_app(app):
+    if PROXY_COUNT > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT, x_proto=PROXY_COUNT)
+
+    app.before_request(_admission_control)
+
+    if limiter is None:
+        log.info("沒有安裝 flask-limiter，只啟用過載保護")
+        return
+    limiter.init_app(app)
+    limiter.request_filter(lambda: request.endpoint in EXEMPT_ENDPOINTS or request.method == "OPTIONS")
+    app.register_error_handler(RateLimitExceeded, _rate_limited)
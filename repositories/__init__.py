@@ -0,0 +1,34 @@
+# ✅ 資料存取層：所有 SQL 集中在這裡，app.py 只呼叫函式
+#
+# 每個函式的第一個參數都是連線（db.get_db_connection() 拿到的），不會自己 commit，
+# 交易範圍由呼叫的 API 決定。
+
+
+def dialect(conn):
+    return getattr(conn, "dialect", "mysql")
+
+
+# ✅ 幾乎每個請求都會跑的 SQL 用 hot() 包起來（放在模組層級的常數），
+# MySQL 會改用 server-side prepared statement 執行，不用每次重新解析（statements.py）
+HOT_QUERIES = set()
+
+
+def hot(sql):
+    HOT_QUERIES.add(sql)
+    return sql
+
+
+from repositories import (  # noqa: E402
+    achievements,
+    cards,
+    chapters,
+    courses,
+    groups,
+    points,
+    rank_histogram,
+    reviews,
+    signin,
+    tasks,
+    users,
+    vr_sessions,
+)
@@ -0,0 +1,45 @@
+def owned_badges(conn, user_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT badge_name FROM Achievements WHERE user_id = %s", (user_id,))
+    owned = {row["badge_name"] for row in cursor.fetchall()}
+    cursor.close()
+    return owned
+
+
+def add_badges(conn, user_id, badge_names):
+    if not badge_names:
+        return
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO Achievements (user_id, badge_name) VALUES " + ", ".join(["(%s, %s)"] * len(badge_names)),
+        [value for badge_name in badge_names for value in (user_id, badge_name)]
+    )
+    cursor.close()
+
+
+def get_unclaimed(conn, user_id, badge_name):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT * FROM Achievements WHERE user_id = %s AND badge_name = %s AND is_claimed = FALSE
+    """, (user_id, badge_name))
+    achievement = cursor.fetchone()
+    cursor.close()
+    return achievement
+
+
+def mark_claimed(conn, user_id, badge_name):
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE Achievements SET is_claimed = TRUE, claimed_at = NOW() WHERE user_id = %s AND badge_name = %s
+    """, (user_id, badge_name))
+    cursor.close()
+
+
+def list_by_user(conn, user_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT badge_name, is_claimed FROM Achievements WHERE user_id = %s
+    """, (user_id,))
+    achievements = cursor.fetchall()
+    cursor.close()
+    return achievements
@@ -0,0 +1,215 @@
+# ✅ 資料庫後端：MySQL（正式環境）與 SQLite（內嵌，測試 / 壓測用，不需要 MySQL 伺服器）
+#
+# 兩邊提供一樣的連線介面（mysql-connector 的用法）：
+#   conn.cursor(dictionary=True) / cursor.execute(sql, params) / fetchone / fetchall / rowcount
+#   conn.commit() / conn.rollback() / conn.close() / conn.is_connected()
+# SQL 一律用 MySQL 寫法與 %s 參數；SQLite 缺的 NOW() / CURDATE() / RAND() 用自訂函式補上，
+# 真的語法不同的（upsert、INSERT IGNORE）由 repository 依 dialect 分開寫。
+import os
+import random
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+
+import mysql.connector
+from mysql.connector import Error, InterfaceError, OperationalError
+from mysql.connector.constants import ClientFlag
+
+# 跟 MySQL 連線設定的 time_zone = '+08:00' 一致
+TAIWAN = timezone(timedelta(hours=8))
+
+# DB 沒回應時最多等幾秒就放棄連線（預設 5）
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+
+class MySQLBackend:
+    dialect = "mysql"
+    errors = (Error,)
+    # 連不上、連線中斷、逾時（斷路器只算這些；語法錯誤、違反唯一索引不算 DB 掛掉）
+    unavailable_errors = (InterfaceError, OperationalError)
+    # 死結（1213）、等鎖逾時（1205）：交易已經被 MySQL 放棄或可以整個重來
+    retryable_errnos = {1213: "deadlock", 1205: "lock_timeout"}
+
+    def __init__(self, config):
+        self.config = config
+
+    # ✅ 可以整個交易重來的錯誤回傳原因（給 metrics 用），其他回傳 None
+    def retry_reason(self, error):
+        return self.retryable_errnos.get(getattr(error, "errno", None))
+
+    def connect(self):
+        # FOUND_ROWS：UPDATE 的 rowcount 回傳「符合條件」的筆數而不是「有變動」的筆數，跟 SQLite 一致
+        # buffered：結果一次讀完，同一條連線可以接著下一句 SQL，不會遇到 Unread result found
+        conn = mysql.connector.connect(**self.config, charset='utf8mb4', buffered=True,
+                                       client_flags=[ClientFlag.FOUND_ROWS],
+                                       connection_timeout=CONNECT_TIMEOUT)
+        cursor = conn.cursor()
+        # 設置數據庫時間為台灣時區
+        cursor.execute("SET time_zone = '+08:00'")
+        cursor.close()
+        return conn
+
+
+# ✅ SQLite：讓 sqlite3 看起來跟 mysql-connector 一樣
+def _adapt_datetime(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(TAIWAN).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _convert_datetime(raw):
+    text = raw.decode()
+    try:
+        return datetime.strptime(text[:19], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return datetime.strptime(text[:10], "%Y-%m-%d")
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()[:10]))
+
+
+def _taiwan_now():
+    return datetime.now(TAIWAN).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _taiwan_today():
+    return datetime.now(TAIWAN).date().isoformat()
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+# ✅ 資料庫檔案打不開、磁碟讀寫失敗：跟 MySQL 連不上一樣算 DB 掛掉（斷路器 / 503 只看這個）
+# 其他 OperationalError（database is locked、no such table、語法錯誤）維持原本的型別：
+# locked 交給 transactions.run 重試，其餘照一般錯誤回 500
+class SQLiteUnavailable(sqlite3.OperationalError):
+    pass
+
+
+UNAVAILABLE_MESSAGES = ("unable to open database file", "disk I/O error")
+
+
+def _raise_unavailable(error):
+    if any(message in str(error) for message in UNAVAILABLE_MESSAGES):
+        raise SQLiteUnavailable(*error.args) from error
+    raise error
+
+
+class SQLiteCursor:
+    dialect = "sqlite"
+
+    def __init__(self, cursor, dictionary):
+        self._cursor = cursor
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def execute(self, operation, params=None):
+        try:
+            self._cursor.execute(operation.replace("%s", "?"), tuple(params or ()))
+        except sqlite3.OperationalError as e:
+            _raise_unavailable(e)
+        return None
+
+    def executemany(self, operation, seq_of_params):
+        try:
+            self._cursor.executemany(operation.replace("%s", "?"), [tuple(p) for p in seq_of_params])
+        except sqlite3.OperationalError as e:
+            _raise_unavailable(e)
+        return None
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    dialect = "sqlite"
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._closed = False
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._conn.cursor(), dictionary)
+
+    def commit(self):
+        try:
+            self._conn.commit()
+        except sqlite3.OperationalError as e:
+            _raise_unavailable(e)
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        if not self._closed:
+            self._conn.close()
+            self._closed = True
+
+    def is_connected(self):
+        return not self._closed
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+
+class SQLiteBackend:
+    dialect = "sqlite"
+    errors = (sqlite3.Error,)
+    unavailable_errors = (SQLiteUnavailable,)
+
+    def __init__(self, path):
+        self.path = path
+
+    # 其他連線正在寫入、等了 timeout 秒還是拿不到寫入鎖
+    def retry_reason(self, error):
+        if isinstance(error, sqlite3.OperationalError) and "locked" in str(error):
+            return "busy"
+        return None
+
+    def connect(self):
+        # 連線會放進連線池給不同執行緒輪流使用（同一時間只有一個執行緒在用）
+        try:
+            conn = sqlite3.connect(self.path, timeout=5, detect_types=sqlite3.PARSE_DECLTYPES,
+                                   uri=self.path.startswith("file:"), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+        except sqlite3.OperationalError as e:
+            _raise_unavailable(e)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.create_function("NOW", 0, _taiwan_now)
+        conn.create_function("CURDATE", 0, _taiwan_today)
+        conn.create_function("RAND", 0, random.random)
+        return SQLiteConnection(conn)
+
+
+def create_backend(name, mysql_config, sqlite_path):
+    if name == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    if name == "mysql":
+        return MySQLBackend(mysql_config)
+    raise ValueError(f"不支援的 DB_BACKEND: {name}")
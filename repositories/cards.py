@@ -0,0 +1,85 @@
+from repositories import dialect, hot
+
+COUNT_OWNED_SQL = hot("""
+    SELECT COUNT(*) as count 
+    FROM UserCards 
+    WHERE user_id = %s AND card_id = %s
+""")
+USER_CARDS_SQL = hot("""
+    SELECT C.card_id, C.name, C.rarity, UC.is_selected
+    FROM Cards C
+    JOIN UserCards UC ON C.card_id = UC.card_id
+    WHERE UC.user_id = %s
+""")
+
+
+def random_card(conn, rarity):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT card_id, name, rarity 
+        FROM Cards 
+        WHERE rarity = %s 
+        ORDER BY RAND() 
+        LIMIT 1
+    """, (rarity,))
+    card = cursor.fetchone()
+    cursor.close()
+    return card
+
+
+def count_owned(conn, user_id, card_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(COUNT_OWNED_SQL, (user_id, card_id))
+    count = cursor.fetchone()['count']
+    cursor.close()
+    return count
+
+
+def grant(conn, user_id, card_id, obtained_at):
+    cursor = conn.cursor()
+    if dialect(conn) == "sqlite":
+        cursor.execute("""
+            INSERT INTO UserCards (user_id, card_id, obtained_date)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (user_id, card_id) DO UPDATE SET obtained_date = excluded.obtained_date
+        """, (user_id, card_id, obtained_at))
+    else:
+        cursor.execute("""
+            INSERT INTO UserCards (user_id, card_id, obtained_date)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE obtained_date = %s
+        """, (user_id, card_id, obtained_at, obtained_at))
+    cursor.close()
+
+
+def list_all(conn):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT card_id, name, rarity FROM Cards ORDER BY card_id")
+    catalog = cursor.fetchall()
+    cursor.close()
+    return catalog
+
+
+def list_user_cards(conn, user_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(USER_CARDS_SQL, (user_id,))
+    cards = cursor.fetchall()
+    cursor.close()
+    return cards
+
+
+def select_teacher_card(conn, user_id, card_id):
+    cursor = conn.cursor()
+    # 先将该用户所有卡片设置为未选中
+    cursor.execute("""
+        UPDATE UserCards 
+        SET is_selected = 0
+        WHERE user_id = %s
+    """, (user_id,))
+    # 将选中的卡片设置为已选中
+    cursor.execute("""
+        UPDATE UserCards 
+        SET is_selected = 1
+        WHERE user_id = %s AND card_id = %s
+    """, (user_id, card_id))
+    cursor.close()
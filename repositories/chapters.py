@@ -0,0 +1,41 @@
+from repositories import hot
+
+PROGRESS_SQL = hot("""
+    SELECT COUNT(*) as total, 
+           SUM(is_completed) as completed
+    FROM CourseChapters
+    WHERE course_id = %s AND chapter_type = %s
+""")
+PROGRESS_BY_TYPE_SQL = hot("""
+    SELECT chapter_type, COUNT(*) as total, SUM(is_completed) as completed
+    FROM CourseChapters
+    WHERE course_id = %s
+    GROUP BY chapter_type
+""")
+
+
+def progress(conn, course_id, chapter_type):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(PROGRESS_SQL, (course_id, chapter_type))
+    result = cursor.fetchone()
+    cursor.close()
+    return result
+
+
+# ✅ 一次算出各種章節（one_to_one / classroom）的總數與完成數
+def progress_by_type(conn, course_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(PROGRESS_BY_TYPE_SQL, (course_id,))
+    rows = cursor.fetchall()
+    cursor.close()
+    return {row["chapter_type"]: row for row in rows}
+
+
+def complete_all(conn, course_id):
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE CourseChapters 
+        SET is_completed = 1
+        WHERE course_id = %s
+    """, (course_id,))
+    cursor.close()
@@ -0,0 +1,161 @@
+from repositories import dialect, hot
+
+GET_OWNER_SQL = hot("""
+    SELECT course_id, user_id, course_name 
+    FROM Courses 
+    WHERE course_id = %s
+""")
+COUNT_BY_USER_SQL = hot("SELECT COUNT(*) AS count FROM Courses WHERE user_id=%s")
+GET_LATEST_SQL = hot("""
+    SELECT course_id, course_name, current_stage, progress, 
+           progress_one_to_one, progress_classroom
+    FROM Courses
+    WHERE user_id = %s
+    ORDER BY updated_at DESC
+    LIMIT 1
+""")
+
+
+def _fetchone(conn, sql, params):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+
+def _fetchall(conn, sql, params):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def _execute(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rowcount = cursor.rowcount
+    cursor.close()
+    return rowcount
+
+
+def get_owner(conn, course_id):
+    return _fetchone(conn, GET_OWNER_SQL, (course_id,))
+
+
+def count_by_user(conn, user_id):
+    return _fetchone(conn, COUNT_BY_USER_SQL, (user_id,))["count"]
+
+
+# ✅ 課程數與完成數一次查完（成就檢查用）
+def stats_by_user(conn, user_id):
+    return _fetchone(conn, """
+        SELECT COUNT(*) AS course_count, COALESCE(SUM(progress = 100), 0) AS completed_courses
+        FROM Courses WHERE user_id=%s
+    """, (user_id,))
+
+
+def count_completed_since(conn, user_id, since):
+    return _fetchone(conn, """
+        SELECT COUNT(*) AS completed_courses FROM Courses
+        WHERE user_id = %s AND progress = 100 AND updated_at >= %s
+    """, (user_id, since))["completed_courses"]
+
+
+def get_latest(conn, user_id):
+    return _fetchone(conn, GET_LATEST_SQL, (user_id,))
+
+
+def list_by_user(conn, user_id):
+    return _fetchall(conn, "SELECT * FROM Courses WHERE user_id=%s ORDER BY created_at DESC", (user_id,))
+
+
+def search(conn, user_id, keyword):
+    return _fetchall(conn, """
+        SELECT * FROM Courses WHERE user_id=%s AND course_name LIKE %s ORDER BY created_at DESC
+    """, (user_id, f"%{keyword}%"))
+
+
+def create(conn, user_id, course_name, file_type):
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO Courses (user_id, course_name, progress, progress_one_to_one, progress_classroom, current_stage, is_favorite, is_vr_ready, file_type, created_at)
+        VALUES (%s, %s, 0, 0, 0, 'one_to_one', FALSE, 0, %s, NOW())
+    """, (user_id, course_name, file_type))
+    course_id = cursor.lastrowid
+    cursor.close()
+    return course_id
+
+
+def delete(conn, course_id):
+    return _execute(conn, "DELETE FROM Courses WHERE course_id=%s", (course_id,))
+
+
+def toggle_favorite(conn, course_id):
+    return _execute(conn, "UPDATE Courses SET is_favorite = NOT is_favorite WHERE course_id=%s", (course_id,))
+
+
+# ✅ VR 回報進度（同時結束 VR Ready 狀態）
+def update_progress(conn, course_id, progress, progress_one_to_one, progress_classroom, current_stage):
+    return _execute(conn, """
+        UPDATE Courses
+        SET progress = %s, 
+            progress_one_to_one = %s, 
+            progress_classroom = %s, 
+            current_stage = %s, 
+            is_vr_ready = 0, 
+            updated_at = NOW()
+        WHERE course_id = %s
+    """, (progress, progress_one_to_one, progress_classroom, current_stage, course_id))
+
+
+# current_stage 重新計算後寫回
+def update_stage_progress(conn, course_id, progress, progress_one_to_one, progress_classroom, current_stage):
+    return _execute(conn, """
+        UPDATE Courses
+        SET progress = %s, progress_one_to_one = %s, progress_classroom = %s, current_stage = %s
+        WHERE course_id = %s
+    """, (progress, progress_one_to_one, progress_classroom, current_stage, course_id))
+
+
+def mark_finished(conn, course_id):
+    return _execute(conn, """
+        UPDATE Courses 
+        SET current_stage = 'completed',
+            progress = 100,
+            progress_one_to_one = 100,
+            progress_classroom = 100,
+            is_vr_ready = 0,
+            updated_at = NOW()
+        WHERE course_id = %s
+    """, (course_id,))
+
+
+def mark_vr_ready(conn, course_id, started_at):
+    return _execute(conn, """
+        UPDATE Courses
+        SET is_vr_ready = TRUE, 
+            vr_started_at = %s
+        WHERE course_id = %s
+    """, (started_at, course_id))
+
+
+# ✅ 收藏的 pre 課程（SavedCourses）
+def save(conn, user_id, course_name):
+    if dialect(conn) == "sqlite":
+        sql = "INSERT OR IGNORE INTO SavedCourses (user_id, course_name) VALUES (%s, %s)"
+    else:
+        sql = "INSERT IGNORE INTO SavedCourses (user_id, course_name) VALUES (%s, %s)"
+    return _execute(conn, sql, (user_id, course_name))
+
+
+def list_saved(conn, user_id):
+    rows = _fetchall(conn, "SELECT course_name FROM SavedCourses WHERE user_id = %s", (user_id,))
+    return [row["course_name"] for row in rows]
+
+
+def remove_saved(conn, user_id, course_name):
+    return _execute(conn, """
+        DELETE FROM SavedCourses WHERE user_id = %s AND course_name = %s
+    """, (user_id, course_name))
@@ -0,0 +1,169 @@
+from datetime import date
+
+from repositories import dialect, hot
+
+# ✅ 班級 / 小組排行榜
+# GroupMemberPoints 存每個小組成員在每天 / 每週 / 生涯的點數，/update_learning_points 一句累加到他所屬的所有小組，
+# 排行榜只讀 (group_id, board, period_start, points) 索引的前幾筆，跟小組數量、總人數都無關。
+# 加入小組時用他當天、當週的點數和生涯總積分起算（更早的日 / 週排行榜不會有他）。
+BOARDS = ("daily", "weekly", "all")
+ALL_TIME = date(1970, 1, 1)  # 生涯排行榜沒有期間，period_start 固定用這天
+
+# 每個小組 × 三種排行榜
+_PERIODS = """
+    SELECT 'daily' AS board, %s AS period_start UNION ALL
+    SELECT 'weekly', %s UNION ALL
+    SELECT 'all', %s
+"""
+ADD_POINTS_SQL = hot(f"""
+    INSERT INTO GroupMemberPoints (group_id, board, period_start, user_id, points)
+    SELECT m.group_id, b.board, b.period_start, m.user_id, %s
+    FROM GroupMembers m CROSS JOIN ({_PERIODS}) b
+    WHERE m.user_id = %s
+    ON DUPLICATE KEY UPDATE points = points + VALUES(points)
+""")
+TOP_SQL = hot("""
+    SELECT user_id, points FROM GroupMemberPoints
+    WHERE group_id = %s AND board = %s AND period_start = %s
+    ORDER BY points DESC, user_id
+    LIMIT %s
+""")
+# 名次 = 1 + 小組裡比自己高分的人數（跟 RANK() 一樣），用排行榜索引數
+MEMBER_RANK_SQL = hot("""
+    SELECT p.user_id, p.points,
+           (SELECT COUNT(*) FROM GroupMemberPoints h
+            WHERE h.group_id = p.group_id AND h.board = p.board AND h.period_start = p.period_start
+              AND h.points > p.points) + 1 AS ranking
+    FROM GroupMemberPoints p
+    WHERE p.group_id = %s AND p.board = %s AND p.period_start = %s AND p.user_id = %s
+""")
+GET_SQL = hot("""
+    SELECT g.group_id, g.name, g.owner_user_id, g.created_at,
+           (SELECT COUNT(*) FROM GroupMembers m WHERE m.group_id = g.group_id) AS members
+    FROM StudyGroups g WHERE g.group_id = %s
+""")
+USER_GROUPS_SQL = hot("""
+    SELECT g.group_id, g.name, g.owner_user_id
+    FROM GroupMembers m
+    JOIN StudyGroups g ON g.group_id = m.group_id
+    WHERE m.user_id = %s
+    ORDER BY g.group_id
+""")
+
+
+def period_start(board, day, week_start):
+    return {"daily": day, "weekly": week_start, "all": ALL_TIME}[board]
+
+
+def create(conn, name, owner_user_id, created_at):
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO StudyGroups (name, owner_user_id, created_at) VALUES (%s, %s, %s)",
+                   (name, owner_user_id, created_at))
+    group_id = cursor.lastrowid
+    cursor.close()
+    return group_id
+
+
+def get(conn, group_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(GET_SQL, (group_id,))
+    group = cursor.fetchone()
+    cursor.close()
+    return group
+
+
+def delete(conn, group_id):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM StudyGroups WHERE group_id = %s", (group_id,))
+    deleted = cursor.rowcount
+    cursor.close()
+    return deleted
+
+
+def user_groups(conn, user_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(USER_GROUPS_SQL, (user_id,))
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+# ✅ 加入成員並用他們目前的點數起算（已經是成員的重新對一次帳）；呼叫前要先鎖住這些使用者（users.lock_many），
+# 跟 /update_learning_points 排隊，點數才不會算兩次或漏掉
+def add_members(conn, group_id, user_ids, day, week_start, week_end, joined_at):
+    if not user_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    ignore = "OR IGNORE" if dialect(conn) == "sqlite" else "IGNORE"
+    cursor = conn.cursor()
+    cursor.executemany(f"INSERT {ignore} INTO GroupMembers (group_id, user_id, joined_at) VALUES (%s, %s, %s)",
+                       [(group_id, user_id, joined_at) for user_id in user_ids])
+    if dialect(conn) == "sqlite":
+        conflict = ("ON CONFLICT (group_id, board, period_start, user_id) "
+                    "DO UPDATE SET points = excluded.points")
+    else:
+        conflict = "ON DUPLICATE KEY UPDATE points = VALUES(points)"
+    # WHERE TRUE：SQLite 的 INSERT ... SELECT 後面接 ON CONFLICT 時需要
+    cursor.execute(f"""
+        INSERT INTO GroupMemberPoints (group_id, board, period_start, user_id, points)
+        SELECT * FROM (
+            SELECT %s AS group_id, 'daily' AS board, %s AS period_start, user_id, daily_points AS points
+            FROM LearningPointsLog WHERE date = %s AND user_id IN ({placeholders})
+            UNION ALL
+            SELECT %s, 'weekly', %s, user_id, SUM(daily_points)
+            FROM LearningPointsLog WHERE date BETWEEN %s AND %s AND user_id IN ({placeholders})
+            GROUP BY user_id
+            UNION ALL
+            SELECT %s, 'all', %s, user_id, total_learning_points
+            FROM Users WHERE user_id IN ({placeholders})
+        ) seed WHERE TRUE
+        {conflict}
+    """, (group_id, day, day, *user_ids,
+          group_id, week_start, week_start, week_end, *user_ids,
+          group_id, ALL_TIME, *user_ids))
+    cursor.close()
+
+
+# 移除成員，他在這個小組的點數由外鍵一起刪掉
+def remove_member(conn, group_id, user_id):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM GroupMembers WHERE group_id = %s AND user_id = %s", (group_id, user_id))
+    removed = cursor.rowcount
+    cursor.close()
+    return removed
+
+
+# ✅ /update_learning_points：累加到這個人所屬的每個小組的日 / 週 / 生涯點數（沒有加入小組時只是一次索引查詢）
+def add_points(conn, user_id, day, week_start, points):
+    cursor = conn.cursor()
+    if dialect(conn) == "sqlite":
+        cursor.execute(f"""
+            INSERT INTO GroupMemberPoints (group_id, board, period_start, user_id, points)
+            SELECT m.group_id, b.board, b.period_start, m.user_id, %s
+            FROM GroupMembers m CROSS JOIN ({_PERIODS}) b
+            WHERE m.user_id = %s
+            ON CONFLICT (group_id, board, period_start, user_id) DO UPDATE SET points = points + excluded.points
+        """, (points, day, week_start, ALL_TIME, user_id))
+    else:
+        cursor.execute(ADD_POINTS_SQL, (points, day, week_start, ALL_TIME, user_id))
+    cursor.close()
+
+
+# ✅ 小組前 N 名，名次依 RANK() 規則（同分同名次）
+def top(conn, group_id, board, start, limit=10):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(TOP_SQL, (group_id, board, start, limit))
+    rows = cursor.fetchall()
+    cursor.close()
+    for index, row in enumerate(rows):
+        same = index > 0 and row["points"] == rows[index - 1]["points"]
+        row["ranking"] = rows[index - 1]["ranking"] if same else index + 1
+    return rows
+
+
+def member_rank(conn, group_id, board, start, user_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(MEMBER_RANK_SQL, (group_id, board, start, user_id))
+    row = cursor.fetchone()
+    cursor.close()
+    return row
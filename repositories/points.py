@@ -0,0 +1,87 @@
+from repositories import dialect, hot
+
+# 排行榜：先依使用者加總，再用 RANK() 排名
+# 只查 LearningPointsLog，使用者名稱、頭像由 app 從使用者快取補上（user_cache.attach_profiles）
+RANKING_SQL = """
+    SELECT t.user_id, t.{alias}, t.ranking
+    FROM (
+        SELECT L.user_id,
+               SUM(L.daily_points) AS {alias},
+               RANK() OVER (ORDER BY SUM(L.daily_points) DESC) AS ranking
+        FROM LearningPointsLog L
+        WHERE {where}
+        GROUP BY L.user_id
+    ) t
+"""
+DAILY_TOP_SQL = hot(RANKING_SQL.format(alias="daily_points", where="L.date = %s") + " ORDER BY t.ranking LIMIT %s")
+DAILY_USER_SQL = hot(RANKING_SQL.format(alias="daily_points", where="L.date = %s") + " WHERE t.user_id = %s")
+WEEKLY_TOP_SQL = hot(RANKING_SQL.format(alias="weekly_points", where="L.date BETWEEN %s AND %s") + " ORDER BY t.ranking LIMIT %s")
+WEEKLY_USER_SQL = hot(RANKING_SQL.format(alias="weekly_points", where="L.date BETWEEN %s AND %s") + " WHERE t.user_id = %s")
+
+ADD_DAILY_POINTS_SQL = hot("""
+    INSERT INTO LearningPointsLog (user_id, date, daily_points) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE daily_points = daily_points + VALUES(daily_points)
+""")
+POINTS_BETWEEN_SQL = hot("""
+    SELECT date, daily_points 
+    FROM LearningPointsLog
+    WHERE user_id = %s AND date BETWEEN %s AND %s
+""")
+SUM_SINCE_SQL = hot("""
+    SELECT COALESCE(SUM(daily_points), 0) AS weekly_points FROM LearningPointsLog
+    WHERE user_id = %s AND date >= %s
+""")
+
+
+def _fetchall(conn, sql, params):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def _fetchone(conn, sql, params):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+
+def daily_top(conn, day, limit=10):
+    return _fetchall(conn, DAILY_TOP_SQL, (day, limit))
+
+
+def daily_user_rank(conn, day, user_id):
+    return _fetchone(conn, DAILY_USER_SQL, (day, user_id))
+
+
+def weekly_top(conn, start, end, limit=10):
+    return _fetchall(conn, WEEKLY_TOP_SQL, (start, end, limit))
+
+
+def weekly_user_rank(conn, start, end, user_id):
+    return _fetchone(conn, WEEKLY_USER_SQL, (start, end, user_id))
+
+
+# ✅ 當天點數累加：靠 (user_id, date) 唯一索引一句 upsert，不用先查再決定 INSERT / UPDATE
+def add_daily_points(conn, user_id, day, points):
+    cursor = conn.cursor()
+    if dialect(conn) == "sqlite":
+        cursor.execute("""
+            INSERT INTO LearningPointsLog (user_id, date, daily_points) VALUES (%s, %s, %s)
+            ON CONFLICT (user_id, date) DO UPDATE SET daily_points = daily_points + excluded.daily_points
+        """, (user_id, day, points))
+    else:
+        cursor.execute(ADD_DAILY_POINTS_SQL, (user_id, day, points))
+    cursor.close()
+
+
+def points_between(conn, user_id, start, end):
+    return _fetchall(conn, POINTS_BETWEEN_SQL, (user_id, start, end))
+
+
+def sum_since(conn, user_id, since):
+    row = _fetchone(conn, SUM_SINCE_SQL, (user_id, since))
+    return row["weekly_points"]
@@ -0,0 +1,129 @@
+import math
+
+from repositories import dialect, hot
+
+# ✅ 排行榜的點數分布（每天 / 每週一份），估算前10名以外的名次用，不用對所有人排名
+#
+# 每個 bucket 記「點數落在這個範圍的人數」：0~15 分每分一格，之後每個 2 的次方切成 16 格
+# （例如 512~543、544~575 ...），格子寬度最多是點數的 1/16，一份分布最多幾百格。
+# 名次 = 1 + 比自己高分的人數（跟 RANK() 一樣），同一格裡的人分不出高低，
+# 所以估計值的誤差最多是「同一格的人數 - 1」，回傳時一起給 rank_min / rank_max。
+SUB_BITS = 4
+SUB = 1 << SUB_BITS
+
+SCORE_SQL = hot("""
+    SELECT SUM(daily_points) AS score FROM LearningPointsLog
+    WHERE user_id = %s AND date BETWEEN %s AND %s
+""")
+USER_SCORES_SQL = hot("""
+    SELECT COALESCE(SUM(CASE WHEN date = %s THEN daily_points ELSE 0 END), 0) AS daily_points,
+           COALESCE(SUM(daily_points), 0) AS weekly_points
+    FROM LearningPointsLog
+    WHERE user_id = %s AND date BETWEEN %s AND %s
+""")
+HISTOGRAM_SQL = hot("SELECT bucket, users FROM LeaderboardHistogram WHERE board = %s AND period_start = %s")
+
+
+def bucket(score):
+    if score < SUB:
+        return max(0, score)
+    shift = score.bit_length() - 1 - SUB_BITS
+    return (shift + 1) * SUB + (score >> shift) - SUB
+
+
+# 這一格的點數範圍 (最低, 最高)
+def bounds(index):
+    if index < SUB:
+        return index, index
+    shift = index // SUB - 1
+    low = (SUB + index % SUB) << shift
+    return low, low + (1 << shift) - 1
+
+
+# 點數從 old 變成 new 時要調整的格子；0 分不算進分布（排名只看比自己高分的人，0 分的人不影響別人）
+def moves(board, period_start, old, new):
+    old_bucket = bucket(old) if old > 0 else None
+    new_bucket = bucket(new) if new > 0 else None
+    if old_bucket == new_bucket:
+        return []
+    changes = []
+    if old_bucket is not None:
+        changes.append((board, period_start, old_bucket, -1))
+    if new_bucket is not None:
+        changes.append((board, period_start, new_bucket, 1))
+    return changes
+
+
+# 這個使用者當天和當週（週一開始）的點數，一句查完
+def user_scores(conn, user_id, day, week_start, week_end):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(USER_SCORES_SQL, (day, user_id, week_start, week_end))
+    row = cursor.fetchone()
+    cursor.close()
+    return int(row["daily_points"]), int(row["weekly_points"])
+
+
+# ✅ 一句 upsert 調整所有格子；依主鍵排序，同時有很多人加分也不會互相死結
+def apply(conn, changes):
+    if not changes:
+        return
+    changes = sorted(changes)
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(changes))
+    params = [value for change in changes for value in change]
+    cursor = conn.cursor()
+    if dialect(conn) == "sqlite":
+        cursor.execute(f"""
+            INSERT INTO LeaderboardHistogram (board, period_start, bucket, users) VALUES {values}
+            ON CONFLICT (board, period_start, bucket) DO UPDATE SET users = users + excluded.users
+        """, params)
+    else:
+        cursor.execute(f"""
+            INSERT INTO LeaderboardHistogram (board, period_start, bucket, users) VALUES {values}
+            ON DUPLICATE KEY UPDATE users = users + VALUES(users)
+        """, params)
+    cursor.close()
+
+
+# ✅ 加完點數後（同一個交易裡）更新日 / 週分布；點數沒有跨格就只多一次查詢
+def record(conn, user_id, day, week_start, week_end, added):
+    daily, weekly = user_scores(conn, user_id, day, week_start, week_end)
+    apply(conn, moves("daily", day, daily - added, daily) + moves("weekly", week_start, weekly - added, weekly))
+
+
+# 刪除帳號前把他從當天 / 當週的分布拿掉
+def forget(conn, user_id, day, week_start, week_end):
+    daily, weekly = user_scores(conn, user_id, day, week_start, week_end)
+    apply(conn, moves("daily", day, daily, 0) + moves("weekly", week_start, weekly, 0))
+
+
+# 期間內的點數，這段期間沒有紀錄回傳 None
+def score(conn, user_id, start, end):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(SCORE_SQL, (user_id, start, end))
+    row = cursor.fetchone()
+    cursor.close()
+    return None if row["score"] is None else int(row["score"])
+
+
+# ✅ 用分布估算名次（查詢量跟人數無關）：回傳 ranking（估計值）、rank_min / rank_max（一定在這之間）、
+# total（這段期間有點數的人數）、top_percent（前百分之幾）
+def estimate(conn, board, period_start, points):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(HISTOGRAM_SQL, (board, period_start))
+    counts = {row["bucket"]: max(0, row["users"]) for row in cursor.fetchall()}
+    cursor.close()
+
+    total = sum(counts.values())
+    if points <= 0:
+        rank_min = rank_max = ranking = total + 1
+    else:
+        mine = bucket(points)
+        above = sum(users for index, users in counts.items() if index > mine)
+        same = max(1, counts.get(mine, 0))
+        low, high = bounds(mine)
+        # 假設同一格裡的點數平均分布
+        ranking = above + 1 + round((same - 1) * (high - points) / (high - low + 1))
+        rank_min, rank_max = above + 1, above + same
+    total = max(total, rank_max)
+    return {"ranking": ranking, "rank_min": rank_min, "rank_max": rank_max, "total": total,
+            "top_percent": math.ceil(ranking / total * 1000) / 10}
@@ -0,0 +1,85 @@
+import json
+
+# 沒有評價資料時使用的預設評價
+DEFAULT_REVIEW = {
+    "accuracy_score": 50,
+    "understanding_score": 50,
+    "expression_score": 50,
+    "interaction_score": 50,
+    "teacher_comment": "今天的表现非常出色，特别是在概念解释方面有明显进步。你对核心理论的掌握度很高，建议下次可以多举一些生活中的例子，让概念更容易理解。",
+    "student1_feedback": "你把复杂的概念讲得很清楚！尤其是在解释那个难懂的部分时，用了很好的比喻，让我一下就理解了。",
+    "student2_feedback": "我觉得你的逻辑思维很清晰，解题过程也很有条理。如果能多分享一些实际应用的场景就更好了。",
+    "student3_feedback": "你提出的观点很有创意！让我看到这个理论的新角度。期待下次能听到更多你的想法。",
+    "good_points": json.dumps(["概念解释清晰准确", "举例生动有趣", "与同学互动热络"]),
+    "improvement_points": json.dumps(["可以多分享实际应用场景", "建议控制节奏，不要说太快"])
+}
+
+# 沒有積分紀錄時回傳的預設積分
+DEFAULT_EARNED_POINTS = 156
+
+
+REVIEW_FIELDS = ["accuracy_score", "understanding_score", "expression_score", "interaction_score",
+                 "teacher_comment", "student1_feedback", "student2_feedback", "student3_feedback",
+                 "good_points", "improvement_points"]
+
+
+# ✅ 課程擁有者 + 評價一次查完，回傳 {course_id: row}；課程不存在就不會出現，沒有評價時 review_id 是 None
+def get_with_owner(conn, course_ids):
+    placeholders = ", ".join(["%s"] * len(course_ids))
+    columns = ", ".join(f"R.{field}" for field in REVIEW_FIELDS)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT C.course_id, C.user_id, C.course_name, R.review_id, {columns}
+        FROM Courses C
+        LEFT JOIN CourseReviews R ON R.course_id = C.course_id AND R.user_id = C.user_id
+        WHERE C.course_id IN ({placeholders})
+        ORDER BY C.course_id, R.review_id
+    """, tuple(course_ids))
+    rows = cursor.fetchall()
+    cursor.close()
+    found = {}
+    for row in rows:
+        # 同一門課有多筆評價時用最早的那筆
+        found.setdefault(row["course_id"], row)
+    return found
+
+
+# ✅ 還沒有評價才建立預設評價（同一個 SQL 裡檢查，重複呼叫不會多出一筆），回傳是否有新增
+def create_default_if_missing(conn, course_id):
+    review = DEFAULT_REVIEW
+    columns = ", ".join(REVIEW_FIELDS)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO CourseReviews (course_id, user_id, {columns})
+        SELECT C.course_id, C.user_id, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+        FROM Courses C
+        WHERE C.course_id = %s
+          AND NOT EXISTS (
+              SELECT 1 FROM CourseReviews R
+              WHERE R.course_id = C.course_id AND R.user_id = C.user_id
+          )
+    """, tuple(review[field] for field in REVIEW_FIELDS) + (course_id,))
+    created = cursor.rowcount > 0
+    cursor.close()
+    return created
+
+
+# ✅ 多門課的積分一次查完，回傳 {course_id: earned_points}（沒有紀錄的用預設積分）
+def earned_points_by_course(conn, course_ids):
+    placeholders = ", ".join(["%s"] * len(course_ids))
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT course_id, earned_points
+        FROM CoursePointsLog
+        WHERE course_id IN ({placeholders})
+        ORDER BY course_id, log_id
+    """, tuple(course_ids))
+    rows = cursor.fetchall()
+    cursor.close()
+    earned = {course_id: DEFAULT_EARNED_POINTS for course_id in course_ids}
+    seen = set()
+    for row in rows:
+        if row["course_id"] not in seen:
+            seen.add(row["course_id"])
+            earned[row["course_id"]] = row["earned_points"]
+    return earned
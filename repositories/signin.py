@@ -0,0 +1,70 @@
+from repositories import dialect, hot, users
+
+# 簽到獎勵（依簽到第幾天），放在記憶體裡，不用每次查表
+REWARDS = {
+    1: {"coins": 100, "diamonds": 0},
+    2: {"coins": 300, "diamonds": 0},
+    3: {"coins": 500, "diamonds": 0},
+    4: {"coins": 1000, "diamonds": 0},
+    5: {"coins": 0, "diamonds": 1},
+    6: {"coins": 0, "diamonds": 3},
+    7: {"coins": 500, "diamonds": 5},
+}
+NO_REWARD = {"coins": 0, "diamonds": 0}
+
+GET_RECORD_SQL = hot("SELECT signin_day, last_signin_date, weekly_streak FROM SigninRecords WHERE user_id = %s")
+CLAIM_SQL = hot("""
+    UPDATE SigninRecords S
+    JOIN Users U ON U.user_id = S.user_id
+    SET S.signin_day = %s, S.last_signin_date = %s, S.weekly_streak = %s,
+        U.total_signin_days = U.total_signin_days + 1,
+        U.coins = U.coins + %s, U.diamonds = U.diamonds + %s
+    WHERE S.user_id = %s AND S.signin_day = %s
+      AND (S.last_signin_date IS NULL OR S.last_signin_date < %s)
+""")
+
+
+def get_record(conn, user_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(GET_RECORD_SQL, (user_id,))
+    record = cursor.fetchone()
+    cursor.close()
+    return record
+
+
+def get_streak(conn, user_id):
+    record = get_record(conn, user_id)
+    return record["weekly_streak"] if record else 0
+
+
+def create(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO SigninRecords (user_id, signin_day, has_claimed_today, last_signin_date) 
+        VALUES (%s, 1, FALSE, NULL)
+    """, (user_id,))
+    cursor.close()
+
+
+# ✅ 領取簽到獎勵：有條件的更新，只有「今天還沒領過、簽到天數還是剛剛讀到的值」才會成功，
+# 成功時同一個交易裡直接把獎勵加到 Users（不用再讀一次）；連點兩下只有一次會成功。回傳是否領取成功
+def claim(conn, user_id, signin_day, next_signin_day, today, weekly_streak, coins, diamonds):
+    cursor = conn.cursor()
+    if dialect(conn) == "sqlite":
+        # SQLite 沒有多表 UPDATE（寫入本來就一次一個），條件更新成功再加獎勵
+        cursor.execute("""
+            UPDATE SigninRecords
+            SET signin_day = %s, last_signin_date = %s, weekly_streak = %s
+            WHERE user_id = %s AND signin_day = %s
+              AND (last_signin_date IS NULL OR last_signin_date < %s)
+        """, (next_signin_day, today, weekly_streak, user_id, signin_day, today))
+        claimed = cursor.rowcount > 0
+        cursor.close()
+        if claimed:
+            users.add_signin_reward(conn, user_id, coins, diamonds)
+        return claimed
+
+    cursor.execute(CLAIM_SQL, (next_signin_day, today, weekly_streak, coins, diamonds, user_id, signin_day, today))
+    claimed = cursor.rowcount > 0
+    cursor.close()
+    return claimed
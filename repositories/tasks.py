@@ -0,0 +1,75 @@
+from repositories import dialect
+
+# 各任務的完成度查詢
+TASK_CONDITIONS = {
+    1: "SELECT COUNT(*) AS completed FROM Courses WHERE user_id = %s AND progress = 100 AND updated_at >= %s",
+    2: "SELECT COALESCE(SUM(daily_points), 0) AS completed FROM LearningPointsLog WHERE user_id = %s AND date >= %s",
+    3: "SELECT weekly_streak AS completed FROM SigninRecords WHERE user_id = %s",
+}
+
+
+def delete_other_weeks(conn, user_id, week_start):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM WeeklyTasks WHERE user_id = %s AND week_start <> %s", (user_id, week_start))
+    cursor.close()
+
+
+def reset_claims(conn, user_id, week_start):
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE WeeklyTasks
+        SET is_claimed = 0
+        WHERE user_id = %s AND week_start = %s
+    """, (user_id, week_start))
+    cursor.close()
+
+
+# ✅ 確保該週的任務記錄存在（已存在就不動），多筆一句 INSERT 寫完
+def ensure_rows(conn, user_id, week_start, task_ids):
+    values = ", ".join(["(%s, %s, %s, 0)"] * len(task_ids))
+    params = [value for task_id in task_ids for value in (user_id, task_id, week_start)]
+    cursor = conn.cursor()
+    if dialect(conn) == "sqlite":
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO WeeklyTasks (user_id, task_id, week_start, is_claimed)
+            VALUES {values}
+        """, params)
+    else:
+        cursor.execute(f"""
+            INSERT INTO WeeklyTasks (user_id, task_id, week_start, is_claimed)
+            VALUES {values}
+            ON DUPLICATE KEY UPDATE is_claimed = is_claimed
+        """, params)
+    cursor.close()
+
+
+def claimed_map(conn, user_id, week_start):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT task_id, is_claimed FROM WeeklyTasks
+        WHERE user_id = %s AND week_start = %s
+    """, (user_id, week_start))
+    claimed = {row["task_id"]: int(row["is_claimed"]) for row in cursor.fetchall()}
+    cursor.close()
+    return claimed
+
+
+def task_progress(conn, user_id, task_id, week_start):
+    cursor = conn.cursor(dictionary=True)
+    # 根據 task_id 決定傳入幾個參數
+    if task_id == 3:
+        cursor.execute(TASK_CONDITIONS[task_id], (user_id,))
+    else:
+        cursor.execute(TASK_CONDITIONS[task_id], (user_id, week_start))
+    row = cursor.fetchone()
+    cursor.close()
+    return row["completed"] if row else 0
+
+
+def mark_claimed(conn, user_id, task_id, week_start):
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE WeeklyTasks SET is_claimed = 1
+        WHERE user_id = %s AND task_id = %s AND week_start = %s
+    """, (user_id, task_id, week_start))
+    cursor.close()
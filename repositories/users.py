@@ -0,0 +1,139 @@
+from repositories import dialect, hot
+
+
+def exists_username_or_email(conn, username, email):
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM Users WHERE username=%s OR email=%s", (username, email))
+    found = cursor.fetchone() is not None
+    cursor.close()
+    return found
+
+
+def create(conn, username, email, password_hash, created_at):
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO Users (username, email, password, total_learning_points, coins, diamonds, account_created_at, avatar_id)
+        VALUES (%s, %s, %s, 0, 500, 0, %s, 1)
+    """, (username, email, password_hash, created_at))
+    user_id = cursor.lastrowid
+    cursor.close()
+    return user_id
+
+
+def find_by_email(conn, email):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM Users WHERE email=%s", (email,))
+    user = cursor.fetchone()
+    cursor.close()
+    return user
+
+
+PROFILE_COLUMNS = "user_id, username, email, total_learning_points, coins, diamonds, avatar_id, total_signin_days"
+PROFILE_SQL = hot(f"SELECT {PROFILE_COLUMNS} FROM Users WHERE user_id = %s")
+BALANCE_SQL = hot("SELECT coins, diamonds FROM Users WHERE user_id = %s")
+ADD_REWARDS_SQL = hot("UPDATE Users SET coins = coins + %s, diamonds = diamonds + %s WHERE user_id = %s")
+ADD_LEARNING_POINTS_SQL = hot("UPDATE Users SET total_learning_points = total_learning_points + %s WHERE user_id = %s")
+# 餘額夠才扣（條件寫在同一句 UPDATE，同時抽卡時不會扣成負的）
+SPEND_SQL = hot("""
+    UPDATE Users SET coins = coins - %s, diamonds = diamonds - %s
+    WHERE user_id = %s AND coins >= %s AND diamonds >= %s
+""")
+
+
+LOCK_SQL = hot("SELECT user_id FROM Users WHERE user_id = %s FOR UPDATE")
+
+
+# ✅ 交易一開始先鎖住使用者那一列（transactions.run(lock_user=...)）：
+# 所有會同時改 Users 和其他表的交易都先鎖 Users，鎖的順序一致就不會互相死結
+# SQLite 同一時間只有一個寫入者，不用鎖
+def lock(conn, user_id):
+    if dialect(conn) == "sqlite":
+        return
+    cursor = conn.cursor()
+    cursor.execute(LOCK_SQL, (user_id,))
+    cursor.fetchall()
+    cursor.close()
+
+
+# ✅ 一次鎖住多個使用者（依 user_id 順序，跟其他交易不會互相死結），回傳實際存在的 user_id
+def lock_many(conn, user_ids):
+    if not user_ids:
+        return []
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    lock = "" if dialect(conn) == "sqlite" else " FOR UPDATE"
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT user_id FROM Users WHERE user_id IN ({placeholders}) ORDER BY user_id{lock}",
+                   tuple(user_ids))
+    found = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return found
+
+
+# ✅ 多個使用者的資料一次查完，回傳 {user_id: row}
+def get_profiles(conn, user_ids):
+    cursor = conn.cursor(dictionary=True)
+    if len(user_ids) == 1:
+        # 最常見的是只查一個人（/user、抽卡、成就檢查），固定的 SQL 才能重用 prepared statement
+        cursor.execute(PROFILE_SQL, tuple(user_ids))
+    else:
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        cursor.execute(f"SELECT {PROFILE_COLUMNS} FROM Users WHERE user_id IN ({placeholders})", tuple(user_ids))
+    rows = cursor.fetchall()
+    cursor.close()
+    return {row["user_id"]: row for row in rows}
+
+
+def get_balance(conn, user_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(BALANCE_SQL, (user_id,))
+    balance = cursor.fetchone()
+    cursor.close()
+    return balance
+
+
+def add_rewards(conn, user_id, coins=0, diamonds=0):
+    cursor = conn.cursor()
+    cursor.execute(ADD_REWARDS_SQL, (coins, diamonds, user_id))
+    cursor.close()
+
+
+def add_signin_reward(conn, user_id, coins, diamonds):
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE Users SET total_signin_days = total_signin_days + 1, 
+        coins = coins + %s, diamonds = diamonds + %s WHERE user_id = %s
+    """, (coins, diamonds, user_id))
+    cursor.close()
+
+
+def add_learning_points(conn, user_id, points):
+    cursor = conn.cursor()
+    cursor.execute(ADD_LEARNING_POINTS_SQL, (points, user_id))
+    cursor.close()
+
+
+# ✅ 扣除金幣 / 鑽石，回傳 False 代表餘額不足（沒有扣）
+def spend(conn, user_id, coins=0, diamonds=0):
+    cursor = conn.cursor()
+    cursor.execute(SPEND_SQL, (coins, diamonds, user_id, coins, diamonds))
+    spent = cursor.rowcount > 0
+    cursor.close()
+    return spent
+
+
+def update_username(conn, user_id, username):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE Users SET username=%s WHERE user_id=%s", (username, user_id))
+    cursor.close()
+
+
+def update_avatar(conn, user_id, avatar_id):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE Users SET avatar_id=%s WHERE user_id=%s", (avatar_id, user_id))
+    cursor.close()
+
+
+def delete(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Users WHERE user_id=%s", (user_id,))
+    cursor.close()
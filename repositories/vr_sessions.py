@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from repositories import dialect, hot
+from repositories.backends import TAIWAN
+
+# ✅ 目前在 VR 裡上課的課程（每個使用者一筆）：/continue_course 登記，第一次回報進度 / 結束課程時移除
+ACTIVE_COURSE_SQL = hot("""
+    SELECT c.course_id, c.course_name, c.current_stage, c.progress, c.progress_one_to_one,
+           c.progress_classroom, c.teacher_card_id
+    FROM ActiveVRSessions s
+    JOIN Courses c ON c.course_id = s.course_id
+    WHERE s.user_id = %s
+""")
+END_SQL = hot("DELETE FROM ActiveVRSessions WHERE user_id = %s AND course_id = %s")
+START_SQL = hot("""
+    INSERT INTO ActiveVRSessions (user_id, course_id, started_at) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE course_id = VALUES(course_id), started_at = VALUES(started_at)
+""")
+
+
+def active_course(conn, user_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(ACTIVE_COURSE_SQL, (user_id,))
+    course = cursor.fetchone()
+    cursor.close()
+    return course
+
+
+def start(conn, user_id, course_id, started_at):
+    cursor = conn.cursor()
+    if dialect(conn) == "sqlite":
+        cursor.execute("""
+            INSERT INTO ActiveVRSessions (user_id, course_id, started_at) VALUES (%s, %s, %s)
+            ON CONFLICT (user_id) DO UPDATE SET course_id = excluded.course_id, started_at = excluded.started_at
+        """, (user_id, course_id, started_at))
+    else:
+        cursor.execute(START_SQL, (user_id, course_id, started_at))
+    cursor.close()
+
+
+# ✅ 這門課是這個使用者目前的 session 才移除（一句 DELETE），回傳是否有移除
+def end(conn, user_id, course_id):
+    cursor = conn.cursor()
+    cursor.execute(END_SQL, (user_id, course_id))
+    ended = cursor.rowcount > 0
+    cursor.close()
+    return ended
+
+
+# ✅ 容量規劃用：目前有幾個 session、最久的一個開始多久了
+def stats(conn):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT COUNT(*) AS active, MIN(started_at) AS oldest FROM ActiveVRSessions")
+    row = cursor.fetchone()
+    cursor.close()
+    oldest = row["oldest"]
+    if isinstance(oldest, str):  # SQLite 的聚合結果不會轉型
+        oldest = datetime.strptime(oldest[:19], "%Y-%m-%d %H:%M:%S")
+    age = (datetime.now(TAIWAN).replace(tzinfo=None) - oldest).total_seconds() if oldest else 0.0
+    return {"active": row["active"], "oldest_seconds": age}
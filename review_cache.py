@@ -0,0 +1,110 @@
+# ✅ 課程回顧快取：評價建立後就不會再改，組好的回應（含 JSON 欄位解析、積分）直接快取起來
+#
+# REVIEW_CACHE_SIZE   每個 worker 最多快取幾門課（預設 2048，LRU 淘汰）
+# REVIEW_CACHE_TTL    快取最久保留幾秒（預設 600）；刪除課程 / 帳號只會清掉當下這個 worker 的快取，
+#                     其他 worker 最晚在 TTL 後更新
+import json
+import logging
+import os
+
+from cache import LRUCache
+from db import DatabaseUnavailable, get_db_connection
+from repositories import reviews
+
+log = logging.getLogger("feyndora.app.review")
+
+CACHE_SIZE = int(os.getenv("REVIEW_CACHE_SIZE", "2048"))
+CACHE_TTL = float(os.getenv("REVIEW_CACHE_TTL", "600"))
+
+# course_id → (user_id, 組好的回應)
+_cache = LRUCache(CACHE_SIZE, ttl=CACHE_TTL)
+
+
+def _parse_list(review_data, field):
+    value = review_data.get(field)
+    if not value:
+        return []
+    return json.loads(value)
+
+
+def assemble(review_data, earned_points):
+    try:
+        good_points = _parse_list(review_data, "good_points")
+        improvement_points = _parse_list(review_data, "improvement_points")
+    except json.JSONDecodeError as e:
+        log.warning("⚠️ JSON 解析错误: %s | good_points=%r | improvement_points=%r",
+                    e, review_data.get('good_points'), review_data.get('improvement_points'))
+        good_points = []
+        improvement_points = []
+
+    return {
+        "accuracy_score": review_data.get("accuracy_score", 50),
+        "understanding_score": review_data.get("understanding_score", 50),
+        "expression_score": review_data.get("expression_score", 50),
+        "interaction_score": review_data.get("interaction_score", 50),
+        "teacher_comment": review_data.get("teacher_comment", ""),
+        "student1_feedback": review_data.get("student1_feedback", ""),
+        "student2_feedback": review_data.get("student2_feedback", ""),
+        "student3_feedback": review_data.get("student3_feedback", ""),
+        "earned_points": earned_points,
+        "good_points": good_points,
+        "improvement_points": improvement_points
+    }
+
+
+# ✅ 先查快取，回傳 ({course_id: 回應}, 快取裡沒有的 course_id)
+def lookup(course_ids):
+    found, missing = {}, []
+    for course_id in course_ids:
+        cached = _cache.get(course_id)
+        if cached is None:
+            missing.append(course_id)
+        else:
+            found[course_id] = cached[1]
+    return found, missing
+
+
+# ✅ 快取沒有的從 DB 查（固定 2 次 SQL，不管幾門課），回傳 {course_id: 回應}；課程不存在就不會出現
+# 還沒有評價的課程回傳預設評價，但不放進快取（之後建立了真正的評價才看得到）
+def load(conn, course_ids):
+    rows = reviews.get_with_owner(conn, course_ids)
+    if not rows:
+        return {}
+    earned = reviews.earned_points_by_course(conn, list(rows))
+
+    loaded = {}
+    for course_id, row in rows.items():
+        if row["review_id"] is None:
+            log.info("⚠️ 未找到评价数据，使用默认评价 - CourseID: %s, UserID: %s", course_id, row["user_id"])
+            loaded[course_id] = assemble(reviews.DEFAULT_REVIEW, earned[course_id])
+            continue
+        loaded[course_id] = assemble(row, earned[course_id])
+        _cache.put(course_id, (row["user_id"], loaded[course_id]))
+    return loaded
+
+
+def invalidate_course(course_id):
+    _cache.pop(course_id)
+
+
+def invalidate_user(user_id):
+    _cache.discard_if(lambda course_id, entry: entry[0] == user_id)
+
+
+# ✅ 結束課程後在背景建立預設評價（原本是第一次讀取課程回顧時才在 GET 裡寫入）
+def pregenerate(course_id):
+    try:
+        conn = get_db_connection()
+    except DatabaseUnavailable:
+        log.warning("⚠️ 建立默认评价失败：数据库连接失败 - CourseID: %s", course_id)
+        return
+    try:
+        if reviews.create_default_if_missing(conn, course_id):
+            log.debug("✅ 已插入默认评价数据 - CourseID: %s", course_id)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def stats():
+    return _cache.stats()
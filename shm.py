@@ -0,0 +1,221 @@
+# ✅ 跨 worker 共用的小型資料表（mmap 檔案）
+#
+# gunicorn 每個 worker 是獨立的 process，一般的 dict 只有自己看得到。
+# 這裡把固定大小的表放在 SHM_DIR（預設 /dev/shm）的檔案裡，每個 worker 都 mmap 同一個檔案：
+#   讀：直接讀記憶體，不上鎖
+#   寫：flock 檔案鎖（同 process 內的執行緒再加一層 threading.Lock）
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+SHM_DIR = os.getenv("SHM_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+SHM_PREFIX = os.getenv("SHM_PREFIX", "feyndora")
+
+
+def shm_path(name):
+    return os.path.join(SHM_DIR, f"{SHM_PREFIX}-{name}.shm")
+
+
+# ✅ 打開（不存在就建立）指定大小的共用檔案，回傳 (fd, mmap)
+def open_segment(name, size):
+    fd = os.open(shm_path(name), os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    return fd, mmap.mmap(fd, size)
+
+
+class SegmentLock:
+    def __init__(self, fd):
+        self._fd = fd
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+
+# ✅ 固定大小的雜湊表：開放定址，每個 key 最多探查 PROBE 格；
+# 滿了就擠掉最早到期的那格，所以表滿也不會出錯，只會提早遺忘。
+class _SharedTable:
+    SLOT = None
+    PROBE = 16
+
+    def __init__(self, name, slots=65536):
+        self.slots = slots
+        self._fd, self._buf = open_segment(name, slots * self.SLOT.size)
+        self._lock = SegmentLock(self._fd)
+
+    def _positions(self, key):
+        start = key % self.slots
+        return [(start + i) % self.slots for i in range(self.PROBE)]
+
+    def _read(self, pos):
+        return self.SLOT.unpack_from(self._buf, pos * self.SLOT.size)
+
+    def _write(self, pos, *values):
+        self.SLOT.pack_into(self._buf, pos * self.SLOT.size, *values)
+
+
+# ✅ 整數 key → 到期時間（time.time()）的共用表
+class SharedExpiryMap(_SharedTable):
+    SLOT = struct.Struct("<qd")
+
+    # 回傳到期時間，沒有或已過期回傳 None
+    def get(self, key, now=None):
+        stored = key + 1  # 0 代表空格
+        now = time.time() if now is None else now
+        for pos in self._positions(key):
+            slot_key, expires_at = self._read(pos)
+            if slot_key == stored:
+                return expires_at if expires_at > now else None
+            if slot_key == 0:
+                return None
+        return None
+
+    def touch(self, key, ttl):
+        stored = key + 1
+        expires_at = time.time() + ttl
+        with self._lock:
+            victim = oldest = None
+            for pos in self._positions(key):
+                slot_key, slot_expires = self._read(pos)
+                if slot_key == stored:
+                    victim, expires_at = pos, max(expires_at, slot_expires)
+                    break
+                if slot_key == 0:
+                    victim = pos
+                    break
+                if oldest is None or slot_expires < oldest:
+                    victim, oldest = pos, slot_expires
+            self._write(victim, stored, expires_at)
+
+
+# ✅ 整數 key → 版本號的共用表（快取失效用）：每次 bump 都換成一個沒用過的新版本號（以 time_ns 遞增），
+# 被擠掉的 key 會讀到 0，之後 ensure 再發一個新版本號，所以舊版本號不會「剛好又對上」。
+class SharedVersionMap(_SharedTable):
+    SLOT = struct.Struct("<qq")
+
+    def _locate(self, key):
+        stored = key + 1
+        victim = oldest = None
+        for pos in self._positions(key):
+            slot_key, version = self._read(pos)
+            if slot_key == stored:
+                return pos, version
+            if slot_key == 0:
+                return pos, 0
+            if oldest is None or version < oldest:
+                victim, oldest = pos, version
+        return victim, 0
+
+    def _next(self, previous):
+        return max(time.time_ns(), previous + 1)
+
+    # 回傳目前版本號，沒有回傳 0
+    def get(self, key):
+        stored = key + 1
+        for pos in self._positions(key):
+            slot_key, version = self._read(pos)
+            if slot_key == stored:
+                return version
+            if slot_key == 0:
+                return 0
+        return 0
+
+    # 回傳目前版本號，沒有就發一個新的
+    def ensure(self, key):
+        version = self.get(key)
+        if version:
+            return version
+        with self._lock:
+            pos, version = self._locate(key)
+            if not version:
+                version = self._next(0)
+                self._write(pos, key + 1, version)
+            return version
+
+    # 換成新版本號，回傳 (新版本號, 原本的版本號)
+    def bump(self, key):
+        with self._lock:
+            pos, previous = self._locate(key)
+            version = self._next(previous)
+            self._write(pos, key + 1, version)
+            return version, previous
+
+
+# ✅ 字串 key → (次數, 到期時間) 的共用計數表（限流用）：到期後重新從 0 開始算
+class SharedCounterMap(_SharedTable):
+    SLOT = struct.Struct("<qqd")
+
+    @staticmethod
+    def _hash(key):
+        # 64 位元雜湊取 62 位元，+1 之後還是正的 int64
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") >> 2
+
+    def _find(self, hashed):
+        stored = hashed + 1
+        for pos in self._positions(hashed):
+            slot_key, count, expires_at = self._read(pos)
+            if slot_key == stored:
+                return pos, count, expires_at
+            if slot_key == 0:
+                return None
+        return None
+
+    # 回傳 (次數, 到期時間)，沒有或已過期回傳 (0, None)
+    def get(self, key, now=None):
+        now = time.time() if now is None else now
+        found = self._find(self._hash(key))
+        if found is None or found[2] <= now:
+            return 0, None
+        return found[1], found[2]
+
+    # 加 amount 次，回傳加完的次數；過期的話從 amount 重新算，到期時間是 ttl 秒後
+    def incr(self, key, ttl, amount=1):
+        hashed = self._hash(key)
+        stored = hashed + 1
+        now = time.time()
+        with self._lock:
+            victim = oldest = None
+            count, expires_at = 0, now + ttl
+            for pos in self._positions(hashed):
+                slot_key, slot_count, slot_expires = self._read(pos)
+                if slot_key == stored:
+                    victim = pos
+                    if slot_expires > now:
+                        count, expires_at = slot_count, slot_expires
+                    break
+                if slot_key == 0:
+                    victim = pos
+                    break
+                if oldest is None or slot_expires < oldest:
+                    victim, oldest = pos, slot_expires
+            count += amount
+            self._write(victim, stored, count, expires_at)
+        return count
+
+    def clear(self, key):
+        with self._lock:
+            found = self._find(self._hash(key))
+            if found is not None:
+                # 留著 key 讓後面的探查鏈不會斷，只把次數歸零、設成已過期
+                self._write(found[0], self._hash(key) + 1, 0, 0.0)
+
+    def reset(self):
+        with self._lock:
+            self._buf[:] = bytes(len(self._buf))
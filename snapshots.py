@@ -0,0 +1,248 @@
+# ✅ 跨 worker 共用的唯讀快照（卡片圖鑑、目前的排行榜前 N 名）
+#
+# 每份快照是 /dev/shm 裡的一個 mmap 檔（shm.py），所有 worker 直接讀同一份，不用各自查 DB、各自快取：
+#   寫：只有一個 worker 當 refresher（搶到檔案鎖的那個，它結束後別的 worker 會接手），
+#       在背景查 DB、把 JSON 寫進共用記憶體
+#   讀：其他 worker 直接從共用記憶體拿 JSON（/cards 連解析都不用，直接當回應送出）
+#   失效：invalidate() 只是把「要重建」計數器 +1，refresher 下一輪看到就重建（多次失效只會重建一次）
+#
+# SNAPSHOT_BYTES      每份快照最大幾 bytes（預設 1MB；兩塊輪流寫，實際佔用 2 倍），超過就不寫、照常查 DB
+# SNAPSHOT_INTERVAL   refresher 每幾秒檢查一次（預設 1），也就是排行榜最多舊幾秒
+#
+# 檔案格式：64 bytes 標頭 + 兩塊資料區（寫入時寫另一塊，寫完才切換，讀的人不會讀到寫一半的資料）
+#   標頭：generation（寫入中是奇數）、dirty（要重建的次數）、built_dirty（上次重建時的 dirty）、
+#         active（目前是哪一塊）、length、published_at
+import fcntl
+import logging
+import os
+import struct
+import threading
+import time
+
+import metrics
+import shm
+from db import DatabaseUnavailable, get_db_connection
+
+log = logging.getLogger("feyndora.snapshots")
+
+CAPACITY = int(os.getenv("SNAPSHOT_BYTES", str(1024 * 1024)))
+INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "1"))
+
+HEADER_SIZE = 64
+GENERATION = struct.Struct("<Q")       # offset 0
+COUNTERS = struct.Struct("<QQ")        # offset 8：dirty, built_dirty
+BODY = struct.Struct("<IId")           # offset 24：active, length, published_at
+READ_RETRIES = 3
+
+
+class Snapshot:
+    def __init__(self, name, build, max_age, capacity=CAPACITY, on_publish=None):
+        self.name = name
+        self.build = build
+        self.max_age = max_age
+        self.on_publish = on_publish
+        self.capacity = capacity
+        self._segment = None
+        self._decoded = (0, None)
+
+    def _open(self):
+        # 第一次用到才打開（fork 之後每個 worker 自己打開，檔案鎖才不會共用）
+        if self._segment is None:
+            fd, buf = shm.open_segment(f"snapshot-{self.name}", HEADER_SIZE + 2 * self.capacity)
+            self._segment = buf, shm.SegmentLock(fd)
+        return self._segment
+
+    def _header(self, buf):
+        generation, = GENERATION.unpack_from(buf, 0)
+        dirty, built_dirty = COUNTERS.unpack_from(buf, 8)
+        active, length, published_at = BODY.unpack_from(buf, 24)
+        return generation, dirty, built_dirty, active, length, published_at
+
+    # ✅ 回傳 (generation, JSON bytes)，還沒有資料回傳 (0, None)
+    def read(self):
+        buf, _ = self._open()
+        for _ in range(READ_RETRIES):
+            before, = GENERATION.unpack_from(buf, 0)
+            if before == 0:
+                return 0, None
+            if before % 2:
+                time.sleep(0)  # 正在切換，讓一下再讀
+                continue
+            active, length, _ = BODY.unpack_from(buf, 24)
+            start = HEADER_SIZE + active * self.capacity
+            data = buf[start:start + length]
+            after, = GENERATION.unpack_from(buf, 0)
+            if before == after:
+                return before, data
+        return 0, None
+
+    # ✅ 解析後的資料，每個 worker 只在 generation 變了才重新解析
+    def get(self, loads):
+        return self.current(loads)[1]
+
+    # 回傳 (generation, 解析後的資料)，還沒有資料回傳 (0, None)
+    def current(self, loads):
+        generation, cached = self._decoded
+        current, = GENERATION.unpack_from(self._open()[0], 0)
+        if current == generation and cached is not None:
+            return self._decoded
+        generation, data = self.read()
+        if data is None:
+            return 0, None
+        self._decoded = (generation, loads(data))
+        return self._decoded
+
+    def invalidate(self):
+        buf, lock = self._open()
+        with lock:
+            dirty, built_dirty = COUNTERS.unpack_from(buf, 8)
+            COUNTERS.pack_into(buf, 8, dirty + 1, built_dirty)
+
+    def needs_refresh(self):
+        generation, dirty, built_dirty, _, _, published_at = self._header(self._open()[0])
+        return generation == 0 or dirty != built_dirty or time.time() - published_at > self.max_age
+
+    # 只有 refresher 會呼叫；built_dirty 是開始查 DB 前的 dirty，重建期間又有失效的話下一輪會再重建
+    # 寫入成功回傳新的 generation
+    def publish(self, data, built_dirty):
+        buf, lock = self._open()
+        if len(data) > self.capacity:
+            log.warning("快照太大，不寫入共用記憶體", extra={"snapshot": self.name, "bytes": len(data),
+                                                       "capacity": self.capacity})
+            return False
+        generation, _, _, active, _, _ = self._header(buf)
+        target = 1 - active if generation else 0
+        start = HEADER_SIZE + target * self.capacity
+        buf[start:start + len(data)] = data
+        with lock:
+            GENERATION.pack_into(buf, 0, generation + 1)  # 奇數：切換中
+            BODY.pack_into(buf, 24, target, len(data), time.time())
+            dirty, _ = COUNTERS.unpack_from(buf, 8)
+            COUNTERS.pack_into(buf, 8, dirty, built_dirty)
+            GENERATION.pack_into(buf, 0, generation + 2)
+        metrics.record_snapshot(self.name, len(data), 2 * self.capacity)
+        return generation + 2
+
+    def refresh(self, encode, loads):
+        dirty, _ = COUNTERS.unpack_from(self._open()[0], 8)
+        try:
+            conn = get_db_connection(read_only=True)
+        except DatabaseUnavailable:
+            return  # DB 無法使用時保留舊的快照
+        try:
+            value = self.build(conn)
+        finally:
+            conn.close()
+        data = encode(value)
+        previous = self.current(loads) if self.on_publish else None
+        generation = self.publish(data, dirty)
+        if generation and self.on_publish:
+            # 上一版 → 這一版（version 是第幾次寫入），例如排行榜算出變化推播出去
+            try:
+                self.on_publish((previous[0] // 2, previous[1]), (generation // 2, loads(data)))
+            except Exception:
+                log.exception("快照寫入後的通知失敗", extra={"snapshot": self.name})
+
+    def stats(self):
+        generation, dirty, built_dirty, _, length, published_at = self._header(self._open()[0])
+        return {"generation": generation // 2, "bytes": length, "capacity": 2 * self.capacity,
+                "age": round(time.time() - published_at, 3) if generation else None,
+                "pending": dirty != built_dirty}
+
+
+_snapshots = {}
+_json = None
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+
+
+# on_publish(previous, current)：refresher 每次寫入新的一版後呼叫，兩個都是 (version, 資料)，之前沒有資料時是 (0, None)
+def register(name, build, max_age=300, on_publish=None):
+    _snapshots[name] = Snapshot(name, build, max_age, on_publish=on_publish)
+
+
+# ✅ 讀快照（解析後的物件），還沒建好回傳 None，呼叫的人自己查 DB
+def get(name):
+    _ensure_refresher()
+    return _snapshots[name].get(_json.loads)
+
+
+# ✅ 讀快照和它的 version（第幾次寫入），還沒建好回傳 None
+def current(name):
+    _ensure_refresher()
+    generation, value = _snapshots[name].current(_json.loads)
+    return (generation // 2, value) if value is not None else None
+
+
+# ✅ 讀快照的原始 JSON bytes（跟 jsonify 的回應內容一樣，可以直接送出）
+def get_bytes(name):
+    _ensure_refresher()
+    return _snapshots[name].read()[1]
+
+
+def invalidate(*names):
+    for name in names:
+        _snapshots[name].invalidate()
+
+
+def _ensure_refresher():
+    global _refresher_pid
+    if _refresher_pid == os.getpid():
+        return
+    with _refresher_lock:
+        if _refresher_pid != os.getpid():
+            _refresher_pid = os.getpid()
+            threading.Thread(target=_refresh_loop, name="snapshot-refresher", daemon=True).start()
+
+
+def _refresh_loop():
+    # 搶到檔案鎖的 worker 才負責重建；搶不到的每一輪再試，原本的 refresher 結束時鎖會自動放開
+    fd = os.open(shm.shm_path("snapshot-refresher"), os.O_RDWR | os.O_CREAT, 0o600)
+    leader = False
+    while True:
+        if not leader:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                leader = True
+                log.info("這個 worker 負責重建共用快照", extra={"pid": os.getpid()})
+            except BlockingIOError:
+                pass
+        if leader:
+            for snapshot in list(_snapshots.values()):
+                try:
+                    if snapshot.needs_refresh():
+                        snapshot.refresh(_encode, _json.loads)
+                except Exception:
+                    log.exception("重建快照失敗", extra={"snapshot": snapshot.name})
+        time.sleep(INTERVAL)
+
+
+# 跟 jsonify 的回應內容一模一樣（含結尾換行），/cards 可以直接送出
+def _encode(value):
+    return _json.response(value).get_data()
+
+
+def stats():
+    return {name: snapshot.stats() for name, snapshot in _snapshots.items()}
+
+
+def init_app(app):
+    global _json
+    # 用 app 的 JSON 設定（orjson、日期格式）序列化，讀回來再輸出時跟直接查 DB 的結果一樣
+    _json = app.json
+
+
+# ✅ 上架新卡後讓卡片圖鑑重建：python snapshots.py invalidate cards
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="共用快照工具")
+    parser.add_argument("command", choices=["invalidate", "stats"])
+    parser.add_argument("names", nargs="+", help="快照名稱，例如 cards、daily_leaderboard、weekly_leaderboard")
+    args = parser.parse_args()
+    for snapshot_name in args.names:
+        snapshot = Snapshot(snapshot_name, None, 0)
+        if args.command == "invalidate":
+            snapshot.invalidate()
+        print(snapshot_name, json.dumps(snapshot.stats(), ensure_ascii=False))
@@ -1,2 +1,7 @@
 #!/bin/bash
-gunicorn -w 4 -b 0.0.0.0:8000 app:app
\ No newline at end of file
+# ✅ 多 worker 的 metrics 要寫到共用目錄，每次啟動先清空
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/feyndora-metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+# ✅ gthread：/events 的 SSE 連線每條佔一個執行緒，不會卡住整個 worker
+export GUNICORN_THREADS=${GUNICORN_THREADS:-32}
+gunicorn -c gunicorn.conf.py -w 4 -k gthread --threads "$GUNICORN_THREADS" -b 0.0.0.0:8000 app:app
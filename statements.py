@@ -0,0 +1,111 @@
+# ✅ 熱門 SQL 的 server-side prepared statement 快取（只有 MySQL）
+#
+# 用 repositories.hot() 註冊的 SQL，第一次在某條連線上執行時 PREPARE，之後同一條連線只送參數
+# （COM_STMT_EXECUTE），MySQL 不用每次重新解析。其他 SQL 照舊用文字送出。
+#
+# DB_PREPARED_STATEMENTS   設成 0 關閉（預設 1）
+# DB_STATEMENT_CACHE       每條連線最多保留幾個 prepared statement（預設 32，LRU，淘汰時會關掉釋放 MySQL 的記憶體）
+#
+# prepared statement 是綁在 MySQL session 上的，所以快取掛在原始連線物件上：連線放回連線池、
+# 下一個請求拿到同一條連線時還能用；連線被丟掉時一起消失。
+# SQLite 的 sqlite3 本來就有每條連線的 statement 快取，不經過這裡。
+import collections
+import logging
+import os
+
+from repositories import HOT_QUERIES
+
+log = logging.getLogger("feyndora.db.statements")
+
+ENABLED = os.getenv("DB_PREPARED_STATEMENTS", "1") == "1"
+CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE", "32"))
+
+_ATTRIBUTE = "_feyndora_statements"
+
+
+# ✅ prepared cursor 的結果一次讀完（跟一般 cursor 的 buffered=True 一樣），
+# 同一條連線才能接著下一句 SQL；dictionary=True 時轉成 dict
+class PreparedResult:
+    def __init__(self, cursor, dictionary):
+        self.description = cursor.description
+        rows = cursor.fetchall() if cursor.description else []
+        if dictionary and rows:
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in rows]
+        self._rows = collections.deque(rows)
+        self.rowcount = cursor.rowcount
+        self.lastrowid = cursor.lastrowid
+
+    def fetchone(self):
+        return self._rows.popleft() if self._rows else None
+
+    def fetchall(self):
+        rows = list(self._rows)
+        self._rows.clear()
+        return rows
+
+    def fetchmany(self, size=1):
+        return [self._rows.popleft() for _ in range(min(size, len(self._rows)))]
+
+    def close(self):
+        self._rows.clear()
+
+
+class StatementCache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        # SQL → (prepared cursor, 第一次用的 SQL 字串)
+        self._cursors = collections.OrderedDict()
+        self.hits = 0
+        self.prepares = 0
+
+    # 回傳 (結果, 是否重用了已經 PREPARE 過的 statement)
+    def execute(self, raw, sql, params, dictionary):
+        entry = self._cursors.get(sql)
+        reused = entry is not None
+        if reused:
+            self._cursors.move_to_end(sql)
+            self.hits += 1
+        else:
+            # 連線預設 buffered=True，prepared cursor 不能 buffered，結果由 PreparedResult 一次讀完
+            entry = raw.cursor(prepared=True, buffered=False), sql
+            self._cursors[sql] = entry
+            self.prepares += 1
+            if len(self._cursors) > self.size:
+                _, (evicted, _) = self._cursors.popitem(last=False)
+                _close_quietly(evicted)
+        cursor, prepared_sql = entry
+        try:
+            # 傳同一個字串物件，cursor 才會知道是同一句、不用重新 PREPARE
+            cursor.execute(prepared_sql, params)
+            return PreparedResult(cursor, dictionary), reused
+        except Exception:
+            # 出錯的 statement 不留著（例如表結構改了），下次重新 PREPARE
+            self._cursors.pop(sql, None)
+            _close_quietly(cursor)
+            raise
+
+    def stats(self):
+        return {"size": len(self._cursors), "hits": self.hits, "prepares": self.prepares}
+
+
+def is_hot(sql):
+    return sql in HOT_QUERIES
+
+
+# ✅ 這條原始連線的 statement 快取；關閉時回傳 None
+def cache_for(raw):
+    if not ENABLED or CACHE_SIZE <= 0:
+        return None
+    cache = getattr(raw, _ATTRIBUTE, None)
+    if cache is None:
+        cache = StatementCache()
+        setattr(raw, _ATTRIBUTE, cache)
+    return cache
+
+
+def _close_quietly(cursor):
+    try:
+        cursor.close()
+    except Exception as e:
+        log.debug("關閉 prepared statement 失敗: %s", e)
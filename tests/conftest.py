@@ -0,0 +1,76 @@
+# ✅ 測試用內嵌 SQLite + 獨立的共用記憶體目錄，不需要 MySQL 伺服器
+# 環境變數要在 import app 之前設好（db.py、shm.py 在 import 時就讀設定）
+import argparse
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp = tempfile.mkdtemp(prefix="feyndora-test-")
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(_tmp, "feyndora.db")
+os.environ["SHM_DIR"] = _tmp
+os.environ["QUERY_BUDGET_MODE"] = "raise"  # 超過 @query_budget 的 API 直接失敗
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import migrate  # noqa: E402
+from db import connect_raw  # noqa: E402
+from repositories import users  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    conn = connect_raw()
+    try:
+        migrate.cmd_up(conn, argparse.Namespace(to=None))
+    finally:
+        conn.close()
+    import app as feyndora
+    feyndora.app.config["TESTING"] = True
+    return feyndora.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def db():
+    conn = connect_raw()
+    yield conn
+    conn.close()
+
+
+# ✅ 新建一個使用者（跟 /register 一樣 500 金幣），回傳 user_id；直接寫 DB，不佔 /register 的限流次數
+@pytest.fixture
+def user(app, db):
+    return create_user(db)
+
+
+def create_user(conn):
+    name = uuid.uuid4().hex[:12]
+    user_id = users.create(conn, name, f"{name}@example.com", "x", datetime.now())
+    conn.commit()
+    return user_id
+
+
+def query(conn, sql, params=()):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+
+def execute(conn, sql, params=()):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    cursor.close()
+    conn.commit()
@@ -0,0 +1,49 @@
+# ✅ SQLite 只有檔案打不開 / 磁碟錯誤才算 DB 掛掉；等鎖、沒有這張表、語法錯誤不會讓斷路器跳開
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+import db
+from repositories.backends import SQLiteBackend, SQLiteConnection, SQLiteUnavailable
+
+
+def test_unopenable_file_is_unavailable():
+    backend = SQLiteBackend(os.path.join(tempfile.mkdtemp(), "missing", "feyndora.db"))
+    with pytest.raises(backend.unavailable_errors):
+        backend.connect()
+
+
+@pytest.mark.parametrize("sql", ["SELECT * FROM NoSuchTable", "SELEC 1"])
+def test_query_errors_do_not_trip_breaker(app, sql):
+    with app.test_request_context():
+        conn = db.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            failures = db.primary_breaker.failures
+            with pytest.raises(sqlite3.OperationalError) as raised:
+                cursor.execute(sql)
+            assert not isinstance(raised.value, SQLiteUnavailable)
+            assert db.primary_breaker.failures == failures
+        finally:
+            conn.close()
+
+
+def test_locked_is_retried_not_unavailable(app):
+    path = os.path.join(tempfile.mkdtemp(), "locked.db")
+    backend = SQLiteBackend(path)
+    holder = backend.connect()
+    holder.cursor().execute("CREATE TABLE t (x INTEGER)")
+    holder.commit()
+    holder.cursor().execute("BEGIN IMMEDIATE")
+    waiter = SQLiteConnection(sqlite3.connect(path, timeout=0))
+    try:
+        with pytest.raises(sqlite3.OperationalError) as raised:
+            waiter.cursor().execute("BEGIN IMMEDIATE")
+        assert backend.retry_reason(raised.value) == "busy"
+        assert not isinstance(raised.value, backend.unavailable_errors)
+    finally:
+        waiter.close()
+        holder.rollback()
+        holder.close()
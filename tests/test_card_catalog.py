@@ -0,0 +1,38 @@
+# ✅ 卡片圖鑑：不加 immutable（上架新卡、快照重建後會變），帶 ETag，內容沒變回 304、重建後拿到新的內容
+import time
+import uuid
+
+import snapshots
+from conftest import execute, query
+
+
+# 上架新卡（三種稀有度各一張，抽卡的測試才抽得到），等 refresher 重建好快照再回傳圖鑑
+def add_cards(client, db):
+    for rarity in ("絕密", "機密", "隱密"):
+        execute(db, "INSERT INTO Cards (name, rarity) VALUES (%s, %s)", (f"老師{uuid.uuid4().hex[:6]}", rarity))
+    snapshots.invalidate("cards")
+    expected = query(db, "SELECT COUNT(*) AS n FROM Cards")["n"]
+    deadline = time.monotonic() + 5
+    while True:
+        response = client.get("/cards")
+        if len(response.get_json()["cards"]) == expected or time.monotonic() > deadline:
+            return response
+        time.sleep(0.05)
+
+
+def test_catalog_revalidates_with_etag(client, db):
+    response = add_cards(client, db)
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "public, max-age=300"
+    etag = response.headers["ETag"]
+
+    for encoding in ("identity", "gzip"):
+        cached = client.get("/cards", headers={"If-None-Match": etag, "Accept-Encoding": encoding})
+        assert cached.status_code == 304
+        assert cached.data == b""
+
+    # 快照重建後 ETag 跟著變，舊的 If-None-Match 拿到新的內容
+    updated = add_cards(client, db)
+    assert updated.headers["ETag"] != etag
+    assert client.get("/cards", headers={"If-None-Match": etag}).status_code == 200
+    assert len(updated.get_json()["cards"]) == len(response.get_json()["cards"]) + 3
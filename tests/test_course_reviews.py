@@ -0,0 +1,76 @@
+# ✅ 課程回顧：組好的回應快取起來，/course_reviews 一次查多門課，刪除課程 / 帳號時清掉快取
+import pytest
+
+from conftest import execute, query
+
+
+def add_course(client, db, user, name="物理"):
+    assert client.post("/add_course", json={"user_id": user, "course_name": name, "file_type": "pdf"}).status_code == 201
+    return query(db, "SELECT MAX(course_id) AS course_id FROM Courses WHERE user_id = %s", (user,))["course_id"]
+
+
+def add_review(db, course_id, user, comment):
+    execute(db, """
+        INSERT INTO CourseReviews (course_id, user_id, accuracy_score, teacher_comment, good_points, improvement_points)
+        VALUES (%s, %s, 90, %s, '["清楚"]', '[]')
+    """, (course_id, user, comment))
+
+
+@pytest.fixture
+def reviewed(client, db, user):
+    course_id = add_course(client, db, user)
+    add_review(db, course_id, user, "很好")
+    execute(db, "INSERT INTO CoursePointsLog (course_id, earned_points) VALUES (%s, 42)", (course_id,))
+    return user, course_id
+
+
+def test_batch_returns_reviews_in_request_order(client, db, reviewed):
+    user, course_id = reviewed
+    unreviewed = add_course(client, db, user, "化學")
+    response = client.get(f"/course_reviews?ids={unreviewed},{course_id},999999,{course_id}")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [review["course_id"] for review in body["reviews"]] == [unreviewed, course_id]
+    assert body["not_found"] == [999999]
+    first, second = body["reviews"]
+    assert first["accuracy_score"] == 50 and first["earned_points"] == 156  # 預設評價、預設積分
+    assert second["teacher_comment"] == "很好" and second["good_points"] == ["清楚"]
+    assert second["earned_points"] == 42
+
+
+def test_batch_rejects_bad_ids(client):
+    assert client.get("/course_reviews?ids=1,x").status_code == 400
+    assert client.get("/course_reviews").status_code == 400
+    assert client.get("/course_reviews?ids=" + ",".join(str(i) for i in range(1, 102))).status_code == 400
+
+
+def test_assembled_review_is_cached(client, db, reviewed):
+    _, course_id = reviewed
+    assert client.get(f"/course_review/{course_id}").get_json()["teacher_comment"] == "很好"
+    # 評價建立後不會再改：第二次直接用快取，不會讀到 DB 裡的變化
+    execute(db, "UPDATE CourseReviews SET teacher_comment = '改過' WHERE course_id = %s", (course_id,))
+    assert client.get(f"/course_review/{course_id}").get_json()["teacher_comment"] == "很好"
+    reviews = client.get(f"/course_reviews?ids={course_id}").get_json()["reviews"]
+    assert reviews[0]["teacher_comment"] == "很好"
+
+
+def test_default_review_is_not_cached(client, db, user):
+    course_id = add_course(client, db, user)
+    assert client.get(f"/course_review/{course_id}").get_json()["accuracy_score"] == 50
+    add_review(db, course_id, user, "之後才建立的評價")
+    assert client.get(f"/course_review/{course_id}").get_json()["teacher_comment"] == "之後才建立的評價"
+
+
+def test_delete_course_invalidates(client, reviewed):
+    _, course_id = reviewed
+    assert client.get(f"/course_review/{course_id}").status_code == 200
+    assert client.delete(f"/delete_course/{course_id}").status_code == 200
+    assert client.get(f"/course_review/{course_id}").status_code == 404
+    assert client.get(f"/course_reviews?ids={course_id}").get_json()["reviews"] == []
+
+
+def test_delete_user_invalidates(client, reviewed):
+    user, course_id = reviewed
+    assert client.get(f"/course_reviews?ids={course_id}").get_json()["reviews"]
+    assert client.delete(f"/delete_user/{user}").status_code == 200
+    assert client.get(f"/course_review/{course_id}").status_code == 404
@@ -0,0 +1,29 @@
+# ✅ 抽卡：使用者快取的餘額可能是舊的，扣款以 DB 為準，不會扣成負的
+import pytest
+
+from conftest import execute, query
+
+
+@pytest.fixture(autouse=True)
+def card_pool(db):
+    if query(db, "SELECT 1 FROM Cards LIMIT 1") is None:
+        for rarity in ("絕密", "機密", "隱密"):
+            execute(db, "INSERT INTO Cards (name, rarity) VALUES (%s, %s)", (f"{rarity}老師", rarity))
+
+
+def test_draw_spends_coins(client, db, user):
+    response = client.post(f"/draw_card/{user}")
+    assert response.status_code == 200
+    assert response.get_json()["remaining_coins"] == 0
+    assert query(db, "SELECT COUNT(*) AS n FROM UserCards WHERE user_id = %s", (user,))["n"] == 1
+
+
+def test_stale_cached_balance_cannot_overspend(client, db, user):
+    assert client.get(f"/user/{user}").get_json()["coins"] == 500  # 快取記住 500 金幣
+    # 別的請求已經把錢花掉，但快取還沒失效（版本號要 commit 後才換）
+    execute(db, "UPDATE Users SET coins = 100 WHERE user_id = %s", (user,))
+
+    response = client.post(f"/draw_card/{user}")
+    assert response.status_code == 400
+    assert query(db, "SELECT coins FROM Users WHERE user_id = %s", (user,))["coins"] == 100
+    assert query(db, "SELECT COUNT(*) AS n FROM UserCards WHERE user_id = %s", (user,))["n"] == 0
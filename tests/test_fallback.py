@@ -0,0 +1,34 @@
+# ✅ DB 無法使用時：寫入 API 回 503 + Retry-After，讀取 API 回傳上一次成功的回應，都不會變成 500
+import pytest
+
+import db
+
+
+@pytest.fixture
+def breaker_open(monkeypatch):
+    monkeypatch.setattr(db.primary_breaker, "allow", lambda: False)
+    monkeypatch.setattr(db.primary_breaker, "retry_after", lambda: 3)
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/finish_course", {"course_id": 987654}),
+    ("/continue_course", {"course_id": 987654}),
+    ("/update_progress", {"course_id": 987654, "progress": 1, "progress_one_to_one": 1, "progress_classroom": 0,
+                          "current_stage": "one_to_one"}),
+    ("/select_teacher_card", {"user_id": 1, "card_id": 1}),
+])
+def test_write_endpoints_return_503(client, breaker_open, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 503
+    # flask-limiter 會把 Retry-After 調成跟限流視窗重置時間取大的
+    assert int(response.headers["Retry-After"]) >= 3
+
+
+def test_read_endpoint_serves_stale_response(client, user, monkeypatch):
+    fresh = client.get(f"/latest_course/{user}")
+    assert fresh.status_code == 200
+    monkeypatch.setattr(db.primary_breaker, "allow", lambda: False)
+    stale = client.get(f"/latest_course/{user}")
+    assert stale.status_code == 200
+    assert stale.get_json() == fresh.get_json()
+    assert "Stale" in stale.headers["Warning"]
@@ -0,0 +1,82 @@
+# ✅ 小組：建立、加入 / 移除成員、小組排行榜（加入時用台灣時間當天 / 當週的點數起算）
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+import app as app_module
+from conftest import create_user
+
+# 跟伺服器本地日期不同的一天，起算日期用錯就對不上
+TAIWAN_NOW = pytz.timezone("Asia/Taipei").localize(datetime.now() + timedelta(days=10))
+
+
+@pytest.fixture
+def taiwan_day(monkeypatch):
+    monkeypatch.setattr(app_module, "get_taiwan_now", lambda: TAIWAN_NOW)
+    return TAIWAN_NOW.date()
+
+
+def create_group(client, name="三年二班"):
+    response = client.post("/groups", json={"name": name})
+    assert response.status_code == 201
+    return response.get_json()["group_id"]
+
+
+def add_points(client, user_id, amount):
+    assert client.post("/update_learning_points", json={"user_id": user_id, "points": amount}).status_code == 200
+
+
+def rankings(client, group_id, board="daily", user_id=None):
+    params = {"board": board}
+    if user_id:
+        params["user_id"] = user_id
+    response = client.get(f"/groups/{group_id}/rankings", query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_create_group_requires_name(client):
+    assert client.post("/groups", json={}).status_code == 400
+
+
+def test_members_and_leaderboard(client, app, db, taiwan_day):
+    a, b, c = (create_user(db) for _ in range(3))
+
+    # 加入前的點數當成起算點數
+    add_points(client, a, 5)
+    group_id = create_group(client)
+    response = client.post(f"/groups/{group_id}/members", json={"user_ids": [a, b, c, 99999999]})
+    assert response.status_code == 200
+    assert response.get_json()["added"] == [a, b, c]
+    assert response.get_json()["not_found"] == [99999999]
+    assert [g["group_id"] for g in client.get(f"/user_groups/{a}").get_json()["groups"]] == [group_id]
+
+    add_points(client, b, 10)
+    add_points(client, c, 1)
+
+    daily = rankings(client, group_id, user_id=c)
+    assert daily["members"] == 3
+    assert daily["periodStart"] == taiwan_day.isoformat()
+    assert [(row["user_id"], row["points"]) for row in daily["rankings"]] == [(b, 10), (a, 5), (c, 1)]
+    assert daily["userRank"]["ranking"] == 3
+    weekly = rankings(client, group_id, board="weekly")
+    assert [(row["user_id"], row["points"]) for row in weekly["rankings"]] == [(b, 10), (a, 5), (c, 1)]
+
+    assert client.delete(f"/groups/{group_id}/members/{b}").status_code == 200
+    assert client.delete(f"/groups/{group_id}/members/{b}").status_code == 404
+    daily = rankings(client, group_id)
+    assert daily["members"] == 2
+    assert [row["user_id"] for row in daily["rankings"]] == [a, c]
+
+    assert client.delete(f"/groups/{group_id}").status_code == 200
+    assert client.get(f"/groups/{group_id}/rankings").status_code == 404
+    assert client.get(f"/user_groups/{a}").get_json()["groups"] == []
+
+
+def test_add_members_validation(client):
+    assert client.post("/groups/99999999/members", json={"user_ids": [1]}).status_code == 404
+    group_id = create_group(client, "驗證用")
+    assert client.post(f"/groups/{group_id}/members", json={"user_ids": "1"}).status_code == 400
+    assert client.post(f"/groups/{group_id}/members", json={"user_ids": []}).status_code == 400
+    assert client.get(f"/groups/{group_id}/rankings?board=monthly").status_code == 400
@@ -0,0 +1,37 @@
+# ✅ 加學習點數：當天點數、日 / 週點數分布都用台灣時間的日期，跟排行榜查詢同一天
+from datetime import datetime, timedelta
+
+import pytz
+
+import app as app_module
+from conftest import query
+
+# 跟伺服器本地日期不同的一天，日期用錯就對不上
+TAIWAN_NOW = pytz.timezone("Asia/Taipei").localize(datetime.now() + timedelta(days=3))
+
+
+def test_points_use_taiwan_date(client, db, user, monkeypatch):
+    monkeypatch.setattr(app_module, "get_taiwan_now", lambda: TAIWAN_NOW)
+    day = TAIWAN_NOW.date()
+    week_start = day - timedelta(days=day.weekday())
+
+    response = client.post("/update_learning_points", json={"user_id": user, "points": 7})
+    assert response.status_code == 200
+
+    logged = query(db, "SELECT daily_points FROM LearningPointsLog WHERE user_id = %s AND date = %s", (user, day))
+    assert logged["daily_points"] == 7
+    for board, period_start in (("daily", day), ("weekly", week_start)):
+        row = query(db, "SELECT users FROM LeaderboardHistogram WHERE board = %s AND period_start = %s AND bucket = 7",
+                    (board, period_start))
+        assert row is not None and row["users"] >= 1, board
+
+
+def test_delete_user_forgets_taiwan_date(client, db, user, monkeypatch):
+    monkeypatch.setattr(app_module, "get_taiwan_now", lambda: TAIWAN_NOW)
+    day = TAIWAN_NOW.date()
+    histogram = "SELECT users FROM LeaderboardHistogram WHERE board = 'daily' AND period_start = %s AND bucket = 9"
+
+    assert client.post("/update_learning_points", json={"user_id": user, "points": 9}).status_code == 200
+    before = query(db, histogram, (day,))["users"]
+    assert client.delete(f"/delete_user/{user}").status_code == 200
+    assert query(db, histogram, (day,))["users"] == before - 1
@@ -0,0 +1,21 @@
+# ✅ migrate.py advise：hot() 常數也要檢查，從哪個目錄執行都可以
+import argparse
+import os
+
+import migrate
+from repositories import users
+
+
+def test_extract_statements_includes_hot_constants():
+    statements = [sql for _, sql in migrate.extract_statements(os.path.join(migrate.ROOT, "repositories", "users.py"))]
+    assert users.SPEND_SQL in statements
+    assert users.PROFILE_SQL in statements  # f-string 組出來的
+    courses = [sql for _, sql in migrate.extract_statements(os.path.join(migrate.ROOT, "repositories", "courses.py"))]
+    assert any("FROM Courses" in sql and "WHERE course_id = %s" in sql for sql in courses)  # 經過 helper 執行的
+
+
+def test_advise_from_another_directory(app, db, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    migrate.cmd_advise(db, argparse.Namespace(paths=[]))
+    output = capsys.readouterr().out
+    assert "處需要檢查" in output or "沒有發現全表掃描" in output
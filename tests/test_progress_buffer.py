@@ -0,0 +1,64 @@
+# ✅ VR 進度合併寫入（progress_buffer.py）：client 看到的要跟每次都直接寫 DB 一樣
+import time
+
+import pytest
+
+import progress_buffer
+from conftest import query
+
+
+@pytest.fixture
+def course(client, db, user):
+    assert client.post("/add_course", json={"user_id": user, "course_name": "物理", "file_type": "pdf"}).status_code == 201
+    return user, query(db, "SELECT course_id FROM Courses WHERE user_id = %s", (user,))["course_id"]
+
+
+def report(client, course_id, progress, stage="one_to_one"):
+    response = client.post("/update_progress", json={
+        "course_id": course_id, "progress": progress, "progress_one_to_one": progress,
+        "progress_classroom": 0, "current_stage": stage})
+    assert response.status_code == 200
+
+
+# /current_stage 在新的一堂課開始後先輪詢，第一筆進度還是要馬上寫（結束 VR Ready、移除 VR session）
+def test_first_progress_after_current_stage_poll_ends_session(client, db, course):
+    user_id, course_id = course
+    assert client.post("/continue_course", json={"course_id": course_id}).status_code == 200
+    assert client.get(f"/current_stage/{user_id}").get_json()["hasReadyCourse"] is True
+
+    report(client, course_id, 20)
+    row = query(db, "SELECT progress, is_vr_ready FROM Courses WHERE course_id = %s", (course_id,))
+    assert row["progress"] == 20 and not row["is_vr_ready"]
+    assert query(db, "SELECT 1 FROM ActiveVRSessions WHERE user_id = %s", (user_id,)) is None
+
+    report(client, course_id, 40)
+    assert client.get(f"/current_stage/{user_id}").get_json() == {"hasReadyCourse": False}
+    latest = client.get(f"/latest_course/{user_id}").get_json()
+    assert latest["course_id"] == course_id
+    assert latest["progress"] == 40
+
+
+# 還沒寫進 DB 的進度由 /current_stage 一起寫（同時移除 VR session），SQL 次數要在 @query_budget 之內
+def test_current_stage_settles_pending_progress(client, db, course):
+    user_id, course_id = course
+    assert client.post("/continue_course", json={"course_id": course_id}).status_code == 200
+    # 新的一堂課第一筆進度被別的 worker 的 lease 擋住，只記下來等之後寫
+    progress_buffer.store._conn().execute(
+        "UPDATE course_progress SET lease_until = ? WHERE course_id = ?", (time.time() + 60, course_id))
+    report(client, course_id, 30)
+    progress_buffer.store._conn().execute("UPDATE course_progress SET lease_until = 0 WHERE course_id = ?",
+                                          (course_id,))
+
+    response = client.get(f"/current_stage/{user_id}")
+    assert response.status_code == 200 and response.get_json()["hasReadyCourse"] is True
+    assert query(db, "SELECT 1 FROM ActiveVRSessions WHERE user_id = %s", (user_id,)) is None
+    assert not query(db, "SELECT is_vr_ready FROM Courses WHERE course_id = %s", (course_id,))["is_vr_ready"]
+
+
+def test_finish_course_ends_session(client, db, course):
+    user_id, course_id = course
+    assert client.post("/continue_course", json={"course_id": course_id}).status_code == 200
+    assert client.post("/finish_course", json={"course_id": course_id}).status_code == 200
+    assert query(db, "SELECT 1 FROM ActiveVRSessions WHERE user_id = %s", (user_id,)) is None
+    latest = client.get(f"/latest_course/{user_id}").get_json()
+    assert latest["current_stage"] == "completed" and latest["progress"] == 100
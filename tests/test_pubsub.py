@@ -0,0 +1,70 @@
+# ✅ 跨 worker 的 pub/sub：即時分送、斷線補送、漏掉訊息時 RESYNC
+import os
+import subprocess
+import sys
+import uuid
+
+import pubsub
+
+
+def channel():
+    return f"test:{uuid.uuid4().hex}"
+
+
+def test_publish_reaches_subscriber():
+    name = channel()
+    subscription = pubsub.subscribe(name)
+    try:
+        seq = pubsub.publish(name, "progress", {"value": 1})
+        pubsub.publish(channel(), "progress", {"value": 2})  # 別的頻道
+        message = subscription.get(timeout=2)
+        assert (message.seq, message.event, message.data) == (seq, "progress", {"value": 1})
+        assert subscription.get(timeout=0.2) is None
+    finally:
+        subscription.close()
+
+
+def test_replay_since_last_event_id():
+    name = channel()
+    first = pubsub.publish(name, "a", 1)
+    second = pubsub.publish(name, "b", 2)
+    subscription = pubsub.subscribe(name, since=first)
+    try:
+        message = subscription.get(timeout=2)
+        assert (message.seq, message.event) == (second, "b")
+        assert subscription.get(timeout=0.2) is None  # 補送過的不會再由背景執行緒送一次
+    finally:
+        subscription.close()
+
+
+def test_resync_when_last_event_id_is_from_the_future():
+    subscription = pubsub.subscribe(channel(), since=pubsub._ring.head() + 1000)
+    try:
+        assert subscription.get(timeout=1) is pubsub.RESYNC
+    finally:
+        subscription.close()
+
+
+def test_slow_subscriber_resyncs():
+    subscription = pubsub.Subscription(channel())
+    for seq in range(1, pubsub.QUEUE_SIZE + 2):
+        subscription.deliver(pubsub.Message(seq, subscription.channel, "e", None))
+    assert subscription.get(timeout=0) is pubsub.RESYNC
+    assert subscription.get(timeout=0) is None  # 佇列清空，client 自己重查完整狀態
+
+
+def test_message_from_another_process():
+    name = channel()
+    subscription = pubsub.subscribe(name)
+    try:
+        code = f"import pubsub; pubsub.publish({name!r}, 'course_ready', {{'course_id': 7}})"
+        subprocess.run([sys.executable, "-c", code], check=True, env=os.environ,
+                       cwd=os.path.dirname(os.path.abspath(pubsub.__file__)))
+        message = subscription.get(timeout=2)
+        assert (message.event, message.data) == ("course_ready", {"course_id": 7})
+    finally:
+        subscription.close()
+
+
+def test_too_large_message_is_dropped():
+    assert pubsub.publish(channel(), "big", "x" * pubsub.MESSAGE_BYTES) is None
@@ -0,0 +1,43 @@
+# ✅ 限流：每個使用者 / IP 超過上限回 429；DB 連線池排隊過長回 503 + Retry-After
+import db
+import ratelimit
+
+
+def test_storage_incr_matches_limits_signature():
+    storage = ratelimit.SharedMemoryStorage()
+    key = "test:incr-signature"
+    storage.clear(key)
+    assert storage.incr(key, 60) == 1
+    assert storage.incr(key, 60, 2) == 3
+    assert storage.get(key) == 3
+
+
+def test_per_user_limit(client, user):
+    assert client.post(f"/signin/init/{user}").status_code == 201
+    statuses = [client.post(f"/signin/claim/{user}").status_code for _ in range(10)]
+    assert 429 not in statuses
+    response = client.post(f"/signin/claim/{user}")
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+
+def test_per_ip_limit(client):
+    environ = {"REMOTE_ADDR": "10.0.0.38"}
+    body = {"email": "nobody@example.com", "password": "x"}
+    statuses = [client.post("/login", json=body, environ_base=environ).status_code for _ in range(30)]
+    assert statuses == [401] * 30
+    assert client.post("/login", json=body, environ_base=environ).status_code == 429
+    # 其他 IP 不受影響
+    assert client.post("/login", json=body, environ_base={"REMOTE_ADDR": "10.0.0.39"}).status_code == 401
+
+
+def test_overloaded_pool_returns_503(client, user, monkeypatch):
+    monkeypatch.setattr(db.primary_pool, "waiters", ratelimit.MAX_WAITERS)
+    response = client.get(f"/latest_course/{user}")
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= ratelimit.RETRY_AFTER
+
+
+def test_metrics_not_shed(client, monkeypatch):
+    monkeypatch.setattr(db.primary_pool, "waiters", ratelimit.MAX_WAITERS)
+    assert client.get("/metrics").status_code == 200
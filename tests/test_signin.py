@@ -0,0 +1,53 @@
+# ✅ 簽到：同時送出好幾個領取請求，只有一個成功、獎勵只加一次
+import threading
+
+from conftest import query
+from repositories import signin
+
+CONCURRENCY = 8
+
+
+def test_parallel_claims_credit_once(app, client, db, user):
+    assert client.post(f"/signin/init/{user}").status_code == 201
+    before = query(db, "SELECT coins, diamonds, total_signin_days FROM Users WHERE user_id = %s", (user,))
+
+    barrier = threading.Barrier(CONCURRENCY)
+    responses = []
+    lock = threading.Lock()
+
+    def claim():
+        test_client = app.test_client()
+        barrier.wait()
+        response = test_client.post(f"/signin/claim/{user}")
+        with lock:
+            responses.append((response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=claim) for _ in range(CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    succeeded = [body for status, body in responses if status == 200]
+    assert len(responses) == CONCURRENCY
+    assert len(succeeded) == 1, sorted(status for status, _ in responses)
+    reward = signin.REWARDS[1]
+    assert (succeeded[0]["coins_received"], succeeded[0]["diamonds_received"]) == (reward["coins"], reward["diamonds"])
+
+    after = query(db, "SELECT coins, diamonds, total_signin_days FROM Users WHERE user_id = %s", (user,))
+    assert after["coins"] - before["coins"] == reward["coins"]
+    assert after["diamonds"] - before["diamonds"] == reward["diamonds"]
+    assert after["total_signin_days"] - before["total_signin_days"] == 1
+
+    record = query(db, "SELECT signin_day, last_signin_date FROM SigninRecords WHERE user_id = %s", (user,))
+    from app import get_today
+    assert (record["signin_day"], record["last_signin_date"]) == (2, get_today())  # 只前進一天
+
+
+def test_second_claim_same_day_is_rejected(client, user):
+    assert client.post(f"/signin/init/{user}").status_code == 201
+    first = client.post(f"/signin/claim/{user}")
+    assert first.status_code == 200
+    second = client.post(f"/signin/claim/{user}")
+    assert second.status_code == 400
+    assert second.get_json()["last_signin_date"] == first.get_json()["last_signin_date"]
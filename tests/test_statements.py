@@ -0,0 +1,67 @@
+# ✅ prepared statement 快取（MySQL 專用，這裡用假的原始連線測快取本身）
+import pytest
+
+import statements
+from repositories import users
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+        self.description = [("coins",)]
+        self.rowcount = 1
+        self.lastrowid = None
+        self.closed = False
+
+    def execute(self, sql, params):
+        if params == ("fail",):
+            raise RuntimeError("表結構改了")
+        self.log.append(sql)
+
+    def fetchall(self):
+        return [(500,)]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRaw:
+    def __init__(self):
+        self.executed = []
+        self.cursors = []
+
+    def cursor(self, prepared=False, buffered=True):
+        assert prepared and not buffered
+        cursor = FakeCursor(self.executed)
+        self.cursors.append(cursor)
+        return cursor
+
+
+def test_hot_queries_are_registered():
+    assert statements.is_hot(users.SPEND_SQL)
+    assert not statements.is_hot("SELECT 1")
+
+
+def test_reuses_prepared_statement_per_connection():
+    raw, cache = FakeRaw(), statements.StatementCache(size=4)
+    result, reused = cache.execute(raw, users.BALANCE_SQL, (1,), dictionary=True)
+    assert not reused and result.fetchone() == {"coins": 500}
+    _, reused = cache.execute(raw, users.BALANCE_SQL, (2,), dictionary=False)
+    assert reused and len(raw.cursors) == 1
+    assert cache.stats() == {"size": 1, "hits": 1, "prepares": 1}
+
+
+def test_evicts_least_recently_used():
+    raw, cache = FakeRaw(), statements.StatementCache(size=2)
+    for sql in ("SELECT 1", "SELECT 2", "SELECT 1", "SELECT 3"):
+        cache.execute(raw, sql, None, dictionary=False)
+    assert [cursor.closed for cursor in raw.cursors] == [False, True, False]
+
+
+def test_failed_statement_is_dropped():
+    raw, cache = FakeRaw(), statements.StatementCache()
+    with pytest.raises(RuntimeError):
+        cache.execute(raw, "SELECT 1", ("fail",), dictionary=False)
+    assert raw.cursors[0].closed and cache.stats()["size"] == 0
+    _, reused = cache.execute(raw, "SELECT 1", None, dictionary=False)
+    assert not reused
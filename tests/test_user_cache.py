@@ -0,0 +1,58 @@
+# ✅ 使用者快取：commit 後才套用變更，同時有兩個寫入者時丟掉自己這份，其他 worker 換版本號時失效
+import user_cache
+from db import get_db_connection
+
+
+def cached(user_id):
+    found, _ = user_cache.lookup([user_id])
+    return found.get(user_id)
+
+
+def test_write_through_after_commit(user):
+    conn = get_db_connection()
+    try:
+        assert user_cache.get(conn, user)["coins"] == 500
+        user_cache.changed(conn, user, coins=-100)
+        assert cached(user)["coins"] == 500  # 還沒 commit
+        conn.commit()
+    finally:
+        conn.close()
+    assert cached(user)["coins"] == 400
+
+
+def test_rollback_leaves_cache(user):
+    conn = get_db_connection()
+    try:
+        user_cache.get(conn, user)
+        user_cache.changed(conn, user, coins=-100)
+        conn.rollback()
+    finally:
+        conn.close()
+    assert cached(user)["coins"] == 500
+
+
+def test_concurrent_writers_drop_entry(user):
+    first, second = get_db_connection(), get_db_connection()
+    try:
+        user_cache.get(first, user)
+        user_cache.changed(first, user, coins=-1)
+        user_cache.changed(second, user, coins=-2)
+        first.commit()
+        assert cached(user)["coins"] == 499
+        # second 寫之前看到的版本號已經被 first 換掉，不知道自己這份有沒有漏掉 first 的變更
+        second.commit()
+    finally:
+        first.close()
+        second.close()
+    assert cached(user) is None
+
+
+def test_other_worker_invalidates(user):
+    conn = get_db_connection()
+    try:
+        user_cache.get(conn, user)
+    finally:
+        conn.close()
+    assert cached(user) is not None
+    user_cache.versions().bump(user)  # 別的 worker commit 後換版本號
+    assert cached(user) is None
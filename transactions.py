@@ -0,0 +1,51 @@
+# ✅ 交易重試：遇到死結（1213）、等鎖逾時（1205）、SQLite 寫入鎖忙碌時，整個交易 rollback 後重來
+#
+# TX_MAX_ATTEMPTS   最多執行幾次（預設 4，含第一次）
+# TX_RETRY_DELAY    第一次重試前等幾秒（預設 0.02，之後每次加倍，再乘上 0.5～1.5 的隨機倍數錯開）
+#
+# 用法：把交易內容寫成 work(conn)，回傳值就是 run() 的回傳值；work 正常結束後才 commit。
+#   return transactions.run(work, lock_user=user_id)
+# lock_user：交易一開始先鎖住這個使用者在 Users 的那一列，所有同時改 Users 和其他表的交易
+# 都先鎖 Users、再碰其他表，就不會因為順序不同互相死結。
+# work 可能被執行好幾次：不要在裡面做 commit 以外不能重來的事（外部呼叫、背景工作放到 conn.on_commit）。
+import logging
+import os
+import random
+import time
+
+import metrics
+from db import DatabaseUnavailable, backend, get_db_connection
+from repositories import users
+
+log = logging.getLogger("feyndora.db.transactions")
+
+MAX_ATTEMPTS = int(os.getenv("TX_MAX_ATTEMPTS", "4"))
+RETRY_DELAY = float(os.getenv("TX_RETRY_DELAY", "0.02"))
+
+
+def run(work, lock_user=None, user_id=None):
+    conn = get_db_connection(user_id=user_id if user_id is not None else lock_user)
+    try:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                if lock_user is not None:
+                    users.lock(conn, lock_user)
+                result = work(conn)
+                conn.commit()
+                return result
+            except backend.errors as e:
+                # 其他錯誤直接往上丟，連線放回連線池時會 rollback
+                reason = backend.retry_reason(e)
+                if reason is None:
+                    raise
+                conn.rollback()
+                if attempt == MAX_ATTEMPTS:
+                    metrics.record_transaction_retry(reason, "gave_up")
+                    log.warning("交易衝突，重試 %s 次仍失敗: %s", attempt - 1, e, extra={"reason": reason})
+                    raise DatabaseUnavailable(f"交易衝突，請稍後再試: {e}", retry_after=1) from e
+                metrics.record_transaction_retry(reason, "retried")
+                delay = RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                log.info("交易衝突，%.3f 秒後重試: %s", delay, e, extra={"reason": reason, "attempt": attempt})
+                time.sleep(delay)
+    finally:
+        conn.close()
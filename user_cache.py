@@ -0,0 +1,111 @@
+# ✅ 使用者資料快取（名稱、頭像、金幣、鑽石、學習點數…）：/user、抽卡、成就檢查、排行榜都從這裡讀
+#
+# USER_CACHE_SIZE   每個 worker 最多快取幾個使用者（預設 10000，LRU 淘汰）
+# USER_CACHE_TTL    最久保留幾秒（預設 300）
+#
+# 資料放在每個 worker 自己的記憶體，版本號放在 /dev/shm（shm.SharedVersionMap）所有 worker 共用：
+#   讀：快取裡的版本號跟共用版本號一樣才算有效
+#   寫：commit 之後換新版本號（其他 worker 的快取就失效），自己這份直接套用變更（write-through）
+# 寫入時記下「寫之前」的版本號，commit 後換版本號時如果中間有別人也換過，代表自己這份可能漏了別人的變更，
+# 就直接丟掉不套用，下次讀取再從 DB 載入。
+import os
+import threading
+
+import shm
+from cache import LRUCache
+from repositories import users
+
+CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+# user_id → (版本號, 使用者資料)
+_cache = LRUCache(CACHE_SIZE, ttl=CACHE_TTL)
+_lock = threading.Lock()
+_versions = None
+
+
+def versions():
+    global _versions
+    if _versions is None:
+        _versions = shm.SharedVersionMap("user-versions")
+    return _versions
+
+
+# ✅ 先查快取，回傳 ({user_id: 使用者資料}, 快取裡沒有的 user_id)
+def lookup(user_ids):
+    found, missing = {}, []
+    for user_id in user_ids:
+        entry = _cache.get(user_id)
+        if entry is not None and entry[0] == versions().get(user_id):
+            found[user_id] = dict(entry[1])
+        else:
+            missing.append(user_id)
+    return found, missing
+
+
+# ✅ 從 DB 載入並放進快取（一次 SQL），回傳 {user_id: 使用者資料}；不存在的使用者不會出現
+def load(conn, user_ids):
+    # 版本號要在查 DB 之前拿：查詢期間有人寫入的話，版本號會被換掉，這次放進去的資料就不會被用到
+    stamps = {user_id: versions().ensure(user_id) for user_id in user_ids}
+    rows = users.get_profiles(conn, user_ids)
+    for user_id, row in rows.items():
+        _cache.put(user_id, (stamps[user_id], dict(row)))
+    return rows
+
+
+def get(conn, user_id):
+    found, missing = lookup([user_id])
+    if missing:
+        found = load(conn, missing)
+    return found.get(user_id)
+
+
+# ✅ 排行榜的每一列補上 username、avatar_id（原本是 JOIN Users），找不到使用者的列拿掉
+def attach_profiles(conn, rows):
+    user_ids = list({row["user_id"] for row in rows})
+    if not user_ids:
+        return rows
+    found, missing = lookup(user_ids)
+    if missing:
+        found.update(load(conn, missing))
+    attached = []
+    for row in rows:
+        profile = found.get(row["user_id"])
+        if profile is not None:
+            attached.append(dict(row, username=profile["username"], avatar_id=profile["avatar_id"]))
+    return attached
+
+
+def _on_commit(conn, user_id, update):
+    expected = versions().get(user_id)
+    conn.on_commit(lambda: _apply(user_id, expected, update))
+
+
+def _apply(user_id, expected, update):
+    with _lock:
+        version, previous = versions().bump(user_id)
+        entry = _cache.pop(user_id)
+        if update is None or entry is None or not expected or previous != expected or entry[0] != expected:
+            return
+        profile = dict(entry[1])
+        profile.update(update(profile))
+        _cache.put(user_id, (version, profile))
+
+
+# ✅ 寫入後呼叫（在 commit 之前），commit 成功才會生效
+# 數值加減：changed(conn, user_id, coins=-500)
+def changed(conn, user_id, **deltas):
+    _on_commit(conn, user_id, lambda profile: {field: profile[field] + delta for field, delta in deltas.items()})
+
+
+# 直接改成新的值：replaced(conn, user_id, username="新名字")
+def replaced(conn, user_id, **fields):
+    _on_commit(conn, user_id, lambda profile: fields)
+
+
+def removed(conn, user_id):
+    _on_commit(conn, user_id, None)
+
+
+def stats():
+    return _cache.stats()